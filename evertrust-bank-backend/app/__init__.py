@@ -22,6 +22,43 @@ def create_app():
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
     app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=30)
+    app.config['IDEMPOTENCY_KEY_TTL'] = timedelta(hours=int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24)))
+    app.config['IDEMPOTENCY_WAIT_TIMEOUT'] = 30  # seconds a duplicate waits on the original
+    app.config['USER_CONTEXT_CACHE_TTL'] = int(os.environ.get('USER_CONTEXT_CACHE_TTL', 0))  # seconds; 0 = per request only
+    
+    # Audit log; events outside a unit of work are batched unless AUDIT_DURABILITY is 'sync'
+    app.config['AUDIT_DURABILITY'] = os.environ.get('AUDIT_DURABILITY', 'async')
+    app.config['AUDIT_BATCH_SIZE'] = 500
+    app.config['AUDIT_FLUSH_INTERVAL'] = 1.0  # seconds an event may wait for the rest of its batch
+    app.config['AUDIT_QUEUE_SIZE'] = 10000  # queued events before callers fall back to writing synchronously
+    app.config['AUDIT_PARTITION_MONTHS_AHEAD'] = 3  # monthly audit_log partitions kept ready (PostgreSQL)
+    app.config['AUDIT_RETENTION_MONTHS'] = int(os.environ.get('AUDIT_RETENTION_MONTHS', 24))  # whole months kept before archiving
+    app.config['AUDIT_ARCHIVE_DIR'] = os.environ.get('AUDIT_ARCHIVE_DIR', 'archive/audit_log')
+    
+    # Statement PDFs; POST /statements/generate renders in a process pool and caches the file
+    app.config['STATEMENT_WORKERS'] = int(os.environ.get('STATEMENT_WORKERS', 2))  # processes; 0 = render in the request
+    app.config['STATEMENT_CACHE_DIR'] = os.environ.get('STATEMENT_CACHE_DIR', 'cache/statements')
+    app.config['STATEMENT_CACHE_TTL'] = timedelta(hours=int(os.environ.get('STATEMENT_CACHE_TTL_HOURS', 24)))
+    app.config['STATEMENT_JOB_TIMEOUT'] = timedelta(seconds=int(os.environ.get('STATEMENT_JOB_TIMEOUT', 900)))  # queued or running before a job is failed
+    app.config['STATEMENT_RUN_DIR'] = os.environ.get('STATEMENT_RUN_DIR', 'statements')  # month-end runs, one subdirectory per month
+    
+    # Email delivery; without SMTP_SERVER messages are printed instead of sent
+    app.config['SMTP_SERVER'] = os.environ.get('SMTP_SERVER')
+    app.config['SMTP_PORT'] = int(os.environ.get('SMTP_PORT', 587))
+    app.config['SMTP_USERNAME'] = os.environ.get('SMTP_USERNAME')
+    app.config['SMTP_PASSWORD'] = os.environ.get('SMTP_PASSWORD')
+    app.config['SMTP_USE_TLS'] = os.environ.get('SMTP_USE_TLS', 'true').lower() == 'true'
+    app.config['SMTP_TIMEOUT'] = 10  # seconds
+    app.config['SMTP_POOL_SIZE'] = int(os.environ.get('SMTP_POOL_SIZE', 4))  # persistent connections per process
+    app.config['SMTP_MAX_MESSAGES_PER_CONNECTION'] = 100
+    app.config['SMTP_POOL_IDLE_TIMEOUT'] = 60  # seconds before an idle connection is re-checked with NOOP
+    app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', 'no-reply@evertrustbank.com')
+    app.config['EMAIL_OUTBOX_MAX_ATTEMPTS'] = 8
+    app.config['EMAIL_OUTBOX_RETRY_BASE'] = 30  # seconds before the first retry, doubled each attempt
+    app.config['EMAIL_OUTBOX_RETRY_MAX'] = 3600  # seconds
+    app.config['EMAIL_OUTBOX_LEASE'] = 300  # seconds a worker may hold a claimed message
+    app.config['ALERT_DIGEST_WINDOW'] = int(os.environ.get('ALERT_DIGEST_WINDOW', 120))  # seconds alerts are held for a digest; 0 = off
+    app.config['ALERT_DIGEST_BYPASS_TYPES'] = set(os.environ.get('ALERT_DIGEST_BYPASS_TYPES', 'large_withdrawal,large_transfer').split(','))  # sent immediately
     
     # Initialize extensions
     db.init_app(app)
@@ -45,6 +82,7 @@ def create_app():
     from app.routes.statements import statements_bp
     from app.routes.alerts import alerts_bp
     from app.routes.utilities import utilities_bp
+    from app.routes.audit import audit_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/v1/auth')
     app.register_blueprint(accounts_bp, url_prefix='/api/v1/accounts')
@@ -56,5 +94,6 @@ def create_app():
     app.register_blueprint(statements_bp, url_prefix='/api/v1/statements')
     app.register_blueprint(alerts_bp, url_prefix='/api/v1/alerts')
     app.register_blueprint(utilities_bp, url_prefix='/api/v1')
+    app.register_blueprint(audit_bp, url_prefix='/api/v1/audit')
     
     return app
\ No newline at end of file
@@ -37,7 +37,7 @@ def signup():
         action='user_signup',
         entity='user',
         entity_id=user.id,
-        metadata={'email': user.email}
+        metadata_={'email': user.email}
     )
     db.session.add(audit_log)
     db.session.commit()
@@ -18,6 +18,45 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     
+    # Idempotency keys on money-movement endpoints
+    IDEMPOTENCY_KEY_TTL = timedelta(hours=int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24)))
+    IDEMPOTENCY_WAIT_TIMEOUT = 30  # seconds a duplicate waits on the original
+    USER_CONTEXT_CACHE_TTL = int(os.environ.get('USER_CONTEXT_CACHE_TTL', 0))  # seconds; 0 = per request only
+    
+    # Audit log; events outside a unit of work are batched unless AUDIT_DURABILITY is 'sync'
+    AUDIT_DURABILITY = os.environ.get('AUDIT_DURABILITY', 'async')
+    AUDIT_BATCH_SIZE = 500
+    AUDIT_FLUSH_INTERVAL = 1.0  # seconds an event may wait for the rest of its batch
+    AUDIT_QUEUE_SIZE = 10000  # queued events before callers fall back to writing synchronously
+    AUDIT_PARTITION_MONTHS_AHEAD = 3  # monthly audit_log partitions kept ready (PostgreSQL)
+    AUDIT_RETENTION_MONTHS = int(os.environ.get('AUDIT_RETENTION_MONTHS', 24))  # whole months kept before archiving
+    AUDIT_ARCHIVE_DIR = os.environ.get('AUDIT_ARCHIVE_DIR', 'archive/audit_log')
+    
+    # Statement PDFs; POST /statements/generate renders in a process pool and caches the file
+    STATEMENT_WORKERS = int(os.environ.get('STATEMENT_WORKERS', 2))  # processes; 0 = render in the request
+    STATEMENT_CACHE_DIR = os.environ.get('STATEMENT_CACHE_DIR', 'cache/statements')
+    STATEMENT_CACHE_TTL = timedelta(hours=int(os.environ.get('STATEMENT_CACHE_TTL_HOURS', 24)))
+    STATEMENT_JOB_TIMEOUT = timedelta(seconds=int(os.environ.get('STATEMENT_JOB_TIMEOUT', 900)))  # queued or running before a job is failed
+    STATEMENT_RUN_DIR = os.environ.get('STATEMENT_RUN_DIR', 'statements')  # month-end runs, one subdirectory per month
+    
+    # Email delivery; without SMTP_SERVER messages are printed instead of sent
+    SMTP_SERVER = os.environ.get('SMTP_SERVER')
+    SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+    SMTP_USERNAME = os.environ.get('SMTP_USERNAME')
+    SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+    SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', 'true').lower() == 'true'
+    SMTP_TIMEOUT = 10  # seconds
+    SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', 4))  # persistent connections per process
+    SMTP_MAX_MESSAGES_PER_CONNECTION = 100
+    SMTP_POOL_IDLE_TIMEOUT = 60  # seconds before an idle connection is re-checked with NOOP
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'no-reply@evertrustbank.com')
+    EMAIL_OUTBOX_MAX_ATTEMPTS = 8
+    EMAIL_OUTBOX_RETRY_BASE = 30  # seconds before the first retry, doubled each attempt
+    EMAIL_OUTBOX_RETRY_MAX = 3600  # seconds
+    EMAIL_OUTBOX_LEASE = 300  # seconds a worker may hold a claimed message
+    ALERT_DIGEST_WINDOW = int(os.environ.get('ALERT_DIGEST_WINDOW', 120))  # seconds alerts are held for a digest; 0 = off
+    ALERT_DIGEST_BYPASS_TYPES = set(os.environ.get('ALERT_DIGEST_BYPASS_TYPES', 'large_withdrawal,large_transfer').split(','))  # sent immediately
+    
     # CORS
     CORS_ORIGINS = os.environ.get('ALLOWED_ORIGINS', 'http://localhost:3000').split(',')
     
@@ -0,0 +1,45 @@
+"""add transactions.balance_after and direction
+
+Revision ID: 2c5a9e7b1d40
+Revises: 9d2e7f4a0b63
+Create Date: 2026-10-18 23:02:51.274106
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c5a9e7b1d40'
+down_revision = '9d2e7f4a0b63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nullable and without a default, so adding it does not rewrite the
+    # table; existing rows are filled by `flask backfill-balance-after`
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.add_column(sa.Column('balance_after', sa.Numeric(precision=15, scale=2), nullable=True))
+
+    # Direction is needed to sign every row, so it is filled here. Both legs
+    # of an internal transfer are typed 'Transfer'; the sending leg is the one
+    # its internal_transfer_created audit event points at
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.add_column(sa.Column('direction', sa.String(length=6), nullable=True))
+    op.execute(
+        "UPDATE transactions SET direction = CASE "
+        "WHEN type IN ('Withdrawal', 'External Transfer') THEN 'debit' "
+        "WHEN type = 'Transfer' AND EXISTS (SELECT 1 FROM audit_log "
+        "WHERE audit_log.action = 'internal_transfer_created' AND audit_log.entity = 'transaction' "
+        "AND audit_log.entity_id = transactions.id) THEN 'debit' "
+        "ELSE 'credit' END"
+    )
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.alter_column('direction', existing_type=sa.String(length=6), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.drop_column('direction')
+        batch_op.drop_column('balance_after')
@@ -0,0 +1,39 @@
+"""add account balance shards
+
+Revision ID: 47373c83b248
+Revises: d417d9bd0de8
+Create Date: 2026-10-18 13:41:05.270318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '47373c83b248'
+down_revision = 'd417d9bd0de8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('accounts') as batch_op:
+        batch_op.add_column(
+            sa.Column('balance_shards', sa.Integer(), nullable=False, server_default='0')
+        )
+
+    op.create_table(
+        'account_balance_shards',
+        sa.Column('account_id', sa.Integer(), sa.ForeignKey('accounts.id'), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('balance', sa.Numeric(15, 2), nullable=False),
+        sa.Column('transaction_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('account_id', 'shard'),
+    )
+
+
+def downgrade():
+    op.drop_table('account_balance_shards')
+
+    with op.batch_alter_table('accounts') as batch_op:
+        batch_op.drop_column('balance_shards')
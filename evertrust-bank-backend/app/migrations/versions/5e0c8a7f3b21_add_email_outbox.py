@@ -0,0 +1,40 @@
+"""add email outbox
+
+Revision ID: 5e0c8a7f3b21
+Revises: d89b34d55e1c
+Create Date: 2026-10-18 17:05:12.417530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0c8a7f3b21'
+down_revision = 'd89b34d55e1c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('to_email', sa.String(length=120), nullable=False),
+        sa.Column('subject', sa.String(length=255), nullable=False),
+        sa.Column('html_content', sa.Text(), nullable=False),
+        sa.Column('text_content', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_email_outbox_status_next_attempt_at', 'email_outbox', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_status_next_attempt_at', table_name='email_outbox')
+    op.drop_table('email_outbox')
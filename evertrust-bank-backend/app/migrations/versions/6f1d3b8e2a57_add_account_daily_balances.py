@@ -0,0 +1,33 @@
+"""add account_daily_balances
+
+Revision ID: 6f1d3b8e2a57
+Revises: 2c5a9e7b1d40
+Create Date: 2026-10-19 01:12:37.408215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f1d3b8e2a57'
+down_revision = '2c5a9e7b1d40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled for existing history by `flask backfill-balance-history`
+    op.create_table(
+        'account_daily_balances',
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('net_change', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id']),
+        sa.PrimaryKeyConstraint('account_id', 'day', 'shard')
+    )
+
+
+def downgrade():
+    op.drop_table('account_daily_balances')
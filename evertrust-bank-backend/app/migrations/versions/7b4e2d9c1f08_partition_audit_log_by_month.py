@@ -0,0 +1,100 @@
+"""partition audit_log by month
+
+Revision ID: 7b4e2d9c1f08
+Revises: a3f1c9d27e64
+Create Date: 2026-10-18 19:52:40.118604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = '7b4e2d9c1f08'
+down_revision = 'a3f1c9d27e64'
+branch_labels = None
+depends_on = None
+
+# Months of partitions created past the current one; `flask audit-partitions`
+# keeps extending this
+MONTHS_AHEAD = 3
+
+COLUMNS = 'id, user_id, action, entity, entity_id, metadata, created_at'
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def upgrade():
+    # Only PostgreSQL supports declarative partitioning; elsewhere (SQLite in
+    # development and tests) audit_log stays a plain table
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    # The partition key has to be part of the primary key, so the table is
+    # rebuilt as a partitioned one and the rows copied across
+    op.execute('ALTER TABLE audit_log RENAME TO audit_log_unpartitioned')
+    op.execute('ALTER INDEX audit_log_pkey RENAME TO audit_log_unpartitioned_pkey')
+    op.execute('ALTER INDEX ix_audit_log_user_id_created_at RENAME TO ix_audit_log_unpartitioned_user_id_created_at')
+    op.execute("""
+        CREATE TABLE audit_log (
+            id INTEGER NOT NULL DEFAULT nextval('audit_log_id_seq'),
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            action VARCHAR(100) NOT NULL,
+            entity VARCHAR(50) NOT NULL,
+            entity_id INTEGER,
+            metadata JSONB,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute('ALTER SEQUENCE audit_log_id_seq OWNED BY audit_log.id')
+    op.execute('CREATE INDEX ix_audit_log_user_id_created_at ON audit_log (user_id, created_at)')
+    op.execute('CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT')
+
+    oldest = bind.execute(sa.text('SELECT min(created_at) FROM audit_log_unpartitioned')).scalar()
+    now = datetime.utcnow()
+    month = add_months(oldest or now, 0)
+    last = add_months(now, MONTHS_AHEAD)
+    while month <= last:
+        upper = add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE audit_log_{month:%Y_%m} PARTITION OF audit_log "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        )
+        month = upper
+
+    op.execute(f"""
+        INSERT INTO audit_log ({COLUMNS})
+        SELECT id, user_id, action, entity, entity_id, metadata, coalesce(created_at, now() at time zone 'utc')
+        FROM audit_log_unpartitioned
+    """)
+    op.execute('DROP TABLE audit_log_unpartitioned')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.execute('ALTER TABLE audit_log RENAME TO audit_log_partitioned')
+    op.execute('ALTER INDEX ix_audit_log_user_id_created_at RENAME TO ix_audit_log_partitioned_user_id_created_at')
+    op.execute("""
+        CREATE TABLE audit_log (
+            id INTEGER NOT NULL DEFAULT nextval('audit_log_id_seq') PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            action VARCHAR(100) NOT NULL,
+            entity VARCHAR(50) NOT NULL,
+            entity_id INTEGER,
+            metadata JSONB,
+            created_at TIMESTAMP WITHOUT TIME ZONE
+        )
+    """)
+    op.execute('ALTER SEQUENCE audit_log_id_seq OWNED BY audit_log.id')
+    op.execute(f'INSERT INTO audit_log ({COLUMNS}) SELECT {COLUMNS} FROM audit_log_partitioned')
+    op.execute('DROP TABLE audit_log_partitioned')
+    op.execute('CREATE INDEX ix_audit_log_user_id_created_at ON audit_log (user_id, created_at)')
@@ -0,0 +1,44 @@
+"""add statement jobs
+
+Revision ID: 9d2e7f4a0b63
+Revises: f3c8a61d9e42
+Create Date: 2026-10-18 21:48:33.902164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2e7f4a0b63'
+down_revision = 'f3c8a61d9e42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'statement_jobs',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('end_date', sa.Date(), nullable=False),
+        sa.Column('cache_key', sa.String(length=100), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_statement_jobs_user_id', 'statement_jobs', ['user_id'])
+    op.create_index('ix_statement_jobs_cache_key', 'statement_jobs', ['cache_key'])
+
+
+def downgrade():
+    op.drop_index('ix_statement_jobs_cache_key', table_name='statement_jobs')
+    op.drop_index('ix_statement_jobs_user_id', table_name='statement_jobs')
+    op.drop_table('statement_jobs')
@@ -0,0 +1,30 @@
+"""add email outbox digest columns
+
+Revision ID: a3f1c9d27e64
+Revises: 5e0c8a7f3b21
+Create Date: 2026-10-18 18:41:03.286119
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9d27e64'
+down_revision = '5e0c8a7f3b21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('category', sa.String(length=20), nullable=False, server_default='general'))
+        batch_op.add_column(sa.Column('payload', sa.Text(), nullable=True))
+        batch_op.create_index('ix_email_outbox_to_email_status', ['to_email', 'status'])
+
+
+def downgrade():
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_email_outbox_to_email_status')
+        batch_op.drop_column('payload')
+        batch_op.drop_column('category')
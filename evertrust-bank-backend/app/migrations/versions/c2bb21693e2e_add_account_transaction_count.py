@@ -0,0 +1,34 @@
+"""add account transaction_count
+
+Revision ID: c2bb21693e2e
+Revises: 
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2bb21693e2e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('accounts') as batch_op:
+        batch_op.add_column(
+            sa.Column('transaction_count', sa.Integer(), nullable=False, server_default='0')
+        )
+
+    # Backfill from existing history; the ORM keeps it current from here on
+    op.execute(
+        'UPDATE accounts SET transaction_count = '
+        '(SELECT COUNT(*) FROM transactions WHERE transactions.account_id = accounts.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('accounts') as batch_op:
+        batch_op.drop_column('transaction_count')
@@ -0,0 +1,38 @@
+"""add composite indexes for hot query shapes
+
+Revision ID: d417d9bd0de8
+Revises: c2bb21693e2e
+Create Date: 2026-10-18 10:03:17.542961
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd417d9bd0de8'
+down_revision = 'c2bb21693e2e'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_transactions_account_id_created_at', 'transactions', ['account_id', 'created_at', 'id']),
+    ('ix_audit_log_user_id_created_at', 'audit_log', ['user_id', 'created_at']),
+    ('ix_alerts_user_id_created_at', 'alerts', ['user_id', 'created_at']),
+    ('ix_bills_user_id_created_at', 'bills', ['user_id', 'created_at']),
+    ('ix_schedules_active_next_run_at', 'schedules', ['active', 'next_run_at']),
+]
+
+
+def upgrade():
+    # Build without blocking writes on PostgreSQL; CONCURRENTLY cannot run
+    # inside a transaction, hence the autocommit block
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
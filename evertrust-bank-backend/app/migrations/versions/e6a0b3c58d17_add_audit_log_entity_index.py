@@ -0,0 +1,47 @@
+"""add audit_log (entity, entity_id, created_at) index
+
+Revision ID: e6a0b3c58d17
+Revises: 7b4e2d9c1f08
+Create Date: 2026-10-18 20:37:12.604381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a0b3c58d17'
+down_revision = '7b4e2d9c1f08'
+branch_labels = None
+depends_on = None
+
+NAME = 'ix_audit_log_entity_entity_id_created_at'
+COLUMNS = ['entity', 'entity_id', 'created_at']
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        op.create_index(NAME, 'audit_log', COLUMNS)
+        return
+
+    # audit_log is partitioned and CONCURRENTLY does not work on a
+    # partitioned table: create the parent index as invalid (ON ONLY), build
+    # each partition's index concurrently and attach it; the parent index
+    # becomes valid once every partition has one
+    partitions = bind.execute(sa.text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass('audit_log')
+    """)).scalars().all()
+    op.execute(f'CREATE INDEX {NAME} ON ONLY audit_log (entity, entity_id, created_at)')
+    with op.get_context().autocommit_block():
+        for partition in partitions:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_entity_entity_id_created_at '
+                       f'ON {partition} (entity, entity_id, created_at)')
+            op.execute(f'ALTER INDEX {NAME} ATTACH PARTITION {partition}_entity_entity_id_created_at')
+
+
+def downgrade():
+    op.drop_index(NAME, table_name='audit_log')
@@ -0,0 +1,101 @@
+"""add audit_log metadata search (GIN index / extracted keys)
+
+Revision ID: f3c8a61d9e42
+Revises: e6a0b3c58d17
+Create Date: 2026-10-18 21:14:06.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8a61d9e42'
+down_revision = 'e6a0b3c58d17'
+branch_labels = None
+depends_on = None
+
+NAME = 'ix_audit_log_metadata'
+
+EXTRACT = """
+    SELECT {id}, key, CASE type WHEN 'true' THEN 'true' WHEN 'false' THEN 'false' ELSE CAST(value AS TEXT) END
+    FROM {source}, json_each({metadata})
+    WHERE json_valid({metadata}) AND json_type({metadata}) = 'object'
+      AND type NOT IN ('object', 'array', 'null')
+"""
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS audit_log_metadata_keys_insert AFTER INSERT ON audit_log
+    BEGIN
+        INSERT OR IGNORE INTO audit_log_metadata_keys (audit_log_id, key, value)
+        {EXTRACT.format(id='NEW.id', source='(SELECT 1)', metadata='NEW.metadata')};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS audit_log_metadata_keys_update AFTER UPDATE OF metadata ON audit_log
+    BEGIN
+        DELETE FROM audit_log_metadata_keys WHERE audit_log_id = OLD.id;
+        INSERT OR IGNORE INTO audit_log_metadata_keys (audit_log_id, key, value)
+        {EXTRACT.format(id='NEW.id', source='(SELECT 1)', metadata='NEW.metadata')};
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS audit_log_metadata_keys_delete AFTER DELETE ON audit_log
+    BEGIN
+        DELETE FROM audit_log_metadata_keys WHERE audit_log_id = OLD.id;
+    END
+    """,
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # Searched only where there is no JSONB (see AuditLogMetadataKey)
+    op.create_table('audit_log_metadata_keys',
+        sa.Column('audit_log_id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=100), nullable=False),
+        sa.Column('value', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('audit_log_id', 'key')
+    )
+    op.create_index('ix_audit_log_metadata_keys_key_value', 'audit_log_metadata_keys',
+                    ['key', 'value', 'audit_log_id'])
+
+    if bind.dialect.name == 'postgresql':
+        # jsonb_path_ops: smaller and faster than the default opclass, and
+        # containment (@>) is the only operator the search uses. Built per
+        # partition like ix_audit_log_entity_entity_id_created_at
+        partitions = bind.execute(sa.text("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass('audit_log')
+        """)).scalars().all()
+        op.execute(f'CREATE INDEX {NAME} ON ONLY audit_log USING gin (metadata jsonb_path_ops)')
+        with op.get_context().autocommit_block():
+            for partition in partitions:
+                op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_metadata '
+                           f'ON {partition} USING gin (metadata jsonb_path_ops)')
+                op.execute(f'ALTER INDEX {NAME} ATTACH PARTITION {partition}_metadata')
+        return
+
+    # No JSON index elsewhere: top-level keys are copied to the side table,
+    # kept current by triggers and backfilled from the existing rows
+    if bind.dialect.name == 'sqlite':
+        for trigger in TRIGGERS:
+            op.execute(trigger)
+        op.execute('INSERT OR IGNORE INTO audit_log_metadata_keys (audit_log_id, key, value) '
+                   + EXTRACT.format(id='audit_log.id', source='audit_log', metadata='audit_log.metadata'))
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        op.drop_index(NAME, table_name='audit_log')
+    elif bind.dialect.name == 'sqlite':
+        for trigger in ('insert', 'update', 'delete'):
+            op.execute(f'DROP TRIGGER IF EXISTS audit_log_metadata_keys_{trigger}')
+    op.drop_index('ix_audit_log_metadata_keys_key_value', table_name='audit_log_metadata_keys')
+    op.drop_table('audit_log_metadata_keys')
@@ -1,6 +1,8 @@
 from app import db
 from datetime import datetime
+from decimal import Decimal
 import bcrypt
+from sqlalchemy import event, DDL
 from sqlalchemy.dialects.postgresql import JSONB
 
 class User(db.Model):
@@ -36,13 +38,60 @@ class Account(db.Model):
     number = db.Column(db.String(20), unique=True, nullable=False)
     balance = db.Column(db.Numeric(15, 2), default=0.00)
     currency = db.Column(db.String(3), default='USD')
+    transaction_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Maintained on insert, see below
+    balance_shards = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 0 = single balance row
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     transactions = db.relationship('Transaction', backref='account', lazy=True)
+    shards = db.relationship('AccountBalanceShard', backref='account', lazy=True)
+    
+    @property
+    def total_balance(self):
+        """Public balance: the sum of the sub-balance shards for sharded accounts"""
+        if not self.balance_shards:
+            return self.balance
+        return sum((shard.balance for shard in self.shards), Decimal('0.00'))
+
+class AccountBalanceShard(db.Model):
+    """
+    Sub-balance of a high-volume account (see LedgerService.enable_sharding)
+    
+    Postings to a sharded account update one shard row instead of the single
+    accounts row, so concurrent postings only contend when they pick the same
+    shard. The account's balance and transaction_count live here, not on the
+    accounts row, once sharding is enabled.
+    """
+    __tablename__ = 'account_balance_shards'
+    
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True)
+    balance = db.Column(db.Numeric(15, 2), nullable=False, default=0.00)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+
+class AccountDailyBalance(db.Model):
+    """
+    Net balance change of an account per day (see BalanceHistoryService)
+    
+    LedgerService adds every posting's delta to the row for today in the
+    same transaction as the balance change, so a balance chart reads one row
+    per day instead of the account's transactions. Sharded accounts keep a
+    row per shard and day, so postings to different shards still do not
+    contend.
+    """
+    __tablename__ = 'account_daily_balances'
+    
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, default=0)
+    net_change = db.Column(db.Numeric(15, 2), nullable=False, default=0.00)
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        # Listings filter by account and page on (created_at, id)
+        db.Index('ix_transactions_account_id_created_at', 'account_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
@@ -52,6 +101,24 @@ class Transaction(db.Model):
     counterparty = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='Completed')  # Pending, Completed, Failed
+    # Account balance once this row was posted, from the ledger UPDATE in the
+    # same transaction; NULL until `flask backfill-balance-after` for older rows
+    balance_after = db.Column(db.Numeric(15, 2))
+    # 'credit' or 'debit', set when posted: the two legs of an internal
+    # transfer are both typed 'Transfer' and differ only in this
+    direction = db.Column(db.String(6), nullable=False)
+
+@event.listens_for(Transaction, 'after_insert')
+def increment_transaction_count(mapper, connection, target):
+    """Keep Account.transaction_count in step with every posted transaction"""
+    accounts = Account.__table__
+    # Sharded accounts are counted on the shard LedgerService posts to, so the
+    # hot accounts row is left alone
+    connection.execute(
+        accounts.update()
+        .where(accounts.c.id == target.account_id, accounts.c.balance_shards == 0)
+        .values(transaction_count=accounts.c.transaction_count + 1)
+    )
 
 class ExternalTransfer(db.Model):
     __tablename__ = 'external_transfers'
@@ -79,6 +146,9 @@ class Biller(db.Model):
 
 class Bill(db.Model):
     __tablename__ = 'bills'
+    __table_args__ = (
+        db.Index('ix_bills_user_id_created_at', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -94,11 +164,15 @@ class Bill(db.Model):
 
 class Schedule(db.Model):
     __tablename__ = 'schedules'
+    __table_args__ = (
+        # Scheduler polls for active tasks that are due
+        db.Index('ix_schedules_active_next_run_at', 'active', 'next_run_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     kind = db.Column(db.String(50), nullable=False)  # bill_payment, transfer
-    payload = db.Column(JSONB, nullable=False)  # JSON data for the scheduled task
+    payload = db.Column(JSONB().with_variant(db.JSON(), 'sqlite'), nullable=False)  # JSON data for the scheduled task
     next_run_at = db.Column(db.DateTime, nullable=False)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -141,6 +215,9 @@ class MobileDeposit(db.Model):
 
 class Alert(db.Model):
     __tablename__ = 'alerts'
+    __table_args__ = (
+        db.Index('ix_alerts_user_id_created_at', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -163,11 +240,132 @@ class AlertPrefs(db.Model):
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_log'
+    __table_args__ = (
+        db.Index('ix_audit_log_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_audit_log_entity_entity_id_created_at', 'entity', 'entity_id', 'created_at'),
+        # Metadata search (metadata @> ...); SQLite uses audit_log_metadata_keys instead
+        db.Index('ix_audit_log_metadata', 'metadata', postgresql_using='gin',
+                 postgresql_ops={'metadata': 'jsonb_path_ops'}).ddl_if(dialect='postgresql'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     action = db.Column(db.String(100), nullable=False)
     entity = db.Column(db.String(50), nullable=False)  # account, transaction, card, etc.
     entity_id = db.Column(db.Integer)
-    metadata = db.Column(JSONB)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    # 'metadata' is reserved on declarative models, so the attribute is metadata_
+    metadata_ = db.Column('metadata', JSONB().with_variant(db.JSON(), 'sqlite'))
+    # Partition key on PostgreSQL (monthly ranges, see AuditPartitionService)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class AuditLogMetadataKey(db.Model):
+    """
+    Top-level audit_log.metadata values, one row per key, for metadata
+    search where there is no JSONB/GIN (SQLite)
+    
+    Filled and cleaned up by triggers on audit_log, so every write path
+    (ORM, bulk inserts, the batched audit writer) keeps it current. Unused
+    on PostgreSQL, which searches metadata through its GIN index.
+    """
+    __tablename__ = 'audit_log_metadata_keys'
+    __table_args__ = (
+        db.Index('ix_audit_log_metadata_keys_key_value', 'key', 'value', 'audit_log_id'),
+    )
+    
+    audit_log_id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Text)  # Scalars as text (true/false for booleans); objects, arrays and nulls are skipped
+
+METADATA_KEY_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS audit_log_metadata_keys_insert AFTER INSERT ON audit_log
+    WHEN json_valid(NEW.metadata) AND json_type(NEW.metadata) = 'object'
+    BEGIN
+        INSERT OR IGNORE INTO audit_log_metadata_keys (audit_log_id, key, value)
+        SELECT NEW.id, key, CASE type WHEN 'true' THEN 'true' WHEN 'false' THEN 'false' ELSE CAST(value AS TEXT) END
+        FROM json_each(NEW.metadata)
+        WHERE type NOT IN ('object', 'array', 'null');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS audit_log_metadata_keys_update AFTER UPDATE OF metadata ON audit_log
+    BEGIN
+        DELETE FROM audit_log_metadata_keys WHERE audit_log_id = OLD.id;
+        INSERT OR IGNORE INTO audit_log_metadata_keys (audit_log_id, key, value)
+        SELECT NEW.id, key, CASE type WHEN 'true' THEN 'true' WHEN 'false' THEN 'false' ELSE CAST(value AS TEXT) END
+        FROM json_each(NEW.metadata)
+        WHERE json_valid(NEW.metadata) AND json_type(NEW.metadata) = 'object'
+          AND type NOT IN ('object', 'array', 'null');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS audit_log_metadata_keys_delete AFTER DELETE ON audit_log
+    BEGIN
+        DELETE FROM audit_log_metadata_keys WHERE audit_log_id = OLD.id;
+    END
+    """,
+]
+
+# After every table exists, so the triggers can reference both
+for trigger in METADATA_KEY_TRIGGERS:
+    event.listen(db.Model.metadata, 'after_create', DDL(trigger).execute_if(dialect='sqlite'))
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_id_key'),
+        db.Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(255), nullable=False)  # Client-supplied Idempotency-Key header
+    request_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of method, path and body
+    status = db.Column(db.String(20), nullable=False, default='in_progress')  # in_progress, completed
+    response_status = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    response_mimetype = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_email_outbox_to_email_status', 'to_email', 'status'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html_content = db.Column(db.Text, nullable=False)
+    text_content = db.Column(db.Text)
+    category = db.Column(db.String(20), nullable=False, default='general')  # general, alert (coalesced into digests)
+    payload = db.Column(db.Text)  # JSON alert details, used to build a digest
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, merged, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Also the lease expiry while sending
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+class StatementJob(db.Model):
+    """
+    A statement PDF rendered in the background (see StatementJobService)
+    
+    The file itself lives in the statement cache under cache_key, so jobs
+    for the same account, period and latest transaction share one render.
+    """
+    __tablename__ = 'statement_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, handed to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)  # Inclusive
+    cache_key = db.Column(db.String(100), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)  # When a render process picked it up
+    finished_at = db.Column(db.DateTime)
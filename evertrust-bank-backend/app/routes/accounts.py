@@ -4,11 +4,16 @@ from app import db
 from app.models import Account, User, AuditLog
 from app.schemas import AccountSchema
 from app.utils import validate_request
+from app.services import BalanceHistoryService
+from datetime import datetime, timedelta
 import random
 import string
 
 accounts_bp = Blueprint('accounts', __name__)
 
+HISTORY_INTERVALS = ('day', 'week', 'month')
+HISTORY_MAX_DAYS = 5 * 366
+
 def generate_account_number():
     return ''.join(random.choices(string.digits, k=12))
 
@@ -42,6 +47,47 @@ def get_account(account_id):
     
     return jsonify(AccountSchema().dump(account)), 200
 
+@accounts_bp.route('/<int:account_id>/balance-history', methods=['GET'])
+@jwt_required()
+def get_balance_history(account_id):
+    """
+    Balance of an account over time, for charts
+    
+    interval is day (default), week or month; optional start_date and
+    end_date (YYYY-MM-DD, inclusive) default to the year up to today and
+    may span at most HISTORY_MAX_DAYS days. Each point is the closing
+    balance of its period.
+    """
+    current_user_id = get_jwt_identity()
+    account = Account.query.filter_by(id=account_id, user_id=current_user_id).first()
+    if not account:
+        return jsonify({'message': 'Account not found'}), 404
+    
+    interval = request.args.get('interval', 'day')
+    if interval not in HISTORY_INTERVALS:
+        return jsonify({'message': 'Invalid interval', 'allowed': list(HISTORY_INTERVALS)}), 400
+    
+    try:
+        end_date = request.args.get('end_date')
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else datetime.utcnow().date()
+        start_date = request.args.get('start_date')
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else end_date - timedelta(days=364)
+    except ValueError:
+        return jsonify({'message': 'Dates must be YYYY-MM-DD'}), 400
+    if start_date > end_date:
+        return jsonify({'message': 'start_date must not be after end_date'}), 400
+    if (end_date - start_date).days >= HISTORY_MAX_DAYS:
+        return jsonify({'message': f'The range may span at most {HISTORY_MAX_DAYS} days'}), 400
+    
+    points = BalanceHistoryService.series(account, start_date, end_date, interval)
+    return jsonify({
+        'account_id': account.id,
+        'interval': interval,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'points': [{'date': day.isoformat(), 'balance': str(balance)} for day, balance in points]
+    }), 200
+
 @accounts_bp.route('', methods=['POST'])
 @jwt_required()
 def create_account():
@@ -63,7 +109,7 @@ def create_account():
         action='account_created',
         entity='account',
         entity_id=account.id,
-        metadata={'type': account.type}
+        metadata_={'type': account.type}
     )
     db.session.add(audit_log)
     db.session.commit()
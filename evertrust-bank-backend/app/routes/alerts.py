@@ -4,6 +4,7 @@ from app import db
 from app.models import Alert, AlertPrefs, AuditLog
 from app.schemas import AlertSchema, AlertPrefsSchema
 from app.utils import validate_request
+from app.services import UserContextService
 
 alerts_bp = Blueprint('alerts', __name__)
 
@@ -47,6 +48,7 @@ def get_alert_prefs():
         )
         db.session.add(prefs)
         db.session.commit()
+        UserContextService.invalidate(current_user_id)
     
     return jsonify(AlertPrefsSchema().dump(prefs)), 200
 
@@ -76,6 +78,7 @@ def update_alert_prefs():
         prefs.email_enabled = data['email_enabled']
     
     db.session.commit()
+    UserContextService.invalidate(current_user_id)
     
     # Log the preferences update
     audit_log = AuditLog(
@@ -83,7 +86,7 @@ def update_alert_prefs():
         action='alert_prefs_updated',
         entity='alert_prefs',
         entity_id=prefs.id,
-        metadata=data
+        metadata_=data
     )
     db.session.add(audit_log)
     db.session.commit()
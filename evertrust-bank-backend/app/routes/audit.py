@@ -0,0 +1,145 @@
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.schemas import AuditLogSchema
+from app.services import AuditService
+from app.utils import encode_cursor, decode_cursor
+from datetime import datetime, timedelta
+
+audit_bp = Blueprint('audit', __name__)
+
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json'
+}
+
+def parse_page_args():
+    """
+    Read limit, cursor and the from/to dates (YYYY-MM-DD, inclusive) of a listing
+    
+    Raises:
+        ValueError: If any of them is malformed
+    """
+    limit = min(int(request.args.get('limit', 50)), 100)  # Max 100 records
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    
+    cursor = request.args.get('cursor')
+    from_date = request.args.get('from')
+    to_date = request.args.get('to')
+    return (
+        limit,
+        decode_cursor(cursor) if cursor else None,
+        datetime.strptime(from_date, '%Y-%m-%d') if from_date else None,
+        datetime.strptime(to_date, '%Y-%m-%d') + timedelta(days=1) if to_date else None
+    )
+
+def events_page(events, limit):
+    # One extra row was fetched to learn whether another page exists
+    has_more = len(events) > limit
+    events = events[:limit]
+    
+    next_cursor = None
+    if has_more and events:
+        next_cursor = encode_cursor(events[-1].created_at, events[-1].id)
+    
+    return jsonify({
+        'events': AuditLogSchema(many=True).dump(events),
+        'has_more': has_more,
+        'next_cursor': next_cursor
+    }), 200
+
+@audit_bp.route('', methods=['GET'])
+@jwt_required()
+def get_audit_events():
+    """
+    List the caller's audit events, newest first
+    
+    Keyset pagination: pass the `next_cursor` of a page as `cursor` to get
+    the next one; cost does not grow with page depth.
+    """
+    current_user_id = get_jwt_identity()
+    try:
+        limit, before, since, until = parse_page_args()
+    except ValueError as e:
+        return jsonify({'message': 'Invalid pagination parameters', 'error': str(e)}), 400
+    
+    events = AuditService.get_user_events(current_user_id, limit=limit + 1, since=since, until=until, before=before)
+    return events_page(events, limit)
+
+@audit_bp.route('/<string:entity>/<int:entity_id>', methods=['GET'])
+@jwt_required()
+def get_entity_audit_events(entity, entity_id):
+    """
+    List the caller's audit events for one entity (e.g. /transaction/42), newest first
+    
+    Paginated like GET /audit.
+    """
+    current_user_id = get_jwt_identity()
+    try:
+        limit, before, since, until = parse_page_args()
+    except ValueError as e:
+        return jsonify({'message': 'Invalid pagination parameters', 'error': str(e)}), 400
+    
+    events = AuditService.get_entity_events(entity, entity_id, limit=limit + 1, since=since, until=until,
+                                            before=before, user_id=current_user_id)
+    return events_page(events, limit)
+
+@audit_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_audit_events():
+    """
+    Search the caller's audit events by metadata, newest first
+    
+    Each `metadata.<key>=<value>` parameter must match (e.g.
+    ?metadata.transaction_id=42&metadata.currency=USD); action and entity
+    narrow further. Paginated like GET /audit.
+    """
+    current_user_id = get_jwt_identity()
+    criteria = {
+        name[len('metadata.'):]: value
+        for name, value in request.args.items()
+        if name.startswith('metadata.') and len(name) > len('metadata.')
+    }
+    if not criteria:
+        return jsonify({'message': 'At least one metadata.<key> parameter is required'}), 400
+    
+    try:
+        limit, before, since, until = parse_page_args()
+    except ValueError as e:
+        return jsonify({'message': 'Invalid pagination parameters', 'error': str(e)}), 400
+    
+    events = AuditService.search_events(criteria, user_id=current_user_id, action=request.args.get('action'),
+                                        entity=request.args.get('entity'), limit=limit + 1, since=since,
+                                        until=until, before=before)
+    return events_page(events, limit)
+
+@audit_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_audit_events():
+    """
+    Stream the caller's audit history as NDJSON (default) or a JSON array
+    
+    Optional start_date and end_date (YYYY-MM-DD, inclusive) limit the range.
+    """
+    current_user_id = get_jwt_identity()
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({'message': 'format must be ndjson or json'}), 400
+    
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        start_date = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+        end_date = datetime.combine(datetime.strptime(end_date, '%Y-%m-%d'), datetime.max.time()) if end_date else None
+    except ValueError:
+        return jsonify({'message': 'Dates must be YYYY-MM-DD'}), 400
+    
+    # stream_with_context keeps the request (and its database session) alive
+    # while the body is generated
+    events = AuditService.stream_export(current_user_id, start_date, end_date, format=export_format)
+    return Response(
+        stream_with_context(events),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename=audit_events.{export_format}'}
+    )
@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 from app import db
-from app.models import User, AuditLog
+from app.models import User
+from app.services import AuditService
 from app.schemas import LoginSchema, RegisterSchema, ChangePasswordSchema
 from app.utils import validate_request
 
@@ -32,15 +33,13 @@ def signup():
     create_default_account(user.id)
     
     # Log the signup
-    audit_log = AuditLog(
+    AuditService.log_event(
         user_id=user.id,
         action='user_signup',
         entity='user',
         entity_id=user.id,
         metadata={'email': user.email}
     )
-    db.session.add(audit_log)
-    db.session.commit()
     
     # Generate tokens
     access_token = create_access_token(identity=user.id)
@@ -67,14 +66,12 @@ def login():
         return jsonify({'message': 'Invalid credentials'}), 401
     
     # Log the login
-    audit_log = AuditLog(
+    AuditService.log_event(
         user_id=user.id,
         action='user_login',
         entity='user',
         entity_id=user.id
     )
-    db.session.add(audit_log)
-    db.session.commit()
     
     # Generate tokens
     access_token = create_access_token(identity=user.id)
@@ -103,13 +100,11 @@ def logout():
     current_user_id = get_jwt_identity()
     
     # Log the logout
-    audit_log = AuditLog(
+    AuditService.log_event(
         user_id=current_user_id,
         action='user_logout',
         entity='user',
         entity_id=current_user_id
     )
-    db.session.add(audit_log)
-    db.session.commit()
     
     return jsonify({'message': 'Successfully logged out'}), 200
\ No newline at end of file
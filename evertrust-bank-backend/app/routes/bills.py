@@ -1,9 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models import Biller, Bill, Account, Transaction, AuditLog, Alert, AlertPrefs
+from app.models import Biller, Bill, Account, Transaction, AuditLog, Alert
 from app.schemas import BillerSchema, BillSchema
 from app.utils import validate_request
+from app.services import (UnitOfWork, LedgerService, InsufficientFundsError, UserContextService, IdempotencyService,
+                          idempotent)
 from decimal import Decimal
 from datetime import datetime, timedelta
 
@@ -37,7 +39,7 @@ def create_biller():
         action='biller_created',
         entity='biller',
         entity_id=biller.id,
-        metadata={'name': biller.name}
+        metadata_={'name': biller.name}
     )
     db.session.add(audit_log)
     db.session.commit()
@@ -46,92 +48,95 @@ def create_biller():
 
 @bills_bp.route('/pay', methods=['POST'])
 @jwt_required()
+@idempotent
 def pay_bill():
     current_user_id = get_jwt_identity()
     data = validate_request(BillSchema, request.get_json())
-    
-    # Verify account belongs to user
-    account = Account.query.filter_by(id=data['account_id'], user_id=current_user_id).first()
-    if not account:
-        return jsonify({'message': 'Account not found'}), 404
-    
-    # Verify biller belongs to user
-    biller = Biller.query.filter_by(id=data['biller_id'], user_id=current_user_id).first()
-    if not biller:
-        return jsonify({'message': 'Biller not found'}), 404
-    
-    # Check sufficient funds
-    if account.balance < Decimal(str(data['amount'])):
-        return jsonify({'message': 'Insufficient funds'}), 400
-    
-    # Create bill record
-    bill = Bill(
-        user_id=current_user_id,
-        biller_id=data['biller_id'],
-        account_id=data['account_id'],
-        amount=data['amount'],
-        status='Pending',
-        due_date=data.get('due_date', datetime.now() + timedelta(days=30))
-    )
-    
-    # Create transaction
-    transaction = Transaction(
-        account_id=data['account_id'],
-        type='Withdrawal',
-        amount=data['amount'],
-        description=f'Bill payment to {biller.name}',
-        counterparty=biller.name
-    )
-    
-    # Update account balance
-    account.balance -= Decimal(str(data['amount']))
-    
-    db.session.add(bill)
-    db.session.add(transaction)
-    
-    # Log the bill payment
-    audit_log = AuditLog(
-        user_id=current_user_id,
-        action='bill_paid',
-        entity='bill',
-        entity_id=bill.id,
-        metadata={
-            'biller': biller.name,
-            'amount': str(data['amount']),
-            'account_id': data['account_id']
-        }
-    )
-    db.session.add(audit_log)
-    
-    # Check for alerts
-    alert_prefs = AlertPrefs.query.filter_by(user_id=current_user_id).first()
-    
-    # Check for low balance alert
-    if alert_prefs and alert_prefs.low_balance and account.balance < alert_prefs.low_balance_threshold:
-        alert = Alert(
+    with UnitOfWork() as uow:
+        
+        # Verify account belongs to user
+        account = Account.query.filter_by(id=data['account_id'], user_id=current_user_id).first()
+        if not account:
+            return jsonify({'message': 'Account not found'}), 404
+        
+        # Verify biller belongs to user
+        biller = Biller.query.filter_by(id=data['biller_id'], user_id=current_user_id).first()
+        if not biller:
+            return jsonify({'message': 'Biller not found'}), 404
+        
+        # Create bill record; payment settles immediately, so it is written as
+        # completed in the same commit as the ledger change
+        bill = Bill(
             user_id=current_user_id,
-            type='low_balance',
-            message=f'Low balance alert: Account {account.number} has ${account.balance}'
+            biller_id=data['biller_id'],
+            account_id=data['account_id'],
+            amount=data['amount'],
+            status='Completed',
+            due_date=data.get('due_date', datetime.now() + timedelta(days=30)),
+            paid_date=datetime.now()
         )
-        db.session.add(alert)
-    
-    # Check for large transaction alert
-    if alert_prefs and alert_prefs.large_tx and data['amount'] >= alert_prefs.large_tx_threshold:
-        alert = Alert(
+        
+        # Create transaction
+        transaction = Transaction(
+            account_id=data['account_id'],
+            type='Withdrawal',
+            direction='debit',
+            amount=data['amount'],
+            description=f'Bill payment to {biller.name}',
+            counterparty=biller.name
+        )
+        
+        # Update account balance; the funds check happens in the same UPDATE
+        try:
+            transaction.balance_after = LedgerService.debit(account, data['amount'])
+        except InsufficientFundsError:
+            uow.rollback()
+            return jsonify({'message': 'Insufficient funds'}), 400
+        
+        db.session.add(bill)
+        db.session.add(transaction)
+        db.session.flush()  # Flush to get bill ID for the audit log
+        
+        # Log the bill payment
+        audit_log = AuditLog(
             user_id=current_user_id,
-            type='large_tx',
-            message=f'Large bill payment of ${data["amount"]} to {biller.name}'
+            action='bill_paid',
+            entity='bill',
+            entity_id=bill.id,
+            metadata_={
+                'biller': biller.name,
+                'amount': str(data['amount']),
+                'account_id': data['account_id']
+            }
         )
-        db.session.add(alert)
-    
-    db.session.commit()
-    
-    # Update bill status to completed
-    bill.status = 'Completed'
-    bill.paid_date = datetime.now()
-    db.session.commit()
-    
-    return jsonify(BillSchema().dump(bill)), 201
+        db.session.add(audit_log)
+        
+        # Check for alerts
+        alert_prefs = UserContextService.get(current_user_id).alert_prefs
+        
+        # Check for low balance alert
+        if alert_prefs and alert_prefs.low_balance and account.balance < alert_prefs.low_balance_threshold:
+            alert = Alert(
+                user_id=current_user_id,
+                type='low_balance',
+                message=f'Low balance alert: Account {account.number} has ${account.balance}'
+            )
+            db.session.add(alert)
+        
+        # Check for large transaction alert
+        if alert_prefs and alert_prefs.large_tx and data['amount'] >= alert_prefs.large_tx_threshold:
+            alert = Alert(
+                user_id=current_user_id,
+                type='large_tx',
+                message=f'Large bill payment of ${data["amount"]} to {biller.name}'
+            )
+            db.session.add(alert)
+        
+        response = make_response(jsonify(BillSchema().dump(bill)), 201)
+        IdempotencyService.complete_in(uow, response)
+        uow.commit()
+        
+        return response
 
 @bills_bp.route('', methods=['GET'])
 @jwt_required()
@@ -1,9 +1,10 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models import Card, AuditLog, Alert, AlertPrefs
+from app.models import Card, AuditLog, Alert
 from app.schemas import CardSchema
 from app.utils import validate_request
+from app.services import UserContextService
 from datetime import datetime, timedelta
 import random
 
@@ -89,12 +90,12 @@ def update_card(card_id):
         action='card_updated',
         entity='card',
         entity_id=card.id,
-        metadata=changes
+        metadata_=changes
     )
     db.session.add(audit_log)
     
     # Check for card change alert
-    alert_prefs = AlertPrefs.query.filter_by(user_id=current_user_id).first()
+    alert_prefs = UserContextService.get(current_user_id).alert_prefs
     if alert_prefs and alert_prefs.card_change and changes:
         alert = Alert(
             user_id=current_user_id,
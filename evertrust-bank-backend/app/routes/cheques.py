@@ -51,7 +51,7 @@ def request_cheque():
         action='cheque_requested',
         entity='cheque',
         entity_id=cheque.id,
-        metadata={
+        metadata_={
             'account_id': data['account_id'],
             'leaves': data.get('leaves', 25)
         }
@@ -1,9 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models import MobileDeposit, Account, AuditLog
+from app.models import MobileDeposit, Account, AuditLog, Transaction
 from app.schemas import MobileDepositSchema
 from app.utils import validate_request
+from app.services import UnitOfWork, LedgerService, IdempotencyService, idempotent
+from decimal import Decimal
 import os
 import uuid
 from datetime import datetime
@@ -12,6 +14,7 @@ deposits_bp = Blueprint('deposits', __name__)
 
 @deposits_bp.route('/mobile', methods=['POST'])
 @jwt_required()
+@idempotent
 def mobile_deposit():
     current_user_id = get_jwt_identity()
     
@@ -30,65 +33,70 @@ def mobile_deposit():
     
     account_id = data['account_id']
     amount = Decimal(data['amount'])
-    
-    # Verify account belongs to user
-    account = Account.query.filter_by(id=account_id, user_id=current_user_id).first()
-    if not account:
-        return jsonify({'message': 'Account not found'}), 404
-    
-    # Generate unique filename
-    file_ext = os.path.splitext(file.filename)[1]
-    filename = f"{uuid.uuid4()}{file_ext}"
-    
-    # In a real application, you would save the file to cloud storage
-    # For demo purposes, we'll just store the filename
-    
-    # Create mobile deposit record
-    deposit = MobileDeposit(
-        user_id=current_user_id,
-        account_id=account_id,
-        filename=filename,
-        amount=amount,
-        status='Pending'
-    )
-    
-    db.session.add(deposit)
-    
-    # Log the mobile deposit
-    audit_log = AuditLog(
-        user_id=current_user_id,
-        action='mobile_deposit',
-        entity='mobile_deposit',
-        entity_id=deposit.id,
-        metadata={
-            'account_id': account_id,
-            'amount': str(amount),
-            'filename': filename
-        }
-    )
-    db.session.add(audit_log)
-    db.session.commit()
-    
-    # Simulate processing after a delay
-    # In a real application, this would be handled by a background job
-    deposit.status = 'Processed'
-    deposit.processed_at = datetime.now()
-    
-    # Create transaction and update balance
-    transaction = Transaction(
-        account_id=account_id,
-        type='Deposit',
-        amount=amount,
-        description='Mobile deposit',
-        counterparty='Mobile Deposit'
-    )
-    
-    account.balance += amount
-    
-    db.session.add(transaction)
-    db.session.commit()
-    
-    return jsonify(MobileDepositSchema().dump(deposit)), 201
+    with UnitOfWork() as uow:
+        
+        # Verify account belongs to user
+        account = Account.query.filter_by(id=account_id, user_id=current_user_id).first()
+        if not account:
+            return jsonify({'message': 'Account not found'}), 404
+        
+        # Generate unique filename
+        file_ext = os.path.splitext(file.filename)[1]
+        filename = f"{uuid.uuid4()}{file_ext}"
+        
+        # In a real application, you would save the file to cloud storage
+        # For demo purposes, we'll just store the filename
+        
+        # Create mobile deposit record
+        deposit = MobileDeposit(
+            user_id=current_user_id,
+            account_id=account_id,
+            filename=filename,
+            amount=amount,
+            status='Pending'
+        )
+        
+        db.session.add(deposit)
+        db.session.flush()  # Flush to get deposit ID for the audit log
+        
+        # Log the mobile deposit
+        audit_log = AuditLog(
+            user_id=current_user_id,
+            action='mobile_deposit',
+            entity='mobile_deposit',
+            entity_id=deposit.id,
+            metadata_={
+                'account_id': account_id,
+                'amount': str(amount),
+                'filename': filename
+            }
+        )
+        db.session.add(audit_log)
+        
+        # Simulate processing after a delay
+        # In a real application, this would be handled by a background job
+        deposit.status = 'Processed'
+        deposit.processed_at = datetime.now()
+        
+        # Create transaction and update balance
+        transaction = Transaction(
+            account_id=account_id,
+            type='Deposit',
+            direction='credit',
+            amount=amount,
+            description='Mobile deposit',
+            counterparty='Mobile Deposit'
+        )
+        
+        transaction.balance_after = LedgerService.credit(account, amount)
+        
+        db.session.add(transaction)
+        
+        response = make_response(jsonify(MobileDepositSchema().dump(deposit)), 201)
+        IdempotencyService.complete_in(uow, response)
+        uow.commit()
+        
+        return response
 
 @deposits_bp.route('', methods=['GET'])
 @jwt_required()
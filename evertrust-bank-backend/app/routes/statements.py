@@ -1,16 +1,30 @@
 from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models import Account, Transaction, AuditLog
-from app.services.pdf_service import generate_statement_pdf
-from datetime import datetime, timedelta
-import io
+from app.models import Account, StatementJob
+from app.services import AuditService, StatementJobService
+from datetime import datetime
 
 statements_bp = Blueprint('statements', __name__)
 
+def job_status(job):
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'download_url': f'/api/v1/statements/{job.id}'
+    }
+
 @statements_bp.route('/generate', methods=['POST'])
 @jwt_required()
 def generate_statement():
+    """
+    Queue a statement PDF and return its job id
+    
+    The PDF is rendered by a background process; poll GET /statements/<job_id>,
+    which answers 202 until the file is ready and then returns it. A
+    statement that was already rendered (same account, period and latest
+    transaction) is ready at once.
+    """
     current_user_id = get_jwt_identity()
     
     data = request.get_json()
@@ -18,43 +32,61 @@ def generate_statement():
         return jsonify({'message': 'Missing required fields'}), 400
     
     account_id = data['account_id']
-    start_date = datetime.strptime(data['start_date'], '%Y-%m-%d')
-    end_date = datetime.strptime(data['end_date'], '%Y-%m-%d') + timedelta(days=1)  # Include end date
+    try:
+        start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'message': 'Dates must be YYYY-MM-DD'}), 400
     
     # Verify account belongs to user
     account = Account.query.filter_by(id=account_id, user_id=current_user_id).first()
     if not account:
         return jsonify({'message': 'Account not found'}), 404
     
-    # Get transactions for the date range
-    transactions = Transaction.query.filter(
-        Transaction.account_id == account_id,
-        Transaction.created_at >= start_date,
-        Transaction.created_at < end_date
-    ).order_by(Transaction.created_at.desc()).all()
-    
-    # Generate PDF
-    pdf_buffer = generate_statement_pdf(account, transactions, start_date, end_date)
+    job = StatementJobService.enqueue(current_user_id, account, start_date, end_date)
     
     # Log the statement generation
-    audit_log = AuditLog(
+    AuditService.log_event(
         user_id=current_user_id,
         action='statement_generated',
         entity='account',
         entity_id=account_id,
         metadata={
             'start_date': data['start_date'],
-            'end_date': data['end_date']
+            'end_date': data['end_date'],
+            'job_id': job.id
         }
     )
-    db.session.add(audit_log)
-    db.session.commit()
     
-    # Return PDF as download
-    pdf_buffer.seek(0)
+    return jsonify(job_status(job)), 200 if job.status == 'done' else 202
+
+@statements_bp.route('/<string:job_id>', methods=['GET'])
+@jwt_required()
+def get_statement(job_id):
+    """
+    Download a statement once its job is done, or report the job's status
+    """
+    current_user_id = get_jwt_identity()
+    
+    job = StatementJob.query.filter_by(id=job_id, user_id=current_user_id).first()
+    if not job:
+        return jsonify({'message': 'Statement not found'}), 404
+    
+    if job.status in ('queued', 'running') and StatementJobService.reap_stale(job.id):
+        db.session.refresh(job)
+    if job.status in ('queued', 'running'):
+        return jsonify(job_status(job)), 202
+    if job.status == 'failed':
+        return jsonify({**job_status(job), 'message': 'Statement generation failed'}), 500
+    
+    path = StatementJobService.cached_path(job.cache_key)
+    if path is None:
+        return jsonify({**job_status(job), 'message': 'Statement has expired, generate it again'}), 410
+    
+    account = db.session.get(Account, job.account_id)
     return send_file(
-        pdf_buffer,
+        path,
         as_attachment=True,
-        download_name=f"statement_{account.number}_{data['start_date']}_{data['end_date']}.pdf",
+        download_name=f"statement_{account.number}_{job.start_date:%Y-%m-%d}_{job.end_date:%Y-%m-%d}.pdf",
         mimetype='application/pdf'
-    )
\ No newline at end of file
+    )
@@ -1,20 +1,61 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models import Account, Transaction, ExternalTransfer, Alert, AlertPrefs, User
+from app.models import Account, AccountBalanceShard, Transaction, ExternalTransfer, Alert
 from app.schemas import TransactionSchema, ExternalTransferSchema
-from app.utils import validate_request
-from app.services import AuditService, EmailService
+from app.utils import validate_request, encode_cursor, decode_cursor
+from app.services import (AuditService, EmailService, UnitOfWork, LedgerService, InsufficientFundsError,
+                          UserContextService, TransactionExportService, IdempotencyService, idempotent)
 from decimal import Decimal
 from datetime import datetime
+from sqlalchemy import and_, or_, func
+from marshmallow import ValidationError
+from collections import defaultdict
 
 transactions_bp = Blueprint('transactions', __name__)
 
+COUNT_MODES = ('exact', 'estimate', 'none')
+BATCH_LIMIT = 5000
+BATCH_TYPES = ('Deposit', 'Withdrawal')
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'ofx': 'application/x-ofx',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+def estimate_count(query):
+    """
+    Estimate the number of rows a query returns without executing it
+    
+    Uses the planner's row estimate on PostgreSQL; other databases have no
+    cheap equivalent, so they fall back to an exact COUNT.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return query.count()
+    
+    compiled = query.statement.compile(
+        dialect=db.engine.dialect,
+        compile_kwargs={'render_postcompile': True}
+    )
+    plan = db.session.connection().exec_driver_sql(
+        f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params
+    ).scalar()
+    return int(plan[0]['Plan']['Plan Rows'])
+
 @transactions_bp.route('', methods=['GET'])
 @jwt_required()
 def get_transactions():
     """
     Get transactions with filtering options
+    
+    Supports two pagination modes:
+    - cursor: pass the `next_cursor` from a previous page as `cursor` (keyset
+      pagination on created_at, id; cost does not grow with page depth)
+    - offset: legacy `offset`/`limit` paging, kept for existing clients
+    
+    `total_count` for unfiltered listings comes from the per-account
+    transaction counter. Filtered listings (type/from/to) only count when
+    asked to via `count=exact|estimate`; the default is `none`.
     """
     try:
         current_user_id = get_jwt_identity()
@@ -24,27 +65,43 @@ def get_transactions():
         to_date = request.args.get('to')
         limit = min(int(request.args.get('limit', 50)), 100)  # Max 100 records
         offset = int(request.args.get('offset', 0))
+        cursor = request.args.get('cursor')
+        count_mode = request.args.get('count', 'none')
         
-        # Get user's accounts
-        accounts = Account.query.filter_by(user_id=current_user_id).all()
-        account_ids = [acc.id for acc in accounts]
+        if count_mode not in COUNT_MODES:
+            return jsonify({'message': 'Invalid count mode', 'allowed': list(COUNT_MODES)}), 400
         
-        if not account_ids:
-            return jsonify([]), 200
-        
-        # Build query
-        query = Transaction.query.filter(Transaction.account_id.in_(account_ids))
-        
-        if account_id and int(account_id) in account_ids:
-            query = query.filter_by(account_id=account_id)
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decode_cursor(cursor)
+            except ValueError:
+                return jsonify({'message': 'Invalid cursor'}), 400
+        
+        # Scope to the user's accounts with a join so ownership is enforced in
+        # the same statement instead of loading the user's Account rows first
+        query = Transaction.query.join(Account, Transaction.account_id == Account.id)\
+                                 .filter(Account.user_id == current_user_id)
+        # Sharded accounts keep their count on the shard rows and zero on the account
+        counter = db.session.query(
+            func.coalesce(func.sum(Account.transaction_count), 0) +
+            func.coalesce(func.sum(AccountBalanceShard.transaction_count), 0)
+        ).outerjoin(AccountBalanceShard, AccountBalanceShard.account_id == Account.id)\
+         .filter(Account.user_id == current_user_id)
+        filtered = False
+        
+        if account_id:
+            query = query.filter(Transaction.account_id == int(account_id))
+            counter = counter.filter(Account.id == int(account_id))
         
         if tx_type:
-            query = query.filter_by(type=tx_type)
+            query = query.filter(Transaction.type == tx_type)
+            filtered = True
         
         if from_date:
             try:
                 from_dt = datetime.strptime(from_date, '%Y-%m-%d')
                 query = query.filter(Transaction.created_at >= from_dt)
+                filtered = True
             except ValueError:
                 pass
         
@@ -52,20 +109,54 @@ def get_transactions():
             try:
                 to_dt = datetime.strptime(to_date, '%Y-%m-%d')
                 query = query.filter(Transaction.created_at <= to_dt)
+                filtered = True
             except ValueError:
                 pass
         
         # Get total count for pagination
-        total_count = query.count()
-        
-        transactions = query.order_by(Transaction.created_at.desc()).offset(offset).limit(limit).all()
+        total_count = None
+        if filtered and count_mode == 'exact':
+            total_count = query.count()
+        elif filtered and count_mode == 'estimate':
+            total_count = estimate_count(query)
+        
+        # id breaks ties between rows sharing a timestamp so pages never overlap
+        query = query.order_by(Transaction.created_at.desc(), Transaction.id.desc())
+        
+        if cursor:
+            query = query.filter(or_(
+                Transaction.created_at < cursor_created_at,
+                and_(Transaction.created_at == cursor_created_at, Transaction.id < cursor_id)
+            ))
+        else:
+            query = query.offset(offset)
+        
+        # Fetch one extra row to learn whether another page exists
+        query = query.limit(limit + 1)
+        
+        if filtered:
+            rows = query.all()
+        else:
+            # Unfiltered totals come from the account counters, read as a
+            # scalar subquery alongside the page rather than in a second query
+            rows = query.add_columns(counter.scalar_subquery()).all()
+            total_count = int(rows[0][1]) if rows else int(counter.scalar())
+            rows = [row[0] for row in rows]
+        
+        has_more = len(rows) > limit
+        transactions = rows[:limit]
+        
+        next_cursor = None
+        if has_more and transactions:
+            next_cursor = encode_cursor(transactions[-1].created_at, transactions[-1].id)
         
         return jsonify({
             'transactions': TransactionSchema(many=True).dump(transactions),
             'total_count': total_count,
-            'has_more': (offset + limit) < total_count
+            'has_more': has_more,
+            'next_cursor': next_cursor
         }), 200
-        
+    
     except Exception as e:
         AuditService.log_event(
             user_id=get_jwt_identity(),
@@ -75,454 +166,773 @@ def get_transactions():
         )
         return jsonify({'message': 'Failed to retrieve transactions', 'error': str(e)}), 500
 
+@transactions_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_transactions():
+    """
+    Stream the caller's full transaction history as CSV (default), OFX or Parquet
+    
+    Unlike GET /transactions there is no page size: rows go from a
+    server-side cursor straight into the response. accountId and type
+    filter as in the listing; optional start_date and end_date
+    (YYYY-MM-DD, inclusive) limit the range.
+    """
+    current_user_id = get_jwt_identity()
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({'message': 'Invalid export format', 'allowed': list(EXPORT_MIMETYPES)}), 400
+    if export_format == 'parquet' and not TransactionExportService.parquet_available():
+        return jsonify({'message': 'Parquet export is not available on this server'}), 501
+    
+    try:
+        account_id = request.args.get('accountId', type=int)
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        start_date = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+        end_date = datetime.combine(datetime.strptime(end_date, '%Y-%m-%d'), datetime.max.time()) if end_date else None
+    except ValueError:
+        return jsonify({'message': 'Dates must be YYYY-MM-DD'}), 400
+    
+    AuditService.log_event(
+        user_id=current_user_id,
+        action='transactions_exported',
+        entity='transaction',
+        metadata={'format': export_format, 'params': dict(request.args)}
+    )
+    
+    # stream_with_context keeps the request (and its database session) alive
+    # while the body is generated
+    rows = TransactionExportService.stream_export(
+        current_user_id,
+        format=export_format,
+        account_id=account_id,
+        tx_type=request.args.get('type'),
+        start_date=start_date,
+        end_date=end_date
+    )
+    return Response(
+        stream_with_context(rows),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename=transactions.{export_format}'}
+    )
+
 @transactions_bp.route('/deposit', methods=['POST'])
 @jwt_required()
+@idempotent
 def deposit():
     """
     Create a deposit transaction
     """
-    try:
-        current_user_id = get_jwt_identity()
-        data = validate_request(TransactionSchema, request.get_json())
-        
-        # Verify account belongs to user
-        account = Account.query.filter_by(id=data['account_id'], user_id=current_user_id).first()
-        if not account:
-            return jsonify({'message': 'Account not found'}), 404
-        
-        # Create transaction
-        transaction = Transaction(
-            account_id=data['account_id'],
-            type='Deposit',
-            amount=data['amount'],
-            description=data.get('description', 'Deposit'),
-            counterparty=data.get('counterparty', 'Self'),
-            status='Completed'
-        )
-        
-        # Update account balance
-        account.balance += Decimal(str(data['amount']))
-        
-        db.session.add(transaction)
-        db.session.flush()  # Flush to get transaction ID
-        
-        # Log audit event using AuditService
-        AuditService.log_event(
-            user_id=current_user_id,
-            action='deposit_created',
-            entity='transaction',
-            entity_id=transaction.id,
-            metadata={
-                'amount': str(data['amount']),
-                'account_id': data['account_id'],
-                'account_number': account.number,
-                'description': data.get('description', 'Deposit')
-            }
-        )
-        
-        # Check for alerts and send notifications
-        alert_prefs = AlertPrefs.query.filter_by(user_id=current_user_id).first()
-        user = User.query.get(current_user_id)
-        
-        if alert_prefs and alert_prefs.large_tx and data['amount'] >= alert_prefs.large_tx_threshold:
-            alert_message = f'Large deposit of ${data["amount"]:,.2f} to account {account.number}'
+    with UnitOfWork() as uow:
+        try:
+            current_user_id = get_jwt_identity()
+            data = validate_request(TransactionSchema, request.get_json())
+            
+            # Verify account belongs to user
+            account = Account.query.filter_by(id=data['account_id'], user_id=current_user_id).first()
+            if not account:
+                return jsonify({'message': 'Account not found'}), 404
+            
+            # Create transaction
+            transaction = Transaction(
+                account_id=data['account_id'],
+                type='Deposit',
+                direction='credit',
+                amount=data['amount'],
+                description=data.get('description', 'Deposit'),
+                counterparty=data.get('counterparty', 'Self'),
+                status='Completed'
+            )
+            
+            # Update account balance; the row records the balance it produced
+            transaction.balance_after = LedgerService.credit(account, data['amount'])
+            
+            db.session.add(transaction)
+            db.session.flush()  # Flush to get transaction ID
             
-            # Create alert in database
-            alert = Alert(
+            # Log audit event using AuditService
+            AuditService.log_event(
                 user_id=current_user_id,
-                type='large_tx',
-                message=alert_message
+                action='deposit_created',
+                entity='transaction',
+                entity_id=transaction.id,
+                metadata={
+                    'amount': str(data['amount']),
+                    'account_id': data['account_id'],
+                    'account_number': account.number,
+                    'description': data.get('description', 'Deposit')
+                }
             )
-            db.session.add(alert)
-            
-            # Send email notification if enabled
-            if alert_prefs.email_enabled and user.email:
-                EmailService.send_alert_notification(
-                    user_email=user.email,
-                    alert_type='large_deposit',
-                    message=alert_message,
-                    account_info=account.number
+            
+            # Check for alerts and send notifications
+            context = UserContextService.get(current_user_id)
+            alert_prefs = context.alert_prefs
+            user = context.user
+            
+            if alert_prefs and alert_prefs.large_tx and data['amount'] >= alert_prefs.large_tx_threshold:
+                alert_message = f'Large deposit of ${data["amount"]:,.2f} to account {account.number}'
+                
+                # Create alert in database
+                alert = Alert(
+                    user_id=current_user_id,
+                    type='large_tx',
+                    message=alert_message
                 )
-        
-        db.session.commit()
-        
-        # Send transaction receipt email
-        if user.email:
-            transaction_data = {
-                'type': 'Deposit',
-                'amount': f"{data['amount']:,.2f}",
-                'description': data.get('description', 'Deposit'),
-                'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'status': 'Completed',
-                'account': f"•••• {account.number[-4]}"
-            }
-            EmailService.send_async_email(
-                to_email=user.email,
-                subject=f"Deposit Receipt - ${data['amount']:,.2f}",
-                html_content=EmailService.send_transaction_receipt(user.email, transaction_data)
+                db.session.add(alert)
+                
+                # Send email notification if enabled
+                if alert_prefs.email_enabled and user.email:
+                    EmailService.queue_alert_notification(
+                        user_email=user.email,
+                        alert_type='large_deposit',
+                        message=alert_message,
+                        account_info=account.number
+                    )
+            
+            # Send transaction receipt email
+            if user.email:
+                transaction_data = {
+                    'type': 'Deposit',
+                    'amount': f"{data['amount']:,.2f}",
+                    'description': data.get('description', 'Deposit'),
+                    'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'status': 'Completed',
+                    'account': f"•••• {account.number[-4:]}"
+                }
+                EmailService.queue_transaction_receipt(
+                    user.email, transaction_data,
+                    subject=f"Deposit Receipt - ${data['amount']:,.2f}"
+                )
+            
+            response = make_response(jsonify(TransactionSchema().dump(transaction)), 201)
+            IdempotencyService.complete_in(uow, response)
+            uow.commit()
+            
+            return response
+        
+        except ValueError as e:
+            uow.rollback()
+            return jsonify({'message': 'Invalid request data', 'error': str(e)}), 400
+        except Exception as e:
+            uow.rollback()
+            AuditService.log_event(
+                user_id=current_user_id,
+                action='deposit_failed',
+                entity='transaction',
+                metadata={'error': str(e), 'data': data}
             )
-        
-        return jsonify(TransactionSchema().dump(transaction)), 201
-        
-    except ValueError as e:
-        db.session.rollback()
-        return jsonify({'message': 'Invalid request data', 'error': str(e)}), 400
-    except Exception as e:
-        db.session.rollback()
-        AuditService.log_event(
-            user_id=current_user_id,
-            action='deposit_failed',
-            entity='transaction',
-            metadata={'error': str(e), 'data': data}
-        )
-        return jsonify({'message': 'Deposit failed', 'error': str(e)}), 500
+            return jsonify({'message': 'Deposit failed', 'error': str(e)}), 500
 
 @transactions_bp.route('/withdraw', methods=['POST'])
 @jwt_required()
+@idempotent
 def withdraw():
     """
     Create a withdrawal transaction
     """
-    try:
-        current_user_id = get_jwt_identity()
-        data = validate_request(TransactionSchema, request.get_json())
-        
-        # Verify account belongs to user
-        account = Account.query.filter_by(id=data['account_id'], user_id=current_user_id).first()
-        if not account:
-            return jsonify({'message': 'Account not found'}), 404
-        
-        # Check sufficient funds
-        amount = Decimal(str(data['amount']))
-        if account.balance < amount:
-            return jsonify({'message': 'Insufficient funds'}), 400
-        
-        # Create transaction
-        transaction = Transaction(
-            account_id=data['account_id'],
-            type='Withdrawal',
-            amount=amount,
-            description=data.get('description', 'Withdrawal'),
-            counterparty=data.get('counterparty', 'Self'),
-            status='Completed'
-        )
-        
-        # Update account balance
-        account.balance -= amount
-        
-        db.session.add(transaction)
-        db.session.flush()
-        
-        # Log audit event
-        AuditService.log_event(
-            user_id=current_user_id,
-            action='withdrawal_created',
-            entity='transaction',
-            entity_id=transaction.id,
-            metadata={
-                'amount': str(amount),
-                'account_id': data['account_id'],
-                'account_number': account.number,
-                'description': data.get('description', 'Withdrawal')
-            }
-        )
-        
-        # Check for alerts and send notifications
-        alert_prefs = AlertPrefs.query.filter_by(user_id=current_user_id).first()
-        user = User.query.get(current_user_id)
-        
-        # Check for low balance alert
-        if alert_prefs and alert_prefs.low_balance and account.balance < alert_prefs.low_balance_threshold:
-            alert_message = f'Low balance alert: Account {account.number} has ${account.balance:,.2f}'
+    with UnitOfWork() as uow:
+        try:
+            current_user_id = get_jwt_identity()
+            data = validate_request(TransactionSchema, request.get_json())
             
-            alert = Alert(
-                user_id=current_user_id,
-                type='low_balance',
-                message=alert_message
+            # Verify account belongs to user
+            account = Account.query.filter_by(id=data['account_id'], user_id=current_user_id).first()
+            if not account:
+                return jsonify({'message': 'Account not found'}), 404
+            
+            amount = Decimal(str(data['amount']))
+            
+            # Create transaction
+            transaction = Transaction(
+                account_id=data['account_id'],
+                type='Withdrawal',
+                direction='debit',
+                amount=amount,
+                description=data.get('description', 'Withdrawal'),
+                counterparty=data.get('counterparty', 'Self'),
+                status='Completed'
             )
-            db.session.add(alert)
-            
-            if alert_prefs.email_enabled and user.email:
-                EmailService.send_alert_notification(
-                    user_email=user.email,
-                    alert_type='low_balance',
-                    message=alert_message,
-                    account_info=account.number
-                )
-        
-        # Check for large transaction alert
-        if alert_prefs and alert_prefs.large_tx and amount >= alert_prefs.large_tx_threshold:
-            alert_message = f'Large withdrawal of ${amount:,.2f} from account {account.number}'
             
-            alert = Alert(
+            # Update account balance; the funds check happens in the same UPDATE
+            try:
+                transaction.balance_after = LedgerService.debit(account, amount)
+            except InsufficientFundsError:
+                uow.rollback()
+                return jsonify({'message': 'Insufficient funds'}), 400
+            
+            db.session.add(transaction)
+            db.session.flush()
+            
+            # Log audit event
+            AuditService.log_event(
                 user_id=current_user_id,
-                type='large_tx',
-                message=alert_message
+                action='withdrawal_created',
+                entity='transaction',
+                entity_id=transaction.id,
+                metadata={
+                    'amount': str(amount),
+                    'account_id': data['account_id'],
+                    'account_number': account.number,
+                    'description': data.get('description', 'Withdrawal')
+                }
             )
-            db.session.add(alert)
-            
-            if alert_prefs.email_enabled and user.email:
-                EmailService.send_alert_notification(
-                    user_email=user.email,
-                    alert_type='large_withdrawal',
-                    message=alert_message,
-                    account_info=account.number
+            
+            # Check for alerts and send notifications
+            context = UserContextService.get(current_user_id)
+            alert_prefs = context.alert_prefs
+            user = context.user
+            
+            # Check for low balance alert
+            if alert_prefs and alert_prefs.low_balance and account.balance < alert_prefs.low_balance_threshold:
+                alert_message = f'Low balance alert: Account {account.number} has ${account.balance:,.2f}'
+                
+                alert = Alert(
+                    user_id=current_user_id,
+                    type='low_balance',
+                    message=alert_message
                 )
-        
-        db.session.commit()
-        
-        # Send transaction receipt
-        if user.email:
-            transaction_data = {
-                'type': 'Withdrawal',
-                'amount': f"{amount:,.2f}",
-                'description': data.get('description', 'Withdrawal'),
-                'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'status': 'Completed',
-                'account': f"•••• {account.number[-4]}"
-            }
-            EmailService.send_async_email(
-                to_email=user.email,
-                subject=f"Withdrawal Receipt - ${amount:,.2f}",
-                html_content=EmailService.send_transaction_receipt(user.email, transaction_data)
+                db.session.add(alert)
+                
+                if alert_prefs.email_enabled and user.email:
+                    EmailService.queue_alert_notification(
+                        user_email=user.email,
+                        alert_type='low_balance',
+                        message=alert_message,
+                        account_info=account.number
+                    )
+            
+            # Check for large transaction alert
+            if alert_prefs and alert_prefs.large_tx and amount >= alert_prefs.large_tx_threshold:
+                alert_message = f'Large withdrawal of ${amount:,.2f} from account {account.number}'
+                
+                alert = Alert(
+                    user_id=current_user_id,
+                    type='large_tx',
+                    message=alert_message
+                )
+                db.session.add(alert)
+                
+                if alert_prefs.email_enabled and user.email:
+                    EmailService.queue_alert_notification(
+                        user_email=user.email,
+                        alert_type='large_withdrawal',
+                        message=alert_message,
+                        account_info=account.number
+                    )
+            
+            # Send transaction receipt
+            if user.email:
+                transaction_data = {
+                    'type': 'Withdrawal',
+                    'amount': f"{amount:,.2f}",
+                    'description': data.get('description', 'Withdrawal'),
+                    'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'status': 'Completed',
+                    'account': f"•••• {account.number[-4:]}"
+                }
+                EmailService.queue_transaction_receipt(
+                    user.email, transaction_data,
+                    subject=f"Withdrawal Receipt - ${amount:,.2f}"
+                )
+            
+            response = make_response(jsonify(TransactionSchema().dump(transaction)), 201)
+            IdempotencyService.complete_in(uow, response)
+            uow.commit()
+            
+            return response
+        
+        except ValueError as e:
+            uow.rollback()
+            return jsonify({'message': 'Invalid request data', 'error': str(e)}), 400
+        except Exception as e:
+            uow.rollback()
+            AuditService.log_event(
+                user_id=current_user_id,
+                action='withdrawal_failed',
+                entity='transaction',
+                metadata={'error': str(e), 'data': data}
             )
-        
-        return jsonify(TransactionSchema().dump(transaction)), 201
-        
-    except ValueError as e:
-        db.session.rollback()
-        return jsonify({'message': 'Invalid request data', 'error': str(e)}), 400
-    except Exception as e:
-        db.session.rollback()
-        AuditService.log_event(
-            user_id=current_user_id,
-            action='withdrawal_failed',
-            entity='transaction',
-            metadata={'error': str(e), 'data': data}
-        )
-        return jsonify({'message': 'Withdrawal failed', 'error': str(e)}), 500
+            return jsonify({'message': 'Withdrawal failed', 'error': str(e)}), 500
 
 @transactions_bp.route('/transfer/internal', methods=['POST'])
 @jwt_required()
+@idempotent
 def internal_transfer():
     """
     Transfer between user's own accounts
     """
-    try:
-        current_user_id = get_jwt_identity()
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = ['from_account_id', 'to_account_id', 'amount']
-        if not all(k in data for k in required_fields):
-            return jsonify({'message': 'Missing required fields', 'required': required_fields}), 400
-        
-        from_account_id = data['from_account_id']
-        to_account_id = data['to_account_id']
-        amount = Decimal(str(data['amount']))
-        
-        # Verify accounts belong to user
-        from_account = Account.query.filter_by(id=from_account_id, user_id=current_user_id).first()
-        to_account = Account.query.filter_by(id=to_account_id, user_id=current_user_id).first()
-        
-        if not from_account or not to_account:
-            return jsonify({'message': 'Account not found'}), 404
-        
-        if from_account_id == to_account_id:
-            return jsonify({'message': 'Cannot transfer to the same account'}), 400
-        
-        # Check sufficient funds
-        if from_account.balance < amount:
-            return jsonify({'message': 'Insufficient funds'}), 400
-        
-        # Create withdrawal transaction
-        withdrawal = Transaction(
-            account_id=from_account_id,
-            type='Transfer',
-            amount=amount,
-            description=data.get('description', f'Transfer to account {to_account.number}'),
-            counterparty=f'Account {to_account.number}',
-            status='Completed'
-        )
-        
-        # Create deposit transaction
-        deposit = Transaction(
-            account_id=to_account_id,
-            type='Transfer',
-            amount=amount,
-            description=data.get('description', f'Transfer from account {from_account.number}'),
-            counterparty=f'Account {from_account.number}',
-            status='Completed'
-        )
-        
-        # Update balances
-        from_account.balance -= amount
-        to_account.balance += amount
-        
-        db.session.add(withdrawal)
-        db.session.add(deposit)
-        db.session.flush()
-        
-        # Log audit event
-        AuditService.log_event(
-            user_id=current_user_id,
-            action='internal_transfer_created',
-            entity='transaction',
-            entity_id=withdrawal.id,
-            metadata={
-                'from_account_id': from_account_id,
-                'from_account_number': from_account.number,
-                'to_account_id': to_account_id,
-                'to_account_number': to_account.number,
-                'amount': str(amount),
-                'description': data.get('description', '')
+    with UnitOfWork() as uow:
+        try:
+            current_user_id = get_jwt_identity()
+            data = request.get_json()
+            
+            # Validate required fields
+            required_fields = ['from_account_id', 'to_account_id', 'amount']
+            if not all(k in data for k in required_fields):
+                return jsonify({'message': 'Missing required fields', 'required': required_fields}), 400
+            
+            from_account_id = data['from_account_id']
+            to_account_id = data['to_account_id']
+            amount = Decimal(str(data['amount']))
+            
+            # Verify accounts belong to user
+            owned = {
+                account.id: account
+                for account in Account.query.filter(
+                    Account.id.in_([from_account_id, to_account_id]),
+                    Account.user_id == current_user_id
+                )
             }
-        )
-        
-        # Check for alerts and send notifications
-        alert_prefs = AlertPrefs.query.filter_by(user_id=current_user_id).first()
-        user = User.query.get(current_user_id)
-        
-        # Check for low balance alert on from_account
-        if alert_prefs and alert_prefs.low_balance and from_account.balance < alert_prefs.low_balance_threshold:
-            alert_message = f'Low balance alert: Account {from_account.number} has ${from_account.balance:,.2f}'
+            from_account = owned.get(from_account_id)
+            to_account = owned.get(to_account_id)
             
-            alert = Alert(
-                user_id=current_user_id,
-                type='low_balance',
-                message=alert_message
+            if not from_account or not to_account:
+                return jsonify({'message': 'Account not found'}), 404
+            
+            if from_account_id == to_account_id:
+                return jsonify({'message': 'Cannot transfer to the same account'}), 400
+            
+            # Create withdrawal transaction
+            withdrawal = Transaction(
+                account_id=from_account_id,
+                type='Transfer',
+                direction='debit',
+                amount=amount,
+                description=data.get('description', f'Transfer to account {to_account.number}'),
+                counterparty=f'Account {to_account.number}',
+                status='Completed'
             )
-            db.session.add(alert)
-            
-            if alert_prefs.email_enabled and user.email:
-                EmailService.send_alert_notification(
-                    user_email=user.email,
-                    alert_type='low_balance',
-                    message=alert_message,
-                    account_info=from_account.number
-                )
-        
-        # Check for large transaction alert
-        if alert_prefs and alert_prefs.large_tx and amount >= alert_prefs.large_tx_threshold:
-            alert_message = f'Large transfer of ${amount:,.2f} from account {from_account.number} to account {to_account.number}'
             
-            alert = Alert(
+            # Create deposit transaction
+            deposit = Transaction(
+                account_id=to_account_id,
+                type='Transfer',
+                direction='credit',
+                amount=amount,
+                description=data.get('description', f'Transfer from account {from_account.number}'),
+                counterparty=f'Account {from_account.number}',
+                status='Completed'
+            )
+            
+            # Update balances; both rows are locked in id order so opposing
+            # transfers between the same accounts cannot deadlock
+            try:
+                withdrawal.balance_after, deposit.balance_after = LedgerService.transfer(from_account, to_account, amount)
+            except InsufficientFundsError:
+                uow.rollback()
+                return jsonify({'message': 'Insufficient funds'}), 400
+            
+            db.session.add(withdrawal)
+            db.session.add(deposit)
+            db.session.flush()
+            
+            # Log audit event
+            AuditService.log_event(
                 user_id=current_user_id,
-                type='large_tx',
-                message=alert_message
+                action='internal_transfer_created',
+                entity='transaction',
+                entity_id=withdrawal.id,
+                metadata={
+                    'from_account_id': from_account_id,
+                    'from_account_number': from_account.number,
+                    'to_account_id': to_account_id,
+                    'to_account_number': to_account.number,
+                    'amount': str(amount),
+                    'description': data.get('description', '')
+                }
             )
-            db.session.add(alert)
-            
-            if alert_prefs.email_enabled and user.email:
-                EmailService.send_alert_notification(
-                    user_email=user.email,
-                    alert_type='large_transfer',
-                    message=alert_message,
-                    account_info=from_account.number
+            
+            # Check for alerts and send notifications
+            context = UserContextService.get(current_user_id)
+            alert_prefs = context.alert_prefs
+            user = context.user
+            
+            # Check for low balance alert on from_account
+            if alert_prefs and alert_prefs.low_balance and from_account.balance < alert_prefs.low_balance_threshold:
+                alert_message = f'Low balance alert: Account {from_account.number} has ${from_account.balance:,.2f}'
+                
+                alert = Alert(
+                    user_id=current_user_id,
+                    type='low_balance',
+                    message=alert_message
                 )
-        
-        db.session.commit()
-        
-        # Send transaction receipt
-        if user.email:
-            transaction_data = {
-                'type': 'Internal Transfer',
-                'amount': f"{amount:,.2f}",
-                'description': data.get('description', f'Transfer to account {to_account.number}'),
-                'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'status': 'Completed',
-                'account': f"•••• {from_account.number[-4]}"
-            }
-            EmailService.send_async_email(
-                to_email=user.email,
-                subject=f"Transfer Receipt - ${amount:,.2f}",
-                html_content=EmailService.send_transaction_receipt(user.email, transaction_data)
+                db.session.add(alert)
+                
+                if alert_prefs.email_enabled and user.email:
+                    EmailService.queue_alert_notification(
+                        user_email=user.email,
+                        alert_type='low_balance',
+                        message=alert_message,
+                        account_info=from_account.number
+                    )
+            
+            # Check for large transaction alert
+            if alert_prefs and alert_prefs.large_tx and amount >= alert_prefs.large_tx_threshold:
+                alert_message = f'Large transfer of ${amount:,.2f} from account {from_account.number} to account {to_account.number}'
+                
+                alert = Alert(
+                    user_id=current_user_id,
+                    type='large_tx',
+                    message=alert_message
+                )
+                db.session.add(alert)
+                
+                if alert_prefs.email_enabled and user.email:
+                    EmailService.queue_alert_notification(
+                        user_email=user.email,
+                        alert_type='large_transfer',
+                        message=alert_message,
+                        account_info=from_account.number
+                    )
+            
+            # Send transaction receipt
+            if user.email:
+                transaction_data = {
+                    'type': 'Internal Transfer',
+                    'amount': f"{amount:,.2f}",
+                    'description': data.get('description', f'Transfer to account {to_account.number}'),
+                    'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'status': 'Completed',
+                    'account': f"•••• {from_account.number[-4:]}"
+                }
+                EmailService.queue_transaction_receipt(
+                    user.email, transaction_data,
+                    subject=f"Transfer Receipt - ${amount:,.2f}"
+                )
+            
+            response = make_response(jsonify({
+                'message': 'Transfer successful',
+                'withdrawal': TransactionSchema().dump(withdrawal),
+                'deposit': TransactionSchema().dump(deposit)
+            }), 201)
+            IdempotencyService.complete_in(uow, response)
+            uow.commit()
+            
+            return response
+        
+        except ValueError as e:
+            uow.rollback()
+            return jsonify({'message': 'Invalid request data', 'error': str(e)}), 400
+        except Exception as e:
+            uow.rollback()
+            AuditService.log_event(
+                user_id=current_user_id,
+                action='internal_transfer_failed',
+                entity='transaction',
+                metadata={'error': str(e), 'data': data}
             )
-        
-        return jsonify({
-            'message': 'Transfer successful',
-            'withdrawal': TransactionSchema().dump(withdrawal),
-            'deposit': TransactionSchema().dump(deposit)
-        }), 201
-        
-    except ValueError as e:
-        db.session.rollback()
-        return jsonify({'message': 'Invalid request data', 'error': str(e)}), 400
-    except Exception as e:
-        db.session.rollback()
-        AuditService.log_event(
-            user_id=current_user_id,
-            action='internal_transfer_failed',
-            entity='transaction',
-            metadata={'error': str(e), 'data': data}
-        )
-        return jsonify({'message': 'Transfer failed', 'error': str(e)}), 500
+            return jsonify({'message': 'Transfer failed', 'error': str(e)}), 500
 
 @transactions_bp.route('/transfer/external', methods=['POST'])
 @jwt_required()
+@idempotent
 def external_transfer():
     """
     Transfer to external bank account
     """
-    try:
-        current_user_id = get_jwt_identity()
-        data = validate_request(ExternalTransferSchema, request.get_json())
-        
-        # Verify account belongs to user
-        from_account = Account.query.filter_by(id=data['from_account_id'], user_id=current_user_id).first()
-        if not from_account:
-            return jsonify({'message': 'Account not found'}), 404
-        
-        # Check sufficient funds (including fee)
-        amount = Decimal(str(data['amount']))
-        fee = Decimal('25.00')  # External transfer fee
-        
-        if from_account.balance < amount + fee:
-            return jsonify({'message': 'Insufficient funds'}), 400
-        
-        # Create external transfer record
-        transfer = ExternalTransfer(
-            user_id=current_user_id,
-            from_account_id=data['from_account_id'],
-            bank_name=data['bank_name'],
-            beneficiary_name=data['beneficiary_name'],
-            beneficiary_account=data['beneficiary_account'],
-            amount=amount,
-            fee=fee,
-            status='Processing'
-        )
-        
-        # Create transaction for the withdrawal
-        transaction = Transaction(
-            account_id=data['from_account_id'],
-            type='External Transfer',
-            amount=amount + fee,
-            description=f'External transfer to {data["beneficiary_name"]} at {data["bank_name"]}',
-            counterparty=data['beneficiary_name'],
-            status='Processing'
-        )
-        
-        # Update account balance
-        from_account.balance -= (amount + fee)
-        
-        db.session.add(transfer)
-        db.session.add(transaction)
-        db.session.flush()
+    with UnitOfWork() as uow:
+        try:
+            current_user_id = get_jwt_identity()
+            data = validate_request(ExternalTransferSchema, request.get_json())
+            
+            # Verify account belongs to user
+            from_account = Account.query.filter_by(id=data['from_account_id'], user_id=current_user_id).first()
+            if not from_account:
+                return jsonify({'message': 'Account not found'}), 404
+            
+            amount = Decimal(str(data['amount']))
+            fee = Decimal('25.00')  # External transfer fee
+            
+            # Create external transfer record
+            transfer = ExternalTransfer(
+                user_id=current_user_id,
+                from_account_id=data['from_account_id'],
+                bank_name=data['bank_name'],
+                beneficiary_name=data['beneficiary_name'],
+                beneficiary_account=data['beneficiary_account'],
+                amount=amount,
+                fee=fee,
+                status='Processing'
+            )
+            
+            # Create transaction for the withdrawal
+            transaction = Transaction(
+                account_id=data['from_account_id'],
+                type='External Transfer',
+                direction='debit',
+                amount=amount + fee,
+                description=f'External transfer to {data["beneficiary_name"]} at {data["bank_name"]}',
+                counterparty=data['beneficiary_name'],
+                status='Processing'
+            )
+            
+            # Update account balance; funds must cover the fee as well
+            try:
+                transaction.balance_after = LedgerService.debit(from_account, amount + fee)
+            except InsufficientFundsError:
+                uow.rollback()
+                return jsonify({'message': 'Insufficient funds'}), 400
+            
+            db.session.add(transfer)
+            db.session.add(transaction)
+            db.session.flush()
+            
+            # Log audit event
+            AuditService.log_event(
+                user_id=current_user_id,
+                action='external_transfer_created',
+                entity='external_transfer',
+                entity_id=transfer.id,
+                metadata={
+                    'from_account_id': data['from_account_id'],
+                    'from_account_number': from_account.number,
+                    'bank_name': data['bank_name'],
+                    'beneficiary_name': data['beneficiary_name'],
+                    'beneficiary_account': data['beneficiary_account'][-4:],  # Last 4 digits only
+                    'amount': str(amount),
+                    'fee': str(fee)
+                }
+            )
+            
+            # Check for alerts and send notifications
+            context = UserContextService.get(current_user_id)
+            alert_prefs = context.alert_prefs
+            user = context.user
+            
+            # Check for low balance alert
+            if alert_prefs and alert_prefs.low_balance and from_account.balance < alert_prefs.low_balance_threshold:
+                alert_message = f'Low balance alert: Account {from_account.number} has ${from_account.balance:,.2f}'
+                
+                alert = Alert(
+                    user_id=current_user_id,
+                    type='low_balance',
+                    message=alert_message
+                )
+                db.session.add(alert)
+                
+                if alert_prefs.email_enabled and user.email:
+                    EmailService.queue_alert_notification(
+                        user_email=user.email,
+                        alert_type='low_balance',
+                        message=alert_message,
+                        account_info=from_account.number
+                    )
+            
+            # Check for large transaction alert
+            if alert_prefs and alert_prefs.large_tx and amount >= alert_prefs.large_tx_threshold:
+                alert_message = f'Large external transfer of ${amount:,.2f} to {data["beneficiary_name"]} at {data["bank_name"]}'
+                
+                alert = Alert(
+                    user_id=current_user_id,
+                    type='large_tx',
+                    message=alert_message
+                )
+                db.session.add(alert)
+                
+                if alert_prefs.email_enabled and user.email:
+                    EmailService.queue_alert_notification(
+                        user_email=user.email,
+                        alert_type='large_transfer',
+                        message=alert_message,
+                        account_info=from_account.number
+                    )
+            
+            # Send transaction receipt
+            if user.email:
+                transaction_data = {
+                    'type': 'External Transfer',
+                    'amount': f"{amount + fee:,.2f}",
+                    'description': f'External transfer to {data["beneficiary_name"]} at {data["bank_name"]}',
+                    'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'status': 'Processing',
+                    'account': f"•••• {from_account.number[-4:]}"
+                }
+                EmailService.queue_transaction_receipt(
+                    user.email, transaction_data,
+                    subject=f"External Transfer Receipt - ${amount:,.2f}"
+                )
+            
+            response = make_response(jsonify({
+                'message': 'External transfer initiated',
+                'transfer': ExternalTransferSchema().dump(transfer),
+                'transaction': TransactionSchema().dump(transaction)
+            }), 201)
+            IdempotencyService.complete_in(uow, response)
+            uow.commit()
+            
+            return response
+        
+        except ValueError as e:
+            uow.rollback()
+            return jsonify({'message': 'Invalid request data', 'error': str(e)}), 400
+        except Exception as e:
+            uow.rollback()
+            AuditService.log_event(
+                user_id=current_user_id,
+                action='external_transfer_failed',
+                entity='external_transfer',
+                metadata={'error': str(e), 'data': data}
+            )
+            return jsonify({'message': 'External transfer failed', 'error': str(e)}), 500
+
+@transactions_bp.route('/batch', methods=['POST'])
+@jwt_required()
+@idempotent
+def batch_postings():
+    """
+    Post many deposits and withdrawals in one request
+    
+    Items are validated together, checked against the owner's accounts with a
+    single query and applied in request order against the locked balances;
+    items that fail validation or lack funds are rejected individually while
+    the rest are posted. Balance changes are netted per account and written
+    with one UPDATE, and Transaction rows are bulk inserted.
+    
+    Alerts are recorded in the database but not emailed, since batches come
+    from back-office integrations rather than the account holder.
+    """
+    with UnitOfWork() as uow:
+        try:
+            current_user_id = get_jwt_identity()
+            postings = (request.get_json() or {}).get('postings')
+            
+            if not isinstance(postings, list) or not postings:
+                return jsonify({'message': 'postings must be a non-empty list'}), 400
+            if len(postings) > BATCH_LIMIT:
+                return jsonify({'message': f'A batch may contain at most {BATCH_LIMIT} postings'}), 400
+            
+            # Validate every item up front with a single schema instance
+            schema = TransactionSchema()
+            results = [None] * len(postings)
+            valid = []
+            for index, item in enumerate(postings):
+                try:
+                    data = schema.load(item)
+                except ValidationError as err:
+                    results[index] = {'index': index, 'status': 'rejected', 'errors': err.messages}
+                    continue
+                if data['type'] not in BATCH_TYPES:
+                    results[index] = {'index': index, 'status': 'rejected',
+                                      'errors': {'type': [f'Must be one of: {", ".join(BATCH_TYPES)}.']}}
+                    continue
+                valid.append((index, data))
+            
+            # One ownership lookup for every account in the batch, locked in id
+            # order like every other multi-account balance change
+            account_ids = {data['account_id'] for _, data in valid}
+            accounts = {
+                account.id: account
+                for account in Account.query.filter(
+                    Account.user_id == current_user_id,
+                    Account.id.in_(account_ids)
+                ).order_by(Account.id).with_for_update()
+            } if account_ids else {}
+            
+            # Apply items in request order against running balances
+            available = {account_id: account.total_balance for account_id, account in accounts.items()}
+            deltas = defaultdict(Decimal)
+            counts = defaultdict(int)
+            accepted = []
+            for index, data in valid:
+                account_id = data['account_id']
+                amount = Decimal(str(data['amount']))
+                if account_id not in accounts:
+                    results[index] = {'index': index, 'status': 'rejected', 'errors': {'account_id': ['Account not found']}}
+                    continue
+                if data['type'] == 'Withdrawal':
+                    if available[account_id] < amount:
+                        results[index] = {'index': index, 'status': 'rejected', 'errors': {'amount': ['Insufficient funds']}}
+                        continue
+                    amount = -amount
+                available[account_id] += amount
+                deltas[account_id] += amount
+                counts[account_id] += 1
+                # An unsharded account is locked, so its running balance is each
+                # row's balance_after. Postings to a sharded account never lock
+                # its accounts row, so its balance here may be stale and the rows
+                # are left for the backfill (see LedgerService)
+                balance_after = None if accounts[account_id].balance_shards else available[account_id]
+                accepted.append((index, data, balance_after))
+            
+            if accepted:
+                try:
+                    LedgerService.apply_batch(accounts, deltas, counts)
+                except InsufficientFundsError:
+                    # Balances moved between the lock and the update; nothing is posted
+                    uow.rollback()
+                    return jsonify({'message': 'Insufficient funds, batch not applied'}), 409
+                
+                posted_at = datetime.utcnow()
+                rows = [
+                    {
+                        'account_id': data['account_id'],
+                        'type': data['type'],
+                        'direction': 'debit' if data['type'] == 'Withdrawal' else 'credit',
+                        'amount': data['amount'],
+                        'description': data.get('description', data['type']),
+                        'counterparty': data.get('counterparty', 'Self'),
+                        'created_at': posted_at,
+                        'status': 'Completed',
+                        'balance_after': balance_after
+                    }
+                    for _, data, balance_after in accepted
+                ]
+                table = Transaction.__table__
+                transaction_ids = db.session.execute(
+                    table.insert().returning(table.c.id, sort_by_parameter_order=True), rows
+                ).scalars().all()
+                
+                for (index, data, _), transaction_id in zip(accepted, transaction_ids):
+                    results[index] = {'index': index, 'status': 'posted', 'transaction_id': transaction_id}
+                
+                AuditService.log_event(
+                    user_id=current_user_id,
+                    action='batch_posted',
+                    entity='transaction',
+                    entity_id=transaction_ids[0],
+                    metadata={
+                        'posted': len(accepted),
+                        'rejected': len(postings) - len(accepted),
+                        'transaction_ids': [transaction_ids[0], transaction_ids[-1]],
+                        'net_by_account': {str(account_id): str(delta) for account_id, delta in deltas.items()}
+                    }
+                )
+                
+                # Check for alerts once per batch rather than once per posting
+                alert_prefs = UserContextService.get(current_user_id).alert_prefs
+                alerts = []
+                if alert_prefs and alert_prefs.large_tx:
+                    alerts.extend(
+                        {'user_id': current_user_id, 'type': 'large_tx', 'created_at': posted_at, 'read': False,
+                         'message': f'Large {data["type"].lower()} of ${data["amount"]:,.2f} on account {accounts[data["account_id"]].number}'}
+                        for _, data, _ in accepted if data['amount'] >= alert_prefs.large_tx_threshold
+                    )
+                if alert_prefs and alert_prefs.low_balance:
+                    alerts.extend(
+                        {'user_id': current_user_id, 'type': 'low_balance', 'created_at': posted_at, 'read': False,
+                         'message': f'Low balance alert: Account {accounts[account_id].number} has ${available[account_id]:,.2f}'}
+                        for account_id in sorted(deltas) if available[account_id] < alert_prefs.low_balance_threshold
+                    )
+                if alerts:
+                    db.session.execute(Alert.__table__.insert(), alerts)
+            
+            response = make_response(jsonify({
+                'posted': len(accepted),
+                'rejected': len(postings) - len(accepted),
+                'results': results
+            }), 201 if accepted else 400)
+            IdempotencyService.complete_in(uow, response)
+            uow.commit()
+            
+            return response
         
-        # Log audit event
-        AuditService.log_event(
-            user_id=current_user_id,
-            action='external_transfer_created',
-            entity='external_transfer',
-            entity_id=transfer.id,
-            metadata={
-                'from_account_id': data['from_account_id'],
-                'from_account_number': from_account.number,
-                'bank_name': data['bank_name'],
-                'beneficiary_name': data['beneficiary_name'],
-                'beneficiary_account': data['beneficiary_account'][-4:],  # Last 4 digits only
-                'amount': str(amount),
-                'fee': str(fee)
-            }
-        )
-    
\ No newline at end of file
+        except Exception as e:
+            uow.rollback()
+            AuditService.log_event(
+                user_id=current_user_id,
+                action='batch_posting_failed',
+                entity='transaction',
+                metadata={'error': str(e)}
+            )
+            return jsonify({'message': 'Batch posting failed', 'error': str(e)}), 500
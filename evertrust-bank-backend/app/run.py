@@ -5,6 +5,7 @@ Development server entry point for EverTrust Bank
 
 from app import create_app
 from flask_migrate import Migrate
+import click
 import os
 
 app = create_app()
@@ -23,6 +24,182 @@ def seed_db():
     from scripts.seed_database import seed_database
     seed_database()
 
+@app.cli.command("shard-account")
+@click.argument("account_number")
+@click.option("--shards", default=8, show_default=True, help="Number of sub-balance shards")
+def shard_account(account_number, shards):
+    """Spread a high-volume account's balance across sub-balance shards"""
+    from app import db
+    from app.models import Account
+    from app.services import LedgerService
+    
+    account = Account.query.filter_by(number=account_number).first()
+    if not account:
+        raise click.ClickException(f"Account {account_number} not found")
+    
+    LedgerService.enable_sharding(account, shards)
+    db.session.commit()
+    print(f"Account {account_number} now uses {shards} balance shards")
+
+@app.cli.command("backfill-balance-after")
+@click.option("--workers", default=4, show_default=True, help="Processes; 0 runs in this process")
+@click.option("--recompute", is_flag=True, help="Also recompute rows that already have a balance_after")
+def backfill_balance_after(workers, recompute):
+    """Fill in transactions.balance_after, in parallel per account"""
+    import time
+    from app.services import LedgerService
+    
+    started = time.perf_counter()
+    accounts, rows = LedgerService.backfill_all(workers=workers, recompute=recompute)
+    print(f"Updated {rows} transactions across {accounts} accounts in {time.perf_counter() - started:.1f}s")
+
+@app.cli.command("month-end-statements")
+@click.option("--month", help="Month to render as YYYY-MM  [default: last month]")
+@click.option("--output-dir", help="Base directory  [default: STATEMENT_RUN_DIR]")
+@click.option("--workers", default=os.cpu_count(), show_default=True, help="Processes; 0 renders in this process")
+@click.option("--chunk-size", default=25, show_default=True, help="Accounts per task")
+def month_end_statements(month, output_dir, workers, chunk_size):
+    """Render every account's statement for a month; rerun to resume"""
+    from datetime import date, datetime, timedelta
+    from app.services import StatementRunService
+    
+    if month:
+        try:
+            start_date = datetime.strptime(month, "%Y-%m").date()
+        except ValueError:
+            raise click.BadParameter("must be YYYY-MM", param_hint="--month")
+    else:
+        start_date = (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
+    end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    run_dir = os.path.join(output_dir or app.config['STATEMENT_RUN_DIR'], f"{start_date:%Y-%m}")
+    
+    def progress(entry):
+        if entry['status'] != 'done':
+            print(f"Account {entry['account_number']} failed: {entry['error']}")
+    
+    summary = StatementRunService.run(start_date, end_date, run_dir, workers=workers, chunk_size=chunk_size,
+                                      progress=progress)
+    rate = summary['rendered'] / summary['seconds'] if summary['seconds'] else 0
+    print(f"{start_date:%Y-%m}: rendered {summary['rendered']}, failed {summary['failed']}, "
+          f"already done {summary['skipped']} in {summary['seconds']:.1f}s ({rate:.1f} accounts/s)")
+    print(f"Statements and manifest in {os.path.abspath(run_dir)}")
+
+@app.cli.command("backfill-balance-history")
+@click.option("--batch", default=500, show_default=True, help="Accounts rebuilt per transaction")
+def backfill_balance_history(batch):
+    """Rebuild the daily balance rollup behind balance-history charts"""
+    import time
+    from app import db
+    from app.models import Account
+    from app.services import BalanceHistoryService
+    
+    started = time.perf_counter()
+    account_ids = [account_id for (account_id,) in db.session.query(Account.id).order_by(Account.id)]
+    rows = 0
+    for start in range(0, len(account_ids), batch):
+        rows += BalanceHistoryService.backfill(account_ids[start:start + batch])
+        db.session.commit()
+    print(f"Wrote {rows} daily rows for {len(account_ids)} accounts in {time.perf_counter() - started:.1f}s")
+
+@app.cli.command("purge-idempotency-keys")
+def purge_idempotency_keys():
+    """Delete expired idempotency keys"""
+    from app.services import IdempotencyService
+    
+    deleted = IdempotencyService.purge_expired()
+    print(f"Deleted {deleted} expired idempotency keys")
+
+@app.cli.command("purge-statement-cache")
+def purge_statement_cache():
+    """Fail stuck statement jobs and delete expired cached statements"""
+    from app.services import StatementJobService
+    
+    failed = StatementJobService.reap_stale()
+    deleted = StatementJobService.prune_cache()
+    print(f"Failed {failed} stuck statement jobs, deleted {deleted} expired statement files")
+
+@app.cli.command("email-worker")
+@click.option("--workers", default=4, show_default=True, help="Concurrent SMTP senders")
+@click.option("--batch-size", default=50, show_default=True, help="Messages claimed per batch")
+@click.option("--poll-interval", default=2.0, show_default=True, help="Seconds to sleep when the outbox is empty")
+@click.option("--once", is_flag=True, help="Exit once the outbox is drained")
+def email_worker(workers, batch_size, poll_interval, once):
+    """Send queued emails from the outbox"""
+    from app.services import EmailOutboxWorker
+    
+    worker = EmailOutboxWorker(workers=workers, batch_size=batch_size)
+    totals = worker.run(poll_interval=poll_interval, once=once)
+    print(f"Sent {totals['sent']} emails ({totals['merged']} alerts merged into digests), "
+          f"{totals['failed']} failed attempts")
+
+@app.cli.command("email-outbox-stats")
+def email_outbox_stats():
+    """Show outbox counts by status and the sends saved by alert digests"""
+    from app.services import EmailOutboxWorker
+    
+    counts = EmailOutboxWorker.stats()
+    for status in ('pending', 'sending', 'sent', 'merged', 'failed'):
+        print(f"{status:<8} {counts.get(status, 0)}")
+    
+    delivered = counts.get('sent', 0) + counts.get('merged', 0)
+    if delivered:
+        print(f"Digests saved {counts.get('merged', 0)} of {delivered} alert and email sends")
+
+@app.cli.command("audit-partitions")
+@click.option("--months-ahead", type=int, default=None, help="Months past the current one to prepare [default: AUDIT_PARTITION_MONTHS_AHEAD]")
+def audit_partitions(months_ahead):
+    """Create upcoming monthly audit_log partitions (PostgreSQL)"""
+    from app.services import AuditPartitionService
+    
+    if not AuditPartitionService.is_partitioned():
+        print("audit_log is not partitioned on this database; nothing to do")
+        return
+    
+    if months_ahead is None:
+        months_ahead = app.config['AUDIT_PARTITION_MONTHS_AHEAD']
+    created = AuditPartitionService.create_partitions(months_ahead)
+    print(f"Created {len(created)} audit_log partitions" + (f": {', '.join(created)}" if created else ""))
+    
+    pending = [name for name, _ in AuditPartitionService.detached()]
+    if pending:
+        print(f"Detached but not yet archived (run archive-audit-log): {', '.join(pending)}")
+
+@app.cli.command("archive-audit-log")
+@click.option("--retention-months", type=int, default=None, help="Whole months to keep [default: AUDIT_RETENTION_MONTHS]")
+@click.option("--directory", default=None, help="Archive directory [default: AUDIT_ARCHIVE_DIR]")
+def archive_audit_log(retention_months, directory):
+    """Move audit events past the retention period to gzipped NDJSON files"""
+    from app.services import AuditPartitionService
+    
+    if retention_months is None:
+        retention_months = app.config['AUDIT_RETENTION_MONTHS']
+    cutoff = AuditPartitionService.retention_cutoff(retention_months)
+    
+    archived = AuditPartitionService.archive(cutoff, directory or app.config['AUDIT_ARCHIVE_DIR'])
+    for path, rows in archived:
+        print(f"Archived {rows} audit events to {path}")
+    print(f"Archived {sum(rows for _, rows in archived)} audit events older than {cutoff:%Y-%m-%d}")
+
+@app.cli.command("audit-search")
+@click.argument("criteria", nargs=-1, required=True)
+@click.option("--user-id", type=int, default=None, help="Only events performed by this user")
+@click.option("--action", default=None, help="Only events with this action")
+@click.option("--limit", type=int, default=100, show_default=True)
+def audit_search(criteria, user_id, action, limit):
+    """Print audit events (NDJSON) whose metadata matches every KEY=VALUE"""
+    import json
+    from app.schemas import AuditLogSchema
+    from app.services import AuditService
+    
+    try:
+        criteria = dict(criterion.split('=', 1) for criterion in criteria)
+    except ValueError:
+        raise click.BadParameter("criteria must be KEY=VALUE")
+    
+    schema = AuditLogSchema()
+    for event in AuditService.search_events(criteria, user_id=user_id, action=action, limit=limit):
+        print(json.dumps(schema.dump(event)))
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=app.config['DEBUG'])
\ No newline at end of file
@@ -14,7 +14,7 @@ class AccountSchema(Schema):
     user_id = fields.Int(dump_only=True)
     type = fields.Str(required=True, validate=validate.Length(min=2, max=50))
     number = fields.Str(dump_only=True)
-    balance = fields.Decimal(as_string=True, dump_only=True)
+    balance = fields.Decimal(attribute='total_balance', as_string=True, dump_only=True)
     currency = fields.Str(dump_only=True)
     created_at = fields.DateTime(dump_only=True)
 
@@ -106,6 +106,15 @@ class AlertPrefsSchema(Schema):
     card_change = fields.Bool()
     email_enabled = fields.Bool()
 
+class AuditLogSchema(Schema):
+    id = fields.Int(dump_only=True)
+    user_id = fields.Int(dump_only=True)
+    action = fields.Str(dump_only=True)
+    entity = fields.Str(dump_only=True)
+    entity_id = fields.Int(dump_only=True)
+    metadata = fields.Raw(dump_only=True, attribute='metadata_')
+    created_at = fields.DateTime(dump_only=True)
+
 # Auth schemas
 class LoginSchema(Schema):
     email = fields.Email(required=True)
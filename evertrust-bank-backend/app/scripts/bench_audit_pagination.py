@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark for audit log pagination on a multi-million-row audit_log
+Compares page-N latency of offset paging against keyset (cursor) paging
+for a user's events and for an entity's events, on the (user_id, created_at)
+and (entity, entity_id, created_at) indexes
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+USERS = 5
+ENTITIES = 50
+
+def seed_audit_log(db, rows, batch_size=20000):
+    """Bulk insert `rows` events, one second apart, spread over USERS users and ENTITIES accounts"""
+    from app.models import AuditLog
+    
+    start = datetime.utcnow() - timedelta(seconds=rows)
+    for batch_start in range(0, rows, batch_size):
+        db.session.execute(AuditLog.__table__.insert(), [
+            {
+                'user_id': 1 + i % USERS,
+                'action': 'deposit_created' if i % 3 else 'user_login',
+                'entity': 'account',
+                'entity_id': 1 + i % ENTITIES,
+                'metadata': {'sequence': i},
+                'created_at': start + timedelta(seconds=i)
+            }
+            for i in range(batch_start, min(batch_start + batch_size, rows))
+        ])
+        db.session.commit()
+
+def median_ms(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def run_listing(label, fetch, matching, limit, pages, repeat):
+    print(f"\n{label} ({matching} matching events)")
+    print(f"{'page':>8} {'offset ms':>12} {'cursor ms':>12}")
+    for page in pages:
+        offset = page * limit
+        if offset >= matching:
+            break
+        
+        offset_ms = median_ms(lambda: fetch(limit=limit, offset=offset), repeat)
+        
+        # The cursor for page N is the position of the last row on page N-1
+        cursor_ms = offset_ms
+        if offset:
+            anchor = fetch(limit=1, offset=offset - 1)[0]
+            before = (anchor.created_at, anchor.id)
+            cursor_ms = median_ms(lambda: fetch(limit=limit, before=before), repeat)
+        
+        print(f"{page:>8} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+
+def run_benchmark(rows, limit, pages, repeat):
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    os.environ.setdefault('DATABASE_URL', f'sqlite:///{db_file.name}')
+    
+    from app import create_app, db
+    from app.models import User, AuditLog
+    from app.services import AuditService
+    
+    app = create_app()
+    
+    with app.app_context():
+        db.create_all()
+        for index in range(USERS):
+            user = User(name=f'Benchmark User {index}', email=f'bench{index}@evertrust.com')
+            user.set_password('benchmark')
+            db.session.add(user)
+        db.session.commit()
+        
+        print(f"Seeding {rows} audit events...")
+        seed_audit_log(db, rows)
+        
+        def user_events(limit, offset=0, before=None):
+            return AuditService.get_user_events(1, limit=limit, offset=offset, before=before)
+        
+        def entity_events(limit, offset=0, before=None):
+            # get_entity_events has no offset; page the same query it builds
+            query = AuditService._page(AuditLog.query.filter_by(entity='account', entity_id=1), None, None, before)
+            return query.offset(offset).limit(limit).all()
+        
+        run_listing('GET /api/v1/audit', user_events, rows // USERS, limit, pages, repeat)
+        run_listing('GET /api/v1/audit/account/1', entity_events, rows // ENTITIES, limit, pages, repeat)
+        
+        db.session.remove()
+    
+    os.unlink(db_file.name)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--pages', type=int, nargs='+', default=[0, 10, 100, 799, 1000, 4000, 7999])
+    args = parser.parse_args()
+    
+    run_benchmark(args.rows, args.limit, args.pages, args.repeat)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark for audit log metadata search
+Seeds audit_log with transaction-like events and times AuditService.search_events
+(GIN containment on PostgreSQL, audit_log_metadata_keys on SQLite) against a
+full scan that extracts the key from every row's metadata
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+USERS = 5
+ACCOUNTS = 200
+
+# Searches with few, some and many matches among `rows` events
+SEARCHES = [
+    ('reference (1 match)', lambda rows: {'reference': f'INV-{rows // 2}'}),
+    ('account_id (~0.5%)', lambda rows: {'account_id': '17'}),
+    ('channel (~33%)', lambda rows: {'channel': 'mobile'}),
+    ('account_id + channel', lambda rows: {'account_id': '17', 'channel': 'mobile'}),
+]
+
+def seed_audit_log(db, rows, batch_size=20000):
+    """Bulk insert `rows` events, one second apart, with a few metadata keys each"""
+    from app.models import AuditLog
+    
+    start = datetime.utcnow() - timedelta(seconds=rows)
+    for batch_start in range(0, rows, batch_size):
+        db.session.execute(AuditLog.__table__.insert(), [
+            {
+                'user_id': 1 + i % USERS,
+                'action': 'deposit_created',
+                'entity': 'transaction',
+                'entity_id': i,
+                'metadata': {
+                    'amount': f'{i % 1000}.00',
+                    'account_id': 1 + i % ACCOUNTS,
+                    'reference': f'INV-{i}',
+                    'channel': ('web', 'mobile', 'branch')[i % 3]
+                },
+                'created_at': start + timedelta(seconds=i)
+            }
+            for i in range(batch_start, min(batch_start + batch_size, rows))
+        ])
+        db.session.commit()
+
+def median_ms(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def scan(db, criteria, limit):
+    """The same search without an index: extract each key from every row"""
+    from app.models import AuditLog
+    
+    metadata = AuditLog.__table__.c.metadata
+    query = AuditLog.query
+    for key, value in criteria.items():
+        if db.engine.dialect.name == 'postgresql':
+            query = query.filter(metadata[key].astext == value)
+        else:
+            query = query.filter(db.cast(db.func.json_extract(metadata, f'$.{key}'), db.Text) == value)
+    return query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).limit(limit).all()
+
+def run_benchmark(rows, limit, repeat):
+    if 'DATABASE_URL' not in os.environ:
+        db_dir = tempfile.mkdtemp()
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    
+    from app import create_app, db
+    from app.models import User
+    from app.services import AuditService
+    
+    app = create_app()
+    
+    with app.app_context():
+        db.create_all()
+        for index in range(USERS):
+            user = User(name=f'Benchmark User {index}', email=f'bench{index}@evertrust.com')
+            user.set_password('benchmark')
+            db.session.add(user)
+        db.session.commit()
+        
+        print(f"Seeding {rows} audit events...")
+        started = time.perf_counter()
+        seed_audit_log(db, rows)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s ({db.engine.dialect.name})")
+        
+        print(f"\n{'search':<24} {'indexed ms':>12} {'scan ms':>12}")
+        for label, criteria in SEARCHES:
+            criteria = criteria(rows)
+            indexed_ms = median_ms(lambda: AuditService.search_events(criteria, limit=limit), repeat)
+            scan_ms = median_ms(lambda: scan(db, criteria, limit), repeat)
+            print(f"{label:<24} {indexed_ms:>12.2f} {scan_ms:>12.2f}")
+        
+        db.session.remove()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    run_benchmark(args.rows, args.limit, args.repeat)
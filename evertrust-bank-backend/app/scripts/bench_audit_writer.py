@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Audit logging throughput benchmark
+Logs informational events through AuditService.log_event with sync
+durability (one INSERT and COMMIT per event) and with the batched async
+writer, and reports events/sec and the time callers spend inside log_event
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import tempfile
+import time
+
+def run_mode(app, events_count, durability):
+    from app.services import AuditService
+    
+    with app.app_context():
+        started = time.perf_counter()
+        for index in range(events_count):
+            AuditService.log_event(1, 'user_login', 'user', entity_id=1, metadata={'index': index},
+                                   durability=durability)
+        queued = time.perf_counter() - started
+        AuditService.flush()
+        total = time.perf_counter() - started
+    
+    return queued, total
+
+def run_benchmark(events_count, batch_size):
+    if 'DATABASE_URL' not in os.environ:
+        db_dir = tempfile.mkdtemp()
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    
+    from app import create_app, db
+    from app.models import User
+    
+    app = create_app()
+    app.config['AUDIT_BATCH_SIZE'] = batch_size
+    
+    with app.app_context():
+        db.create_all()
+        if db.session.get(User, 1) is None:
+            user = User(id=1, name='Benchmark User', email='bench@evertrust.com')
+            user.set_password('benchmark')
+            db.session.add(user)
+            db.session.commit()
+    
+    print(f"{'durability':<12} {'events':>8} {'caller ms/event':>16} {'events/s':>10}")
+    for durability in ('sync', 'async'):
+        queued, total = run_mode(app, events_count, durability)
+        print(f"{durability:<12} {events_count:>8} {queued * 1000 / events_count:>16.3f} {events_count / total:>10.0f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+    
+    run_benchmark(args.events, args.batch_size)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Balance history benchmark
+Seeds one account per size with a year of transactions, rebuilds the daily
+rollup with BalanceHistoryService.backfill, then times
+GET /accounts/<id>/balance-history for a one-year chart at each interval
+against computing the same daily closing balances from the raw
+transactions
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def seed_transactions(db, account_id, rows, start, batch_size=20000):
+    """Bulk insert `rows` transactions spread over the year after `start`, with balance_after set"""
+    from app.models import Transaction
+    
+    step = timedelta(days=365) / rows
+    balance = 100000
+    for batch_start in range(0, rows, batch_size):
+        batch = []
+        for i in range(batch_start, min(batch_start + batch_size, rows)):
+            amount = (i % 5000) / 100 + 1
+            balance += amount if i % 2 else -amount
+            batch.append({
+                'account_id': account_id,
+                'type': 'Deposit' if i % 2 else 'Withdrawal',
+                'direction': 'credit' if i % 2 else 'debit',
+                'amount': f'{amount:.2f}',
+                'description': f'Card payment {i}',
+                'created_at': start + step * i,
+                'balance_after': f'{balance:.2f}',
+                'status': 'Completed'
+            })
+        db.session.execute(Transaction.__table__.insert(), batch)
+        db.session.commit()
+
+def raw_daily_balances(db, account_id, start, end):
+    """The chart without the rollup: last balance_after of each day, from the transactions"""
+    from app.models import Transaction
+    from sqlalchemy import select, func
+    
+    transactions = Transaction.__table__
+    latest = func.row_number().over(
+        partition_by=func.date(transactions.c.created_at),
+        order_by=(transactions.c.created_at.desc(), transactions.c.id.desc())
+    )
+    ranked = select(func.date(transactions.c.created_at).label('day'), transactions.c.balance_after,
+                    latest.label('latest'))\
+        .where(transactions.c.account_id == account_id,
+               transactions.c.created_at >= start, transactions.c.created_at < end)\
+        .subquery()
+    return db.session.execute(
+        select(ranked.c.day, ranked.c.balance_after).where(ranked.c.latest == 1).order_by(ranked.c.day)
+    ).all()
+
+def median_ms(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def run_benchmark(sizes, repeat):
+    database_url = os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    os.environ['DATABASE_URL'] = database_url
+    
+    from app import create_app, db
+    from app.models import User, Account
+    from app.services import BalanceHistoryService
+    from flask_jwt_extended import create_access_token
+    
+    app = create_app()
+    client = app.test_client()
+    start = datetime(2025, 1, 1)
+    end = start + timedelta(days=365)
+    
+    with app.app_context():
+        db.create_all()
+        user = User(name='Benchmark User', email='bench@evertrust.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+        
+        accounts = {}
+        for rows in sizes:
+            account = Account(user_id=user.id, type='Checking', number=f'BENCH{rows:010d}', balance=100000,
+                              created_at=start - timedelta(days=1))
+            db.session.add(account)
+            db.session.commit()
+            accounts[rows] = account.id
+            print(f"Seeding {rows} transactions...")
+            seed_transactions(db, account.id, rows, start)
+            
+            started = time.perf_counter()
+            BalanceHistoryService.backfill([account.id])
+            db.session.commit()
+            print(f"  backfill: {time.perf_counter() - started:.1f}s")
+    
+    print(f"\n{'transactions':>12} {'source':<18} {'median ms':>10}")
+    for rows in sizes:
+        for interval in ('day', 'week', 'month'):
+            url = (f'/api/v1/accounts/{accounts[rows]}/balance-history?interval={interval}'
+                   f'&start_date={start:%Y-%m-%d}&end_date={end - timedelta(days=1):%Y-%m-%d}')
+            assert client.get(url, headers=headers).status_code == 200
+            elapsed = median_ms(lambda: client.get(url, headers=headers), repeat)
+            print(f"{rows:>12} {'rollup, ' + interval:<18} {elapsed:>10.2f}")
+        
+        with app.app_context():
+            elapsed = median_ms(lambda: raw_daily_balances(db, accounts[rows], start, end), max(repeat // 10, 3))
+        print(f"{rows:>12} {'raw transactions':<18} {elapsed:>10.2f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=50, help='Requests timed per measurement')
+    args = parser.parse_args()
+    
+    run_benchmark(args.sizes, args.repeat)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for POST /api/v1/transactions/batch
+Posts the same workload through the single-item deposit/withdraw endpoints
+and through the batch endpoint and reports postings/sec for each
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import random
+import tempfile
+import time
+
+def build_postings(account_ids, count):
+    postings = []
+    for i in range(count):
+        postings.append({
+            'account_id': random.choice(account_ids),
+            'type': 'Deposit' if i % 4 else 'Withdrawal',
+            'amount': random.randint(1, 200),
+            'description': f'Back-office posting {i}'
+        })
+    return postings
+
+def run(postings_count, batch_size, accounts_count):
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'batch.db')}"
+    
+    from app import create_app, db
+    from app.models import User, Account
+    from app.services import EmailService
+    from flask_jwt_extended import create_access_token
+    
+    # Keep the print-based email stub out of the timings
+    EmailService.send_email = staticmethod(lambda *args, **kwargs: True)
+    
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(name='Back Office', email='backoffice@evertrust.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        accounts = [
+            Account(user_id=user.id, type='Checking', number=f'8000000000{i:02d}', balance=10 ** 7)
+            for i in range(accounts_count)
+        ]
+        db.session.add_all(accounts)
+        db.session.commit()
+        account_ids = [account.id for account in accounts]
+        headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+    
+    client = app.test_client()
+    postings = build_postings(account_ids, postings_count)
+    
+    started = time.perf_counter()
+    for posting in postings:
+        url = '/api/v1/transactions/deposit' if posting['type'] == 'Deposit' else '/api/v1/transactions/withdraw'
+        response = client.post(url, json=posting, headers=headers)
+        assert response.status_code == 201, response.data
+    single_rate = postings_count / (time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    for start in range(0, postings_count, batch_size):
+        response = client.post('/api/v1/transactions/batch',
+                               json={'postings': postings[start:start + batch_size]}, headers=headers)
+        assert response.status_code == 201, response.data
+    batch_rate = postings_count / (time.perf_counter() - started)
+    
+    print(f"postings={postings_count} batch_size={batch_size} accounts={accounts_count}")
+    print(f"single-item endpoints: {single_rate:10.1f} postings/s")
+    print(f"batch endpoint:        {batch_rate:10.1f} postings/s ({batch_rate / single_rate:.1f}x)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--postings', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--accounts', type=int, default=20)
+    args = parser.parse_args()
+    
+    run(args.postings, args.batch_size, args.accounts)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Email template rendering micro-benchmark
+Reports renders/sec for the precompiled templates (render and render_many)
+against loading and compiling the same templates on every call
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import time
+
+from app.services.email_templates import EmailTemplates
+
+CONTEXTS = {
+    'alert_notification': lambda i: {
+        'alert_title': 'Large Deposit',
+        'message': f'Large deposit of ${i:,.2f} to account 900000000001',
+        'account_info': '900000000001'
+    },
+    'transaction_receipt': lambda i: {
+        'type': 'Deposit',
+        'amount': f'{i:,.2f}',
+        'description': 'Payroll',
+        'date': '2026-10-18 09:00:00',
+        'status': 'Completed',
+        'account': '•••• 0001'
+    },
+    'welcome': lambda i: {'user_name': f'Customer {i}'},
+}
+
+def compile_per_call(name, context):
+    """Fresh template set each time, so every render loads and compiles"""
+    return EmailTemplates().render(name, context)
+
+def timed(function):
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+def run_benchmark(renders):
+    templates = EmailTemplates()
+    
+    print(f"{'template':<22} {'compile/call':>14} {'render':>12} {'render_many':>13}")
+    for name, make_context in CONTEXTS.items():
+        contexts = [make_context(i) for i in range(renders)]
+        
+        # Compiling per call is orders of magnitude slower; sample fewer renders
+        sample = contexts[:max(1, renders // 20)]
+        uncached = timed(lambda: [compile_per_call(name, context) for context in sample])
+        single = timed(lambda: [templates.render(name, context) for context in contexts])
+        batch = timed(lambda: templates.render_many(name, contexts))
+        
+        print(f"{name:<22} {len(sample) / uncached:>14.0f} {renders / single:>12.0f} {renders / batch:>13.0f}")
+    print("(renders/sec)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--renders', type=int, default=20000)
+    args = parser.parse_args()
+    
+    run_benchmark(args.renders)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Commit throughput benchmark for money-movement endpoints
+Posts deposits, withdrawals and internal transfers and reports commits per
+request and requests/sec, with the unit of work enabled and with the legacy
+commit-per-step behaviour (AuditService committing on its own)
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import tempfile
+import time
+from unittest import mock
+from sqlalchemy import event
+
+def run_mode(app, db, headers, accounts, requests_count, legacy):
+    from app.services import UnitOfWork
+    
+    commits = []
+    
+    def record_commit(conn):
+        commits.append(1)
+    
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'commit', record_commit)
+    
+    # Without an open unit of work AuditService commits mid-request, which is
+    # exactly what every money-movement handler did before
+    patch = mock.patch.object(UnitOfWork, 'current', return_value=None) if legacy else mock.MagicMock()
+    
+    client = app.test_client()
+    checking, savings = accounts
+    requests = [
+        ('/api/v1/transactions/deposit', {'account_id': checking, 'amount': 5, 'type': 'Deposit'}),
+        ('/api/v1/transactions/withdraw', {'account_id': checking, 'amount': 2, 'type': 'Withdrawal'}),
+        ('/api/v1/transactions/transfer/internal', {'from_account_id': checking, 'to_account_id': savings, 'amount': 1}),
+    ]
+    
+    with patch:
+        started = time.perf_counter()
+        for i in range(requests_count):
+            url, payload = requests[i % len(requests)]
+            response = client.post(url, json=payload, headers=headers)
+            assert response.status_code == 201, response.data
+        elapsed = time.perf_counter() - started
+    
+    event.remove(engine, 'commit', record_commit)
+    return len(commits), elapsed
+
+def run_benchmark(requests_count):
+    db_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    
+    from app import create_app, db
+    from app.models import User, Account
+    from flask_jwt_extended import create_access_token
+    
+    # Print-based email stubs would dominate the timings
+    from app.services import EmailService
+    EmailService.send_email = staticmethod(lambda *args, **kwargs: True)
+    
+    app = create_app()
+    
+    with app.app_context():
+        db.create_all()
+        
+        with db.engine.connect() as connection:
+            # Make every commit pay for a real durable flush
+            connection.exec_driver_sql('PRAGMA journal_mode=WAL')
+        
+        user = User(name='Benchmark User', email='bench@evertrust.com')
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.flush()
+        
+        checking = Account(user_id=user.id, type='Checking', number='900000000001', balance=10 ** 9)
+        savings = Account(user_id=user.id, type='Savings', number='900000000002', balance=0)
+        db.session.add_all([checking, savings])
+        db.session.commit()
+        
+        accounts = (checking.id, savings.id)
+        headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+    
+    print(f"{'mode':<16} {'requests':>9} {'commits':>8} {'commits/req':>12} {'req/s':>9} {'commits/s':>10}")
+    for label, legacy in (('per-step', True), ('unit-of-work', False)):
+        commits, elapsed = run_mode(app, db, headers, accounts, requests_count, legacy)
+        print(f"{label:<16} {requests_count:>9} {commits:>8} {commits / requests_count:>12.2f} "
+              f"{requests_count / elapsed:>9.1f} {commits / elapsed:>10.1f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=1500)
+    args = parser.parse_args()
+    
+    run_benchmark(args.requests)
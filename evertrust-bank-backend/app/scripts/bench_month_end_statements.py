@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Month-end statement run benchmark
+Seeds a number of accounts with a month of transactions each, then runs
+StatementRunService.run (what `flask month-end-statements` does) with
+each --workers count into a fresh directory and reports accounts/sec and
+the speedup over one worker
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+
+def seed(db, accounts_count, transactions_per_account, start):
+    from app.models import User, Account, Transaction
+    
+    user = User(name='Benchmark User', email='bench@evertrust.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    db.session.execute(Account.__table__.insert(), [
+        {
+            'user_id': user.id,
+            'type': 'Checking',
+            'number': f'9{i:09d}',
+            'balance': 100000,
+            'created_at': start - timedelta(days=30)
+        }
+        for i in range(accounts_count)
+    ])
+    account_ids = [account.id for account in Account.query.with_entities(Account.id)]
+    
+    step = timedelta(days=30) / transactions_per_account
+    for account_id in account_ids:
+        db.session.execute(Transaction.__table__.insert(), [
+            {
+                'account_id': account_id,
+                'type': ('Deposit', 'Withdrawal', 'External Transfer')[i % 3],
+                'direction': 'credit' if i % 3 == 0 else 'debit',
+                'amount': f'{(i % 5000) / 100 + 1:.2f}',
+                'description': f'Card payment {i} at merchant {i % 97}',
+                'created_at': start + step * i,
+                'status': 'Completed'
+            }
+            for i in range(transactions_per_account)
+        ])
+    db.session.commit()
+
+def run_benchmark(accounts_count, transactions_per_account, worker_counts):
+    work_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    
+    from app import create_app, db
+    from app.services import StatementRunService
+    
+    app = create_app()
+    start = date(2025, 1, 1)
+    end = date(2025, 1, 31)
+    
+    with app.app_context():
+        db.create_all()
+        print(f"Seeding {accounts_count} accounts x {transactions_per_account} transactions...")
+        seed(db, accounts_count, transactions_per_account, datetime.combine(start, datetime.min.time()))
+        
+        print(f"CPU cores available: {len(os.sched_getaffinity(0))}")
+        print(f"\n{'workers':>7} {'seconds':>9} {'accounts/s':>11} {'speedup':>8}")
+        baseline = None
+        for workers in worker_counts:
+            output_dir = os.path.join(work_dir, f'run_{workers}')
+            summary = StatementRunService.run(start, end, output_dir, workers=workers)
+            assert summary['rendered'] == accounts_count and not summary['failed']
+            rate = accounts_count / summary['seconds']
+            baseline = baseline or rate
+            print(f"{workers:>7} {summary['seconds']:>9.1f} {rate:>11.1f} {rate / baseline:>7.2f}x")
+            shutil.rmtree(output_dir)
+    
+    shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--accounts', type=int, default=500)
+    parser.add_argument('--transactions', type=int, default=300, help='Transactions per account')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    
+    run_benchmark(args.accounts, args.transactions, args.workers)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Posting throughput benchmark for sharded account balances
+Concurrent workers post to a single hot account, each posting in its own
+transaction that stays open for --hold-ms (standing in for the audit and
+alert writes of a real request), at increasing shard counts.
+
+Run against PostgreSQL (--database-url); SQLite takes a database-wide write
+lock, so shard count cannot change its throughput.
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import random
+import tempfile
+import threading
+import time
+from sqlalchemy.exc import OperationalError
+
+def post_worker(app, account_id, postings, hold, counters, lock):
+    from app import db
+    from app.models import Account, Transaction
+    from app.services import LedgerService, InsufficientFundsError
+    
+    done = 0
+    with app.app_context():
+        while done < postings:
+            try:
+                account = db.session.get(Account, account_id)
+                amount = random.randint(1, 100)
+                # Mostly credits, like a settlement account receiving payments
+                if random.random() < 0.8:
+                    LedgerService.credit(account, amount)
+                    tx_type, direction = 'Deposit', 'credit'
+                else:
+                    LedgerService.debit(account, amount)
+                    tx_type, direction = 'Withdrawal', 'debit'
+                db.session.add(Transaction(account_id=account_id, type=tx_type, direction=direction, amount=amount,
+                                           description='Benchmark posting', status='Completed'))
+                db.session.flush()
+                time.sleep(hold)
+                db.session.commit()
+                done += 1
+            except InsufficientFundsError:
+                db.session.rollback()
+                done += 1
+            except OperationalError:
+                db.session.rollback()
+        db.session.remove()
+    
+    with lock:
+        counters['postings'] += done
+
+def run_config(app, user_id, shard_count, workers, postings, hold):
+    from app import db
+    from app.models import Account
+    from app.services import LedgerService
+    
+    with app.app_context():
+        account = Account(user_id=user_id, type='Settlement',
+                          number=f'{time.time_ns() % 10 ** 12:012d}', balance=100000)
+        db.session.add(account)
+        db.session.commit()
+        if shard_count:
+            LedgerService.enable_sharding(account, shard_count)
+            db.session.commit()
+        account_id = account.id
+    
+    counters = {'postings': 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=post_worker, args=(app, account_id, postings, hold, counters, lock))
+        for _ in range(workers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    with app.app_context():
+        account = db.session.get(Account, account_id)
+        balance = account.total_balance
+    
+    return counters['postings'] / elapsed, balance
+
+def run(shard_counts, workers, postings, hold_ms):
+    from app import create_app, db
+    from app.models import User
+    
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(name='Bench User', email=f'bench-{time.time_ns()}@evertrust.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    
+    print(f"workers={workers} postings/worker={postings} hold={hold_ms}ms")
+    print(f"{'shards':>8} {'postings/s':>12} {'final balance':>15}")
+    for shard_count in shard_counts:
+        rate, balance = run_config(app, user_id, shard_count, workers, postings, hold_ms / 1000)
+        label = shard_count or 'off'
+        print(f"{label:>8} {rate:>12.1f} {balance:>15}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--shards', type=int, nargs='+', default=[0, 1, 2, 4, 8, 16])
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--postings', type=int, default=50)
+    parser.add_argument('--hold-ms', type=float, default=5.0)
+    parser.add_argument('--database-url', help='Defaults to a throwaway SQLite file')
+    args = parser.parse_args()
+    
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'shards.db')}"
+    
+    run(args.shards, args.workers, args.postings, args.hold_ms)
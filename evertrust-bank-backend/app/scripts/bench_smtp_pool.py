@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+SMTP throughput benchmark for the pooled email transport
+Sends messages to an in-process aiosmtpd server and reports messages/sec for
+connect-per-message delivery and for SMTPConnectionPool at several pool
+sizes. --latency-ms adds a per-command delay on the server to stand in for
+the network round trips (and TLS/AUTH) of a real provider.
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import asyncio
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiosmtpd.controller import Controller
+
+from app.services.smtp_pool import SMTPConnectionPool
+
+class SlowHandler:
+    def __init__(self, latency):
+        self.latency = latency
+        self.delivered = 0
+    
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        # Connection setup is several round trips (TCP, EHLO, STARTTLS, AUTH)
+        await asyncio.sleep(self.latency * 3)
+        return responses
+    
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        self.delivered += 1
+        return '250 OK'
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def run_case(controller, messages_count, pool_size, max_messages, batch):
+    pool = SMTPConnectionPool(controller.hostname, controller.port, size=pool_size,
+                              use_tls=False, max_messages=max_messages)
+    message = 'From: bench@evertrust.com\r\nTo: user@example.com\r\nSubject: Bench\r\n\r\nHello\r\n'
+    chunks = [[(['user@example.com'], message)] * batch] * (messages_count // batch)
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=pool_size) as executor:
+        results = list(executor.map(lambda chunk: pool.send_many('bench@evertrust.com', chunk), chunks))
+    elapsed = time.perf_counter() - started
+    pool.close()
+    
+    failures = sum(1 for chunk in results for error in chunk if error is not None)
+    return elapsed, failures
+
+def run_benchmark(messages_count, latency_ms, batch):
+    handler = SlowHandler(latency_ms / 1000)
+    controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    
+    try:
+        cases = [('connect-per-message', 4, 1)] + [(f'pool size {size}', size, 100) for size in (1, 2, 4, 8)]
+        
+        print(f"{'transport':<22} {'messages':>9} {'failed':>7} {'seconds':>8} {'msgs/s':>9}")
+        for label, size, max_messages in cases:
+            elapsed, failures = run_case(controller, messages_count, size, max_messages, batch)
+            print(f"{label:<22} {messages_count:>9} {failures:>7} {elapsed:>8.2f} {messages_count / elapsed:>9.1f}")
+    finally:
+        controller.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    parser.add_argument('--batch', type=int, default=25, help='Messages per send_many call')
+    args = parser.parse_args()
+    
+    run_benchmark(args.messages, args.latency_ms, args.batch)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Statement PDF benchmark
+Renders statements of 10k / 100k / 1M transactions with the streaming
+renderer (StatementJobService.write_statement) and, up to --platypus-max
+rows, with the original platypus renderer kept below as the baseline (all
+rows loaded with .all(), one Table, doc.build). Each render runs in a fresh
+process so its peak RSS can be reported
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import io
+import multiprocessing
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+def seed_transactions(db, account_id, rows, start, batch_size=20000):
+    """Bulk insert `rows` transactions spread evenly over the year after `start`"""
+    from app.models import Transaction
+    
+    step = timedelta(days=365) / rows
+    for batch_start in range(0, rows, batch_size):
+        db.session.execute(Transaction.__table__.insert(), [
+            {
+                'account_id': account_id,
+                'type': ('Deposit', 'Withdrawal', 'Transfer')[i % 3],
+                'direction': 'credit' if i % 3 == 0 else 'debit',
+                'amount': f'{(i % 5000) / 100 + 1:.2f}',
+                'description': f'Card payment {i} at merchant {i % 97}',
+                'created_at': start + step * i,
+                'status': 'Completed'
+            }
+            for i in range(batch_start, min(batch_start + batch_size, rows))
+        ])
+        db.session.commit()
+
+def generate_statement_pdf(account, transactions, start_date, end_date):
+    """The original renderer: every row in one platypus Table, laid out by doc.build"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib import colors
+    
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = []
+    
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'Title',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=30,
+        alignment=1  # Center
+    )
+    
+    # Title
+    elements.append(Paragraph("EverTrust Bank - Account Statement", title_style))
+    
+    # Account information
+    account_info = [
+        ["Account Number:", account.number],
+        ["Account Type:", account.type],
+        ["Statement Period:", f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}"],
+        ["Current Balance:", f"${account.total_balance:.2f}"],
+        ["Statement Date:", datetime.now().strftime('%Y-%m-%d')]
+    ]
+    
+    account_table = Table(account_info, colWidths=[2*inch, 3*inch])
+    account_table.setStyle(TableStyle([
+        ('FONT', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+    ]))
+    
+    elements.append(account_table)
+    elements.append(Spacer(1, 0.3*inch))
+    
+    # Transactions header
+    elements.append(Paragraph("Transactions", styles['Heading2']))
+    
+    # Transactions table
+    transaction_data = [["Date", "Description", "Type", "Amount", "Balance"]]
+    
+    running_balance = account.total_balance
+    for tx in reversed(transactions):  # Show in chronological order
+        if tx.direction == 'debit':
+            amount = f"-${tx.amount:.2f}"
+            running_balance += tx.amount  # Add back to get previous balance
+        else:
+            amount = f"${tx.amount:.2f}"
+            running_balance -= tx.amount  # Subtract to get previous balance
+        if tx.balance_after is not None:
+            running_balance = tx.balance_after  # Recorded when the transaction was posted
+        
+        transaction_data.append([
+            tx.created_at.strftime('%Y-%m-%d'),
+            tx.description[:30] + '...' if len(tx.description) > 30 else tx.description,
+            tx.type,
+            amount,
+            f"${running_balance:.2f}"
+        ])
+    
+    # Add final balance (current balance)
+    transaction_data.append([
+        "",
+        "Current Balance",
+        "",
+        "",
+        f"${account.total_balance:.2f}"
+    ])
+    
+    transaction_table = Table(transaction_data, colWidths=[0.8*inch, 2*inch, 1*inch, 1*inch, 1*inch])
+    transaction_table.setStyle(TableStyle([
+        ('FONT', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('FONT', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ]))
+    
+    elements.append(transaction_table)
+    
+    # Footer
+    elements.append(Spacer(1, 0.5*inch))
+    elements.append(Paragraph("Thank you for banking with EverTrust Bank", styles['Italic']))
+    elements.append(Paragraph("Customer Service: 1-800-EVERTRUST", styles['Normal']))
+    
+    # Build PDF
+    doc.build(elements)
+    return buffer
+
+def current_rss_mb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+def render(database_url, account_id, renderer, start, end):
+    """Runs in a fresh process: render one statement and report time, pages and peak RSS growth"""
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app, db
+    from app.models import Account, Transaction
+    from app.services import StatementJobService
+    
+    app = create_app()
+    with app.app_context():
+        account = db.session.get(Account, account_id)
+        account.total_balance  # Load outside the measurement
+        baseline = current_rss_mb()
+        started = time.perf_counter()
+        
+        with tempfile.TemporaryFile() as output:
+            if renderer == 'streaming':
+                pages = StatementJobService.write_statement(account, start, end, output)
+            else:
+                transactions = Transaction.query.filter(
+                    Transaction.account_id == account_id,
+                    Transaction.created_at >= datetime.combine(start, datetime.min.time()),
+                    Transaction.created_at < datetime.combine(end, datetime.min.time()) + timedelta(days=1)
+                ).order_by(Transaction.created_at.desc()).all()
+                output.write(generate_statement_pdf(account, transactions, start, end).getbuffer())
+                pages = None
+            size = output.tell()
+        
+        elapsed = time.perf_counter() - started
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1000  # kB on Linux
+    return elapsed, pages, size, peak - baseline
+
+def run_benchmark(sizes, platypus_max):
+    db_dir = tempfile.mkdtemp()
+    database_url = os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(db_dir, 'bench.db')}")
+    os.environ['DATABASE_URL'] = database_url
+    
+    from app import create_app, db
+    from app.models import User, Account
+    
+    app = create_app()
+    start = date(2025, 1, 1)
+    end = date(2025, 12, 31)
+    
+    with app.app_context():
+        db.create_all()
+        user = User(name='Benchmark User', email='bench@evertrust.com')
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.flush()
+        
+        accounts = {}
+        for rows in sizes:
+            account = Account(user_id=user.id, type='Checking', number=f'BENCH{rows:010d}', balance=1000000)
+            db.session.add(account)
+            db.session.commit()
+            accounts[rows] = account.id
+            
+            print(f"Seeding {rows} transactions...")
+            seed_transactions(db, account.id, rows, datetime.combine(start, datetime.min.time()))
+        db.session.remove()
+    
+    print(f"\n{'renderer':<10} {'rows':>9} {'seconds':>9} {'rows/s':>9} {'pages':>7} {'MB out':>8} {'peak RSS MB':>12}")
+    context = multiprocessing.get_context('spawn')
+    for rows in sizes:
+        for renderer in ('streaming', 'platypus'):
+            if renderer == 'platypus' and rows > platypus_max:
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                elapsed, pages, size, peak = pool.submit(render, database_url, accounts[rows], renderer,
+                                                         start, end).result()
+            print(f"{renderer:<10} {rows:>9} {elapsed:>9.1f} {rows / elapsed:>9.0f} {pages or '-':>7} "
+                  f"{size / 1e6:>8.1f} {peak:>12.1f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--platypus-max', type=int, default=10000,
+                        help='Largest statement also rendered with platypus (100k rows takes minutes)')
+    args = parser.parse_args()
+    
+    run_benchmark(args.sizes, args.platypus_max)
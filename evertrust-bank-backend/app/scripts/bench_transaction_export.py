@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Transaction export benchmark
+Seeds one account with each of --sizes transactions and downloads its history
+through GET /transactions/export in each format, and (up to --paged-max
+rows) by walking GET /transactions 100 rows at a time with next_cursor.
+Each download runs in a fresh process so its peak RSS can be reported
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+def seed_transactions(db, account_id, rows, start, batch_size=20000):
+    from app.models import Transaction
+    
+    step = timedelta(days=365) / rows
+    for batch_start in range(0, rows, batch_size):
+        db.session.execute(Transaction.__table__.insert(), [
+            {
+                'account_id': account_id,
+                'type': ('Deposit', 'Withdrawal', 'Transfer')[i % 3],
+                'direction': 'credit' if i % 3 == 0 else 'debit',
+                'amount': f'{(i % 5000) / 100 + 1:.2f}',
+                'description': f'Card payment {i} at merchant {i % 97}',
+                'counterparty': f'Merchant {i % 97}',
+                'created_at': start + step * i,
+                'balance_after': f'{100000 + i:.2f}',
+                'status': 'Completed'
+            }
+            for i in range(batch_start, min(batch_start + batch_size, rows))
+        ])
+        db.session.commit()
+
+def current_rss_mb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+def download(database_url, user_id, mode):
+    """Runs in a fresh process: download the history one way and report time, size and peak RSS growth"""
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app
+    from flask_jwt_extended import create_access_token
+    
+    app = create_app()
+    app.config['AUDIT_DURABILITY'] = 'sync'
+    client = app.test_client()
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+    
+    client.get('/api/v1/transactions?limit=1', headers=headers)  # Warm up outside the measurement
+    baseline = current_rss_mb()
+    started = time.perf_counter()
+    size = 0
+    
+    if mode == 'paged':
+        url = '/api/v1/transactions?limit=100'
+        while url:
+            page = client.get(url, headers=headers).get_json()
+            size += sum(len(str(transaction)) for transaction in page['transactions'])
+            url = f"/api/v1/transactions?limit=100&cursor={page['next_cursor']}" if page['has_more'] else None
+    else:
+        response = client.get(f'/api/v1/transactions/export?format={mode}', headers=headers)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        for piece in response.response:
+            size += len(piece)
+        response.close()
+    
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1000  # kB on Linux
+    return elapsed, size, peak - baseline
+
+def run_benchmark(sizes, paged_max):
+    db_dir = tempfile.mkdtemp()
+    database_url = os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(db_dir, 'bench.db')}")
+    os.environ['DATABASE_URL'] = database_url
+    
+    from app import create_app, db
+    from app.models import User, Account
+    from app.services import TransactionExportService
+    
+    app = create_app()
+    modes = ['csv', 'ofx'] + (['parquet'] if TransactionExportService.parquet_available() else [])
+    print(f"\n{'format':<8} {'rows':>9} {'seconds':>9} {'rows/s':>9} {'MB out':>8} {'peak RSS MB':>12}")
+    
+    context = multiprocessing.get_context('spawn')
+    for rows in sizes:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            user = User(name='Benchmark User', email='bench@evertrust.com', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            account = Account(user_id=user.id, type='Checking', number='BENCH00001', balance=1000000)
+            db.session.add(account)
+            db.session.commit()
+            user_id = user.id
+            seed_transactions(db, account.id, rows, datetime(2025, 1, 1))
+            db.session.remove()
+        
+        for mode in modes + (['paged'] if rows <= paged_max else []):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                elapsed, size, peak = pool.submit(download, database_url, user_id, mode).result()
+            print(f"{mode:<8} {rows:>9} {elapsed:>9.1f} {rows / elapsed:>9.0f} {size / 1e6:>8.1f} {peak:>12.1f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--paged-max', type=int, default=100000,
+                        help='Largest history also fetched page by page through GET /transactions')
+    args = parser.parse_args()
+    
+    run_benchmark(args.sizes, args.paged_max)
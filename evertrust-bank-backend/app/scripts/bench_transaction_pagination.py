@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark for GET /api/v1/transactions pagination
+Compares page-N latency of offset paging against cursor (keyset) paging
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def seed_transactions(db, account_id, rows, batch_size=10000):
+    """Bulk insert `rows` transactions, one minute apart, for a single account"""
+    from app.models import Account, Transaction
+    
+    start = datetime.utcnow() - timedelta(minutes=rows)
+    for batch_start in range(0, rows, batch_size):
+        db.session.execute(Transaction.__table__.insert(), [
+            {
+                'account_id': account_id,
+                'type': 'Deposit' if i % 3 else 'Withdrawal',
+                'direction': 'credit' if i % 3 else 'debit',
+                'amount': 10 + (i % 500),
+                'description': f'Benchmark transaction {i}',
+                'counterparty': 'Benchmark',
+                'created_at': start + timedelta(minutes=i),
+                'status': 'Completed'
+            }
+            for i in range(batch_start, min(batch_start + batch_size, rows))
+        ])
+    
+    # Core inserts bypass the ORM hook that maintains the counter
+    Account.query.filter_by(id=account_id).update({'transaction_count': rows})
+    db.session.commit()
+
+def time_request(client, url, headers, repeat):
+    """Return the median latency in milliseconds of `repeat` GET requests"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.data
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def run_benchmark(rows, limit, pages, repeat):
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    os.environ.setdefault('DATABASE_URL', f'sqlite:///{db_file.name}')
+    
+    from app import create_app, db
+    from app.models import User, Account, Transaction
+    from app.utils import encode_cursor
+    from flask_jwt_extended import create_access_token
+    
+    app = create_app()
+    
+    with app.app_context():
+        db.create_all()
+        
+        user = User(name='Benchmark User', email='bench@evertrust.com')
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.flush()
+        
+        account = Account(user_id=user.id, type='Checking', number='900000000001', balance=0)
+        db.session.add(account)
+        db.session.commit()
+        
+        print(f"Seeding {rows} transactions...")
+        seed_transactions(db, account.id, rows)
+        
+        headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+        client = app.test_client()
+        
+        print(f"{'page':>8} {'offset ms':>12} {'cursor ms':>12}")
+        for page in pages:
+            offset = page * limit
+            if offset >= rows:
+                break
+            
+            offset_ms = time_request(
+                client, f'/api/v1/transactions?limit={limit}&offset={offset}', headers, repeat
+            )
+            
+            # The cursor for page N is the position of the last row on page N-1
+            cursor_ms = None
+            if offset:
+                anchor = Transaction.query.order_by(
+                    Transaction.created_at.desc(), Transaction.id.desc()
+                ).offset(offset - 1).first()
+                cursor = encode_cursor(anchor.created_at, anchor.id)
+                cursor_ms = time_request(
+                    client, f'/api/v1/transactions?limit={limit}&cursor={cursor}', headers, repeat
+                )
+            
+            print(f"{page:>8} {offset_ms:>12.2f} {cursor_ms if cursor_ms is not None else offset_ms:>12.2f}")
+        
+        db.session.remove()
+    
+    os.unlink(db_file.name)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--pages', type=int, nargs='+', default=[0, 10, 100, 1000, 2000, 3999])
+    args = parser.parse_args()
+    
+    run_benchmark(args.rows, args.limit, args.pages, args.repeat)
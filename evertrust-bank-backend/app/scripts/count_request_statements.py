@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+SQL statements per request on the hot money-movement endpoints
+Counts the statements issued for deposits, withdrawals, internal transfers
+and bill payments with the old per-handler User/AlertPrefs lookups, with the
+request-scoped user context, and with the process-wide context cache enabled
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+from sqlalchemy import event
+
+ENDPOINTS = ('deposit', 'withdraw', 'transfer/internal', 'bills/pay')
+
+def legacy_context(user_id):
+    """What every handler did before: its own AlertPrefs and User queries"""
+    from app.models import AlertPrefs, User
+    return SimpleNamespace(
+        alert_prefs=AlertPrefs.query.filter_by(user_id=user_id).first(),
+        user=User.query.get(user_id)
+    )
+
+def requests_for(endpoint, checking, savings, biller):
+    if endpoint == 'deposit':
+        return '/api/v1/transactions/deposit', {'account_id': checking, 'amount': 5, 'type': 'Deposit'}
+    if endpoint == 'withdraw':
+        return '/api/v1/transactions/withdraw', {'account_id': checking, 'amount': 2, 'type': 'Withdrawal'}
+    if endpoint == 'transfer/internal':
+        return '/api/v1/transactions/transfer/internal', {
+            'from_account_id': checking, 'to_account_id': savings, 'amount': 1
+        }
+    return '/api/v1/bills/pay', {'account_id': checking, 'biller_id': biller, 'amount': 3}
+
+def run_mode(app, db, headers, ids, requests_count, mode):
+    from app.services import UserContextService
+    
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    with app.app_context():
+        engine = db.engine
+    
+    app.config['USER_CONTEXT_CACHE_TTL'] = 60 if mode == 'process-cache' else 0
+    UserContextService.clear()
+    patch = mock.patch.object(UserContextService, 'get', side_effect=legacy_context) \
+        if mode == 'per-handler' else mock.MagicMock()
+    
+    client = app.test_client()
+    results = {}
+    with patch:
+        for endpoint in ENDPOINTS:
+            url, payload = requests_for(endpoint, *ids)
+            # Warm-up request so the process cache (when enabled) is populated
+            client.post(url, json=payload, headers=headers)
+            
+            event.listen(engine, 'before_cursor_execute', record)
+            try:
+                for _ in range(requests_count):
+                    response = client.post(url, json=payload, headers=headers)
+                    assert response.status_code == 201, response.data
+            finally:
+                event.remove(engine, 'before_cursor_execute', record)
+            
+            results[endpoint] = len(statements) / requests_count
+            statements.clear()
+    
+    return results
+
+def run_benchmark(requests_count):
+    db_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    
+    from app import create_app, db
+    from app.models import User, Account, AlertPrefs, Biller
+    from flask_jwt_extended import create_access_token
+    
+    from app.services import EmailService
+    EmailService.send_email = staticmethod(lambda *args, **kwargs: True)
+    EmailService.send_async_email = staticmethod(lambda *args, **kwargs: None)
+    
+    app = create_app()
+    
+    with app.app_context():
+        db.create_all()
+        
+        user = User(name='Benchmark User', email='bench@evertrust.com')
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.flush()
+        
+        checking = Account(user_id=user.id, type='Checking', number='900000000001', balance=10 ** 9)
+        savings = Account(user_id=user.id, type='Savings', number='900000000002', balance=0)
+        biller = Biller(user_id=user.id, name='Utility Co', account_number='12345')
+        prefs = AlertPrefs(user_id=user.id, low_balance=True, low_balance_threshold=100,
+                           large_tx=True, large_tx_threshold=10 ** 6, card_change=True, email_enabled=True)
+        db.session.add_all([checking, savings, biller, prefs])
+        db.session.commit()
+        
+        ids = (checking.id, savings.id, biller.id)
+        headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+    
+    modes = ('per-handler', 'per-request', 'process-cache')
+    results = {mode: run_mode(app, db, headers, ids, requests_count, mode) for mode in modes}
+    
+    print(f"{'endpoint':<20}" + ''.join(f"{mode:>15}" for mode in modes))
+    for endpoint in ENDPOINTS:
+        print(f"{endpoint:<20}" + ''.join(f"{results[mode][endpoint]:>15.2f}" for mode in modes))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+    
+    run_benchmark(args.requests)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Hot query plan check for EverTrust Bank
+Seeds realistic volume, then prints EXPLAIN plans and timings for the
+listing queries with and without the composite indexes from models.py
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+HOT_QUERIES = [
+    ('transactions by account', 'ix_transactions_account_id_created_at',
+     'SELECT * FROM transactions WHERE account_id = :account_id '
+     'ORDER BY created_at DESC, id DESC LIMIT 50'),
+    ('audit_log by user', 'ix_audit_log_user_id_created_at',
+     'SELECT * FROM audit_log WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 50'),
+    ('alerts by user', 'ix_alerts_user_id_created_at',
+     'SELECT * FROM alerts WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 50'),
+    ('bills by user', 'ix_bills_user_id_created_at',
+     'SELECT * FROM bills WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 50'),
+    ('due schedules', 'ix_schedules_active_next_run_at',
+     'SELECT * FROM schedules WHERE active = :active AND next_run_at <= :now '
+     'ORDER BY next_run_at LIMIT 100'),
+]
+
+def insert_rows(db, table, rows, batch_size=5000):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[start:start + batch_size])
+    db.session.commit()
+
+def seed_volume(db, users, tx_per_account, events_per_user):
+    """Seed users with two accounts each plus proportional history"""
+    from app.models import User, Account, Transaction, AuditLog, Alert, Biller, Bill, Schedule
+    
+    now = datetime.utcnow()
+    
+    def past(days=365):
+        return now - timedelta(seconds=random.randint(0, days * 86400))
+    
+    insert_rows(db, User.__table__, [
+        {'id': u, 'name': f'User {u}', 'email': f'user{u}@example.com',
+         'password_hash': 'x', 'created_at': past()}
+        for u in range(1, users + 1)
+    ])
+    insert_rows(db, Account.__table__, [
+        {'id': a, 'user_id': (a + 1) // 2, 'type': 'Checking' if a % 2 else 'Savings',
+         'number': f'{a:012d}', 'balance': 1000, 'currency': 'USD', 'created_at': past()}
+        for a in range(1, users * 2 + 1)
+    ])
+    insert_rows(db, Transaction.__table__, [
+        {'account_id': a, 'type': tx_type, 'direction': 'credit' if tx_type == 'Deposit' else 'debit',
+         'amount': random.randint(1, 5000), 'description': 'Seeded', 'counterparty': 'Seed',
+         'created_at': past(), 'status': 'Completed'}
+        for a in range(1, users * 2 + 1) for _ in range(tx_per_account)
+        for tx_type in [random.choice(['Deposit', 'Withdrawal', 'Transfer'])]
+    ])
+    insert_rows(db, AuditLog.__table__, [
+        {'user_id': u, 'action': random.choice(['user_login', 'user_logout', 'deposit_created']),
+         'entity': 'user', 'entity_id': u, 'metadata': {}, 'created_at': past()}
+        for u in range(1, users + 1) for _ in range(events_per_user)
+    ])
+    insert_rows(db, Alert.__table__, [
+        {'user_id': u, 'type': 'large_tx', 'message': 'Seeded alert', 'created_at': past(), 'read': False}
+        for u in range(1, users + 1) for _ in range(events_per_user // 10)
+    ])
+    insert_rows(db, Biller.__table__, [
+        {'id': u, 'user_id': u, 'name': f'Biller {u}', 'created_at': past()}
+        for u in range(1, users + 1)
+    ])
+    insert_rows(db, Bill.__table__, [
+        {'user_id': u, 'biller_id': u, 'account_id': u * 2 - 1, 'amount': 100,
+         'status': 'Completed', 'created_at': past()}
+        for u in range(1, users + 1) for _ in range(events_per_user // 10)
+    ])
+    insert_rows(db, Schedule.__table__, [
+        {'user_id': u, 'kind': 'transfer', 'payload': {}, 'active': random.random() < 0.2,
+         'next_run_at': now + timedelta(days=random.randint(-30, 30)), 'created_at': past()}
+        for u in range(1, users + 1) for _ in range(5)
+    ])
+
+def explain(db, sql, params):
+    if db.engine.dialect.name == 'postgresql':
+        rows = db.session.execute(text(f'EXPLAIN (ANALYZE, BUFFERS) {sql}'), params).fetchall()
+        return '\n'.join(row[0] for row in rows)
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'), params).fetchall()
+    return '\n'.join(str(row[-1]) for row in rows)
+
+def time_query(db, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.session.execute(text(sql), params).fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def report(db, label, users, repeat):
+    print(f"\n===== {label} =====")
+    for name, _, sql in HOT_QUERIES:
+        params = {
+            'account_id': random.randint(1, users * 2),
+            'user_id': random.randint(1, users),
+            'active': True,
+            'now': datetime.utcnow()
+        }
+        print(f"\n-- {name}: {time_query(db, sql, params, repeat):.2f} ms (median of {repeat})")
+        print(explain(db, sql, params))
+    
+    # Release the session's connection so the next run sees schema changes
+    db.session.remove()
+
+def run(users, tx_per_account, events_per_user, repeat):
+    from app import create_app, db
+    from app.models import Transaction, AuditLog, Alert, Bill, Schedule
+    
+    app = create_app()
+    indexes = {
+        index.name: index
+        for model in (Transaction, AuditLog, Alert, Bill, Schedule)
+        for index in model.__table__.indexes
+    }
+    
+    with app.app_context():
+        db.create_all()
+        
+        print(f"Seeding {users} users, {users * 2 * tx_per_account} transactions, "
+              f"{users * events_per_user} audit events...")
+        seed_volume(db, users, tx_per_account, events_per_user)
+        
+        with db.engine.begin() as connection:
+            for _, index_name, _ in HOT_QUERIES:
+                indexes[index_name].drop(connection)
+            connection.execute(text('ANALYZE'))
+        report(db, 'BEFORE (no secondary indexes)', users, repeat)
+        
+        with db.engine.begin() as connection:
+            for _, index_name, _ in HOT_QUERIES:
+                indexes[index_name].create(connection)
+            connection.execute(text('ANALYZE'))
+        report(db, 'AFTER (composite indexes)', users, repeat)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--tx-per-account', type=int, default=250)
+    parser.add_argument('--events-per-user', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url', help='Defaults to a throwaway SQLite file')
+    args = parser.parse_args()
+    
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+        run(args.users, args.tx_per_account, args.events_per_user, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'explain.db')}"
+            run(args.users, args.tx_per_account, args.events_per_user, args.repeat)
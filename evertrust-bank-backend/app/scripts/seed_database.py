@@ -64,6 +64,7 @@ def seed_database():
                 transaction = Transaction(
                     account_id=checking_account.id,
                     type=transaction_type,
+                    direction='credit' if transaction_type == 'Deposit' else 'debit',
                     amount=amount,
                     description=random.choice(descriptions),
                     counterparty='Sample Merchant' if transaction_type != 'Deposit' else 'Employer Inc.',
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress harness for account balance updates
+Runs many workers posting random debits, credits and transfers against a
+small set of hot accounts, then checks that no update was lost, no balance
+went negative and money was conserved.
+
+Run against PostgreSQL (--database-url) to exercise real row locking;
+SQLite serialises writers, so it only checks the bookkeeping.
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from sqlalchemy.exc import OperationalError
+
+def naive_apply(db, Account, deltas):
+    """The pre-LedgerService pattern: read, check in Python, write back"""
+    for account_id, delta in deltas:
+        account = db.session.get(Account, account_id)
+        if delta < 0 and account.balance < -delta:
+            raise ValueError('Insufficient funds')
+        account.balance = account.balance + delta
+        db.session.flush()
+
+def worker(app, mode, account_ids, operations, expected, lock, stats):
+    from app import db
+    from app.models import Account
+    from app.services import LedgerService, InsufficientFundsError
+    
+    rng = random.Random()
+    local = defaultdict(Decimal)
+    
+    with app.app_context():
+        for _ in range(operations):
+            kind = rng.choice(['credit', 'debit', 'transfer'])
+            amount = Decimal(rng.randint(1, 500))
+            if kind == 'credit':
+                deltas = [(rng.choice(account_ids), amount)]
+            elif kind == 'debit':
+                deltas = [(rng.choice(account_ids), -amount)]
+            else:
+                source, target = rng.sample(account_ids, 2)
+                deltas = [(source, -amount), (target, amount)]
+            
+            while True:
+                try:
+                    if mode == 'atomic':
+                        accounts = {a.id: a for a in Account.query.filter(
+                            Account.id.in_([account_id for account_id, _ in deltas])
+                        )}
+                        LedgerService.apply([(accounts[account_id], delta) for account_id, delta in deltas])
+                    else:
+                        naive_apply(db, Account, deltas)
+                    db.session.commit()
+                    for account_id, delta in deltas:
+                        local[account_id] += delta
+                    stats['committed'] += 1
+                    break
+                except (InsufficientFundsError, ValueError):
+                    db.session.rollback()
+                    stats['insufficient'] += 1
+                    break
+                except OperationalError:
+                    # Lock timeouts / SQLITE_BUSY: retry the whole unit
+                    db.session.rollback()
+                    stats['retries'] += 1
+                    time.sleep(rng.random() / 100)
+        db.session.remove()
+    
+    with lock:
+        for account_id, delta in local.items():
+            expected[account_id] += delta
+
+def run(mode, accounts_count, workers_count, operations, opening_balance):
+    from app import create_app, db
+    from app.models import User, Account
+    
+    app = create_app()
+    
+    with app.app_context():
+        db.create_all()
+        user = User(name='Stress User', email=f'stress-{time.time_ns()}@evertrust.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        accounts = [
+            Account(user_id=user.id, type='Checking', number=f'{time.time_ns() % 10 ** 10:010d}{i:02d}',
+                    balance=opening_balance)
+            for i in range(accounts_count)
+        ]
+        db.session.add_all(accounts)
+        db.session.commit()
+        account_ids = [account.id for account in accounts]
+    
+    expected = defaultdict(Decimal, {account_id: Decimal(opening_balance) for account_id in account_ids})
+    lock = threading.Lock()
+    stats = defaultdict(int)
+    
+    threads = [
+        threading.Thread(target=worker, args=(app, mode, account_ids, operations, expected, lock, stats))
+        for _ in range(workers_count)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    with app.app_context():
+        actual = {
+            account.id: Decimal(str(account.balance))
+            for account in Account.query.filter(Account.id.in_(account_ids))
+        }
+    
+    lost = {account_id: (expected[account_id], actual[account_id])
+            for account_id in account_ids if expected[account_id] != actual[account_id]}
+    negative = [account_id for account_id, balance in actual.items() if balance < 0]
+    
+    print(f"mode={mode} workers={workers_count} ops/worker={operations} accounts={accounts_count}")
+    print(f"committed={stats['committed']} insufficient={stats['insufficient']} retries={stats['retries']} "
+          f"elapsed={elapsed:.2f}s ({stats['committed'] / elapsed:.0f} commits/s)")
+    print(f"lost updates: {len(lost)} accounts, negative balances: {len(negative)}")
+    for account_id, (want, got) in sorted(lost.items()):
+        print(f"  account {account_id}: expected {want}, found {got}")
+    
+    return not lost and not negative
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mode', choices=['atomic', 'naive'], default='atomic')
+    parser.add_argument('--accounts', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--operations', type=int, default=200)
+    parser.add_argument('--opening-balance', type=int, default=10000)
+    parser.add_argument('--database-url', help='Defaults to a throwaway SQLite file')
+    args = parser.parse_args()
+    
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stress.db')}"
+    
+    ok = run(args.mode, args.accounts, args.workers, args.operations, args.opening_balance)
+    sys.exit(0 if ok else 1)
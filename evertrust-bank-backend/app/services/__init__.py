@@ -1,5 +1,20 @@
 # Import services for easier access
 from .email_service import EmailService
+from .email_templates import EmailTemplates
 from .audit_service import AuditService
+from .audit_writer import AuditWriter
+from .audit_partitions import AuditPartitionService
+from .unit_of_work import UnitOfWork
+from .ledger_service import LedgerService, InsufficientFundsError
+from .idempotency_service import IdempotencyService, idempotent
+from .user_context import UserContext, UserContextService, UnknownUserError
+from .email_worker import EmailOutboxWorker
+from .statement_jobs import StatementJobService
+from .statement_runs import StatementRunService
+from .transaction_export import TransactionExportService
+from .balance_history import BalanceHistoryService
 
-__all__ = ['EmailService', 'AuditService']
\ No newline at end of file
+__all__ = ['EmailService', 'EmailTemplates', 'AuditService', 'AuditWriter', 'AuditPartitionService', 'UnitOfWork', 'LedgerService', 'InsufficientFundsError',
+           'IdempotencyService', 'idempotent', 'UserContext', 'UserContextService', 'UnknownUserError',
+           'EmailOutboxWorker', 'StatementJobService', 'StatementRunService',
+           'TransactionExportService', 'BalanceHistoryService']
\ No newline at end of file
@@ -0,0 +1,234 @@
+from app import db
+from app.models import AuditLog
+from sqlalchemy import text, select, delete
+from datetime import datetime
+import gzip
+import json
+import os
+import re
+
+PARTITION_NAME = re.compile(r'^audit_log_(\d{4})_(\d{2})$')
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+class AuditPartitionService:
+    """
+    Monthly partitions of audit_log on PostgreSQL, plus retention
+    
+    On PostgreSQL audit_log is partitioned by RANGE (created_at) with one
+    partition per month (audit_log_YYYY_MM) and a DEFAULT partition for rows
+    outside them. Partitions are created ahead of time so inserts never land
+    in the default partition, and retention detaches whole months, writes
+    them to gzipped NDJSON and drops them instead of running a large DELETE.
+    
+    Elsewhere (SQLite in development and tests) audit_log is a plain table:
+    there are no partitions to create, and archiving copies old rows out and
+    deletes them.
+    """
+    
+    @staticmethod
+    def is_partitioned():
+        """
+        Whether audit_log is a partitioned table in the current database
+        """
+        if db.engine.dialect.name != 'postgresql':
+            return False
+        relkind = db.session.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass('audit_log')")
+        ).scalar()
+        return relkind == 'p'
+    
+    @staticmethod
+    def partitions():
+        """
+        List the monthly partitions of audit_log
+        
+        Returns:
+            list: (partition name, first day of its month), oldest first
+        """
+        if not AuditPartitionService.is_partitioned():
+            return []
+        
+        names = db.session.execute(text("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass('audit_log')
+        """)).scalars()
+        return AuditPartitionService._months(names)
+    
+    @staticmethod
+    def detached():
+        """
+        List audit_log_YYYY_MM tables that are no longer partitions of audit_log
+        
+        archive() detaches a month before writing it out; a table listed here
+        is one whose export or drop failed. Its rows are no longer visible
+        through audit_log, and the next archive() resumes it.
+        
+        Returns:
+            list: (table name, first day of its month), oldest first
+        """
+        if not AuditPartitionService.is_partitioned():
+            return []
+        
+        names = db.session.execute(text("""
+            SELECT relname
+            FROM pg_class
+            WHERE relkind = 'r' AND NOT relispartition
+              AND relnamespace = (SELECT oid FROM pg_namespace WHERE nspname = current_schema())
+              AND relname LIKE 'audit\\_log\\_%'
+        """)).scalars()
+        return AuditPartitionService._months(names)
+    
+    @staticmethod
+    def create_partitions(months_ahead=3, now=None):
+        """
+        Make sure partitions exist from the current month to `months_ahead` months ahead
+        
+        Rows that already went to the default partition for a new month are
+        moved into it in the same transaction.
+        
+        Returns:
+            list: Names of the partitions created
+        """
+        if not AuditPartitionService.is_partitioned():
+            return []
+        
+        existing = {name for name, _ in AuditPartitionService.partitions()}
+        current = month_start(now or datetime.utcnow())
+        created = []
+        
+        for offset in range(months_ahead + 1):
+            lower = add_months(current, offset)
+            upper = add_months(lower, 1)
+            name = f'audit_log_{lower:%Y_%m}'
+            if name in existing:
+                continue
+            
+            bounds = {'lower': lower, 'upper': upper}
+            db.session.execute(text('CREATE TEMPORARY TABLE audit_log_moving (LIKE audit_log) ON COMMIT DROP'))
+            db.session.execute(text("""
+                WITH moved AS (
+                    DELETE FROM audit_log_default
+                    WHERE created_at >= :lower AND created_at < :upper
+                    RETURNING *
+                )
+                INSERT INTO audit_log_moving SELECT * FROM moved
+            """), bounds)
+            db.session.execute(text(
+                f"CREATE TABLE {name} PARTITION OF audit_log "
+                f"FOR VALUES FROM ('{lower:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+            ))
+            db.session.execute(text('INSERT INTO audit_log SELECT * FROM audit_log_moving'))
+            db.session.commit()
+            created.append(name)
+        
+        return created
+    
+    @staticmethod
+    def retention_cutoff(retention_months, now=None):
+        """
+        First moment that is kept when keeping `retention_months` whole months
+        """
+        return add_months(month_start(now or datetime.utcnow()), -retention_months)
+    
+    @staticmethod
+    def archive(before, directory):
+        """
+        Move audit events older than `before` to gzipped NDJSON files
+        
+        Partitioned: every monthly partition that ends on or before `before`
+        is detached, written to <directory>/audit_log_YYYY_MM.ndjson.gz and
+        dropped. If writing or dropping fails the detached table is left in
+        place (see detached()) and is written out and dropped first by the
+        next run, so a failure is retried rather than orphaned.
+        Plain table: rows created before `before` are written to one file
+        and deleted.
+        
+        Args:
+            before: Cut-off datetime; use retention_cutoff() for whole months
+            directory: Where the archive files are written
+        
+        Returns:
+            list: (path, row count) per archive file written
+        """
+        os.makedirs(directory, exist_ok=True)
+        
+        if not AuditPartitionService.is_partitioned():
+            table = AuditLog.__table__
+            older = table.c.created_at < before
+            path = os.path.join(directory, f'audit_log_before_{before:%Y_%m_%d}.ndjson.gz')
+            rows = AuditPartitionService._dump(select(table).where(older).order_by(table.c.created_at, table.c.id), path)
+            if rows == 0:
+                os.remove(path)
+                return []
+            db.session.execute(delete(table).where(older))
+            db.session.commit()
+            return [(path, rows)]
+        
+        # Months an earlier run detached but did not finish come first
+        archived = [
+            AuditPartitionService._archive_table(name, directory)
+            for name, _ in AuditPartitionService.detached()
+        ]
+        for name, month in AuditPartitionService.partitions():
+            if add_months(month, 1) > before:
+                break
+            
+            db.session.execute(text(f'ALTER TABLE audit_log DETACH PARTITION {name}'))
+            db.session.commit()
+            archived.append(AuditPartitionService._archive_table(name, directory))
+        
+        return archived
+    
+    @staticmethod
+    def _months(names):
+        months = []
+        for name in names:
+            match = PARTITION_NAME.match(name)
+            if match:
+                months.append((name, datetime(int(match[1]), int(match[2]), 1)))
+        return sorted(months, key=lambda month: month[1])
+    
+    @staticmethod
+    def _archive_table(name, directory):
+        """Write a detached month out and drop it; safe to repeat if a previous attempt failed"""
+        try:
+            path = os.path.join(directory, f'{name}.ndjson.gz')
+            rows = AuditPartitionService._dump(text(f'SELECT * FROM {name} ORDER BY created_at, id'), path)
+            db.session.execute(text(f'DROP TABLE {name}'))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return path, rows
+    
+    @staticmethod
+    def _dump(query, path):
+        partial = path + '.partial'
+        rows = 0
+        result = db.session.execute(query.execution_options(yield_per=1000))
+        
+        with open(partial, 'wb') as raw:
+            with gzip.open(raw, 'wt', encoding='utf-8') as archive:
+                for row in result:
+                    archive.write(json.dumps(dict(row._mapping), default=AuditPartitionService._serialize) + '\n')
+                    rows += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+        
+        # Only a complete, synced file gets the final name
+        os.replace(partial, path)
+        return rows
+    
+    @staticmethod
+    def _serialize(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
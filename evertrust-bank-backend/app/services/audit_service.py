@@ -1,87 +1,251 @@
 from app import db
-from app.models import AuditLog
+from app.models import AuditLog, AuditLogMetadataKey
+from app.services.unit_of_work import UnitOfWork
+from app.services.audit_writer import AuditWriter
+from flask import current_app
+from sqlalchemy import select, or_
+from sqlalchemy.pool import StaticPool
+from threading import Lock
 from datetime import datetime
 import json
 
+_writer_lock = Lock()
+
 class AuditService:
     @staticmethod
-    def log_event(user_id, action, entity, entity_id=None, metadata=None):
+    def log_event(user_id, action, entity, entity_id=None, metadata=None, durability=None):
         """
         Log an audit event to the database
         
+        Two durability modes:
+        - 'sync': the row is written with the current session. Inside an
+          open UnitOfWork it becomes durable with the rest of the request's
+          writes (money movement); otherwise it is committed immediately.
+        - 'async': the event is handed to the batched AuditWriter and the
+          call returns without touching the database (informational events
+          such as logins and failed queries).
+        
+        By default events inside a UnitOfWork are 'sync' and all others use
+        AUDIT_DURABILITY.
+        
         Args:
             user_id: ID of the user performing the action
             action: Description of the action performed
             entity: Type of entity affected (e.g., 'account', 'transaction')
             entity_id: ID of the affected entity (optional)
             metadata: Additional context data (optional)
+            durability: 'sync' or 'async' to override the default (optional)
         
         Returns:
-            AuditLog: The created audit log entry
+            AuditLog: The created audit log entry, or None if it was queued or logging failed
         """
+        if durability is None:
+            durability = 'sync' if UnitOfWork.current() is not None else current_app.config['AUDIT_DURABILITY']
+        
         try:
+            if durability == 'async':
+                writer = AuditService.writer()
+                if writer is not None:
+                    writer.submit({
+                        'user_id': user_id,
+                        'action': action,
+                        'entity': entity,
+                        'entity_id': entity_id,
+                        'metadata': metadata or {},
+                        'created_at': datetime.utcnow()
+                    })
+                    return None
+            
             audit_log = AuditLog(
                 user_id=user_id,
                 action=action,
                 entity=entity,
                 entity_id=entity_id,
-                metadata=metadata or {},
+                metadata_=metadata or {},
                 created_at=datetime.utcnow()
             )
             
             db.session.add(audit_log)
-            db.session.commit()
+            if UnitOfWork.current() is None:
+                db.session.commit()
             
             return audit_log
         except Exception as e:
             # If logging fails, we don't want to break the main operation
             # but we should at least log the error to console
             print(f"Audit logging failed: {str(e)}")
-            db.session.rollback()
+            if UnitOfWork.current() is None:
+                db.session.rollback()
             return None
 
     @staticmethod
-    def get_user_events(user_id, limit=50, offset=0):
+    def writer():
+        """
+        The application's batched audit writer, created on first use
+        
+        Created lazily so that each forked server process runs its own
+        writer thread. Returns None when the engine shares one connection
+        across threads (in-memory SQLite): a second writer on it would
+        interleave with request transactions, so events are written
+        synchronously instead.
+        """
+        app = current_app._get_current_object()
+        if isinstance(db.engine.pool, StaticPool):
+            return None
+        
+        writer = app.extensions.get('audit_writer')
+        if writer is None:
+            with _writer_lock:
+                writer = app.extensions.get('audit_writer')
+                if writer is None:
+                    writer = app.extensions['audit_writer'] = AuditWriter.from_config(db.engine, app.config)
+        return writer
+
+    @staticmethod
+    def flush():
+        """
+        Wait until every queued audit event has been written
+        """
+        writer = current_app.extensions.get('audit_writer')
+        if writer is not None:
+            writer.flush()
+
+    @staticmethod
+    def get_user_events(user_id, limit=50, offset=0, since=None, until=None, before=None):
         """
-        Retrieve audit events for a specific user
+        Retrieve audit events for a specific user, newest first
+        
+        Page with `before` (keyset pagination on created_at, id, served by
+        the (user_id, created_at) index) rather than `offset`, whose cost
+        grows with the number of rows skipped.
+        
+        On PostgreSQL audit_log is partitioned by month on created_at: a
+        since/until range or a `before` position lets the planner skip
+        partitions, and ordering by created_at lets it read the newest
+        partitions first and stop once `limit` rows are found.
         
         Args:
             user_id: ID of the user
             limit: Maximum number of events to return
-            offset: Number of events to skip for pagination
+            offset: Number of events to skip for pagination (legacy)
+            since: Only events at or after this time (optional)
+            until: Only events before this time (optional)
+            before: (created_at, id) of the last event of the previous page (optional)
         
         Returns:
             List[AuditLog]: List of audit log entries
         """
-        return AuditLog.query.filter_by(user_id=user_id)\
-                            .order_by(AuditLog.created_at.desc())\
-                            .limit(limit)\
-                            .offset(offset)\
-                            .all()
+        query = AuditService._page(AuditLog.query.filter_by(user_id=user_id), since, until, before)
+        if offset:
+            query = query.offset(offset)
+        return query.limit(limit).all()
 
     @staticmethod
-    def get_entity_events(entity, entity_id, limit=50):
+    def get_entity_events(entity, entity_id, limit=50, since=None, until=None, before=None, user_id=None):
         """
-        Retrieve audit events for a specific entity
+        Retrieve audit events for a specific entity, newest first
+        
+        Served by the (entity, entity_id, created_at) index; see
+        get_user_events for the paging arguments.
         
         Args:
             entity: Type of entity
             entity_id: ID of the entity
             limit: Maximum number of events to return
+            since: Only events at or after this time (optional)
+            until: Only events before this time (optional)
+            before: (created_at, id) of the last event of the previous page (optional)
+            user_id: Only events performed by this user (optional)
         
         Returns:
             List[AuditLog]: List of audit log entries
         """
-        return AuditLog.query.filter_by(entity=entity, entity_id=entity_id)\
-                            .order_by(AuditLog.created_at.desc())\
-                            .limit(limit)\
-                            .all()
+        query = AuditLog.query.filter_by(entity=entity, entity_id=entity_id)
+        if user_id is not None:
+            query = query.filter(AuditLog.user_id == user_id)
+        return AuditService._page(query, since, until, before).limit(limit).all()
+
+    @staticmethod
+    def search_events(criteria, user_id=None, action=None, entity=None, limit=50, since=None, until=None,
+                      before=None):
+        """
+        Find audit events whose metadata matches every key/value in `criteria`, newest first
+        
+        Values are compared as text against top-level metadata values, so
+        {'transaction_id': '42'} matches both "42" and 42. On PostgreSQL each criterion is a containment test
+        (metadata @> ...) served by the GIN index; elsewhere it is a lookup
+        in audit_log_metadata_keys. Paged like get_user_events.
+        
+        Args:
+            criteria: Dict of metadata key to value
+            user_id: Only events performed by this user (optional)
+            action: Only events with this action (optional)
+            entity: Only events on this entity type (optional)
+            limit: Maximum number of events to return
+            since: Only events at or after this time (optional)
+            until: Only events before this time (optional)
+            before: (created_at, id) of the last event of the previous page (optional)
+        
+        Returns:
+            List[AuditLog]: List of audit log entries
+        """
+        query = AuditLog.query
+        if user_id is not None:
+            query = query.filter(AuditLog.user_id == user_id)
+        if action is not None:
+            query = query.filter(AuditLog.action == action)
+        if entity is not None:
+            query = query.filter(AuditLog.entity == entity)
+        
+        metadata = AuditLog.metadata_
+        keys = AuditLogMetadataKey.__table__
+        for key, value in criteria.items():
+            value = str(value)
+            if db.engine.dialect.name == 'postgresql':
+                query = query.filter(or_(*(metadata.contains({key: candidate})
+                                           for candidate in AuditService._json_values(value))))
+            else:
+                query = query.filter(AuditLog.id.in_(
+                    select(keys.c.audit_log_id).where(keys.c.key == key, keys.c.value == value)
+                ))
+        
+        return AuditService._page(query, since, until, before).limit(limit).all()
+
+    @staticmethod
+    def _json_values(value):
+        # The stored JSON values that read as `value`: the string itself and,
+        # for text such as 25.00 or true, the number or boolean
+        values = [value]
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            return values
+        if isinstance(parsed, (bool, int, float)):
+            values.append(parsed)
+        return values
+
+    @staticmethod
+    def _page(query, since, until, before):
+        # Bounds on the partition key, so PostgreSQL can prune partitions
+        if since is not None:
+            query = query.filter(AuditLog.created_at >= since)
+        if until is not None:
+            query = query.filter(AuditLog.created_at < until)
+        if before is not None:
+            created_at, row_id = before
+            query = query.filter(AuditLog.created_at <= created_at)\
+                         .filter(or_(AuditLog.created_at < created_at, AuditLog.id < row_id))
+        # id breaks ties between events sharing a timestamp so pages never overlap
+        return query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
 
     @staticmethod
     def export_events(user_id, start_date=None, end_date=None):
         """
         Export audit events to a JSON format
         
+        Builds the whole document in memory; use stream_export for large
+        histories.
+        
         Args:
             user_id: ID of the user
             start_date: Start date for filtering (optional)
@@ -90,25 +254,59 @@ class AuditService:
         Returns:
             str: JSON string of audit events
         """
-        query = AuditLog.query.filter_by(user_id=user_id)
+        return ''.join(AuditService.stream_export(user_id, start_date, end_date, format='json'))
+
+    @staticmethod
+    def stream_export(user_id, start_date=None, end_date=None, format='ndjson', chunk_size=1000):
+        """
+        Export audit events incrementally, newest first
+        
+        Rows are read in chunks of `chunk_size` through a server-side cursor
+        (yield_per) and each chunk is serialized and yielded before the next
+        is fetched, so memory use does not grow with the size of the history.
+        
+        Args:
+            user_id: ID of the user
+            start_date: Start date for filtering (optional)
+            end_date: End date for filtering (optional)
+            format: 'ndjson' (one event per line) or 'json' (a JSON array)
+            chunk_size: Rows fetched and emitted per chunk
+        
+        Yields:
+            str: Pieces of the export document
+        """
+        if format not in ('ndjson', 'json'):
+            raise ValueError(f'Unknown export format: {format}')
         
+        table = AuditLog.__table__
+        query = select(table.c.id, table.c.action, table.c.entity, table.c.entity_id,
+                       table.c.metadata, table.c.created_at)\
+            .where(table.c.user_id == user_id)
         if start_date:
-            query = query.filter(AuditLog.created_at >= start_date)
+            query = query.where(table.c.created_at >= start_date)
         if end_date:
-            query = query.filter(AuditLog.created_at <= end_date)
-        
-        events = query.order_by(AuditLog.created_at.desc()).all()
-        
-        # Convert events to a serializable format
-        events_data = []
-        for event in events:
-            events_data.append({
-                'id': event.id,
-                'action': event.action,
-                'entity': event.entity,
-                'entity_id': event.entity_id,
-                'metadata': event.metadata,
-                'created_at': event.created_at.isoformat()
-            })
-        
-        return json.dumps(events_data, indent=2)
\ No newline at end of file
+            query = query.where(table.c.created_at <= end_date)
+        query = query.order_by(table.c.created_at.desc(), table.c.id.desc())
+        
+        result = db.session.execute(query.execution_options(yield_per=chunk_size))
+        separator = '\n' if format == 'ndjson' else ',\n'
+        first = True
+        
+        if format == 'json':
+            yield '[\n'
+        for rows in result.partitions():
+            chunk = separator.join(json.dumps({
+                'id': row.id,
+                'action': row.action,
+                'entity': row.entity,
+                'entity_id': row.entity_id,
+                'metadata': row.metadata,
+                'created_at': row.created_at.isoformat()
+            }) for row in rows)
+            if format == 'ndjson':
+                yield chunk + '\n'
+            else:
+                yield chunk if first else separator + chunk
+            first = False
+        if format == 'json':
+            yield '\n]\n'
@@ -0,0 +1,146 @@
+from app.models import AuditLog
+from queue import Queue, Empty, Full
+import atexit
+import threading
+import time
+
+_STOP = object()
+_FLUSH = object()
+
+class AuditWriter:
+    """
+    Writes audit events from an in-process queue in batches
+    
+    Events are put on a bounded queue and a background thread inserts them
+    with one multi-row INSERT per batch, flushing as soon as batch_size
+    events are waiting or flush_interval seconds after the first event of a
+    batch arrived. close() drains the queue and is registered with atexit,
+    so a graceful shutdown (including gunicorn's SIGTERM handling) writes
+    everything that was accepted; a crash loses what was still queued,
+    which is why only informational events take this path.
+    
+    If the queue is full the caller writes its own event synchronously
+    rather than dropping it.
+    
+    Usage:
+        writer = AuditWriter(db.engine, batch_size=500, flush_interval=1.0)
+        writer.submit({'user_id': 1, 'action': 'user_login', 'entity': 'user', ...})
+    """
+    
+    RETRIES = 3
+    
+    def __init__(self, engine, batch_size=500, flush_interval=1.0, max_queue=10000):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    @classmethod
+    def from_config(cls, engine, config):
+        """
+        Build a writer from the AUDIT_* settings of a Flask config
+        """
+        return cls(
+            engine,
+            batch_size=config['AUDIT_BATCH_SIZE'],
+            flush_interval=config['AUDIT_FLUSH_INTERVAL'],
+            max_queue=config['AUDIT_QUEUE_SIZE']
+        )
+    
+    def submit(self, event):
+        """
+        Queue one event for the next batch
+        
+        Args:
+            event: Dict of audit_log column values
+        """
+        if not self._closed:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except Full:
+                pass
+        self.write([event])
+    
+    def flush(self):
+        """
+        Block until every event submitted so far has been written
+        """
+        if not self._closed:
+            self.queue.put(_FLUSH)
+        self.queue.join()
+    
+    def close(self, timeout=30):
+        """
+        Write everything still queued and stop the writer thread
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+    
+    def write(self, events):
+        """
+        Insert events with a single multi-row INSERT, retrying briefly
+        
+        Returns:
+            bool: True if the events were written
+        """
+        table = AuditLog.__table__
+        for attempt in range(self.RETRIES):
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(table.insert(), events)
+                self.written += len(events)
+                return True
+            except Exception as e:
+                error = e
+                if attempt + 1 < self.RETRIES:
+                    time.sleep(0.2 * 2 ** attempt)
+        
+        self.dropped += len(events)
+        print(f"Audit batch write failed, {len(events)} events lost: {str(error)}")
+        return False
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            event = self.queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if event is _STOP or event is _FLUSH:
+                    stopping = event is _STOP
+                    self.queue.task_done()
+                    break
+                batch.append(event)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    event = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except Empty:
+                    break
+            
+            if stopping:
+                # A submit() racing close() can land behind the marker
+                while True:
+                    try:
+                        event = self.queue.get_nowait()
+                    except Empty:
+                        break
+                    if event is _FLUSH:
+                        self.queue.task_done()
+                    else:
+                        batch.append(event)
+            
+            if batch:
+                self.write(batch)
+            for _ in batch:
+                self.queue.task_done()
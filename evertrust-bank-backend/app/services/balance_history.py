@@ -0,0 +1,124 @@
+from app import db
+from app.models import Account, AccountBalanceShard, AccountDailyBalance, Transaction
+from app.services.ledger_service import LedgerService
+from sqlalchemy import select, insert, delete, func, literal
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+INTERVALS = ('day', 'week', 'month')
+MAX_RANGE_DAYS = 5 * 366  # The series is walked day by day, so a range is capped
+
+def bucket_start(day, interval):
+    """First day of the day, week (starting Monday) or month `day` falls in"""
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+class BalanceHistoryService:
+    """
+    Balance over time, drawn from the daily rollup (AccountDailyBalance)
+    
+    A chart is the balance at its first day (LedgerService.balance_at, one
+    indexed lookup) carried forward through the daily net changes in its
+    range, so its cost depends on the number of days shown and not on how
+    many transactions the account has.
+    """
+    
+    @staticmethod
+    def series(account, start_date, end_date, interval='day'):
+        """
+        Closing balance of each day, week or month from start_date to end_date (inclusive dates)
+        
+        Buckets cut by the range close on its last day; periods without
+        activity repeat the previous balance so a chart has no gaps.
+        
+        Args:
+            account: The Account
+            start_date: First day of the range
+            end_date: Last day of the range (inclusive)
+            interval: 'day', 'week' or 'month'
+        
+        Returns:
+            list: (first day of the bucket, closing balance) pairs, oldest first
+        
+        Raises:
+            ValueError: If the interval is unknown or the range is longer than MAX_RANGE_DAYS
+        """
+        if interval not in INTERVALS:
+            raise ValueError(f'Unknown interval: {interval}')
+        if (end_date - start_date).days >= MAX_RANGE_DAYS:
+            raise ValueError(f'Range is longer than {MAX_RANGE_DAYS} days')
+        
+        balance = LedgerService.balance_at(account, datetime.combine(start_date, datetime.min.time()))
+        daily = AccountDailyBalance.__table__
+        changes = dict(db.session.execute(
+            select(daily.c.day, func.sum(daily.c.net_change))
+            .where(daily.c.account_id == account.id, daily.c.day >= start_date, daily.c.day <= end_date)
+            .group_by(daily.c.day)
+        ).all())
+        
+        points = []
+        day = start_date
+        while day <= end_date:
+            if day in changes:
+                balance += Decimal(str(changes[day]))
+            next_day = day + timedelta(days=1)
+            if next_day > end_date or bucket_start(next_day, interval) != bucket_start(day, interval):
+                points.append((bucket_start(day, interval), balance.quantize(Decimal('0.01'))))
+            day = next_day
+        return points
+    
+    @staticmethod
+    def backfill(account_ids):
+        """
+        Rebuild the daily rollup of `account_ids` from their transactions
+        
+        One INSERT ... SELECT: each transaction's change is its balance_after
+        minus the one before it (LAG over the account's history), which is
+        exact wherever balance_after is set; an account's first transaction
+        and rows without balance_after use the amount signed by the
+        direction it was posted with instead. The changes are summed per
+        account and day and replace the rows that were there. The accounts
+        and their shards are locked meanwhile so no posting adds to a row
+        being rebuilt; the caller commits.
+        
+        Args:
+            account_ids: IDs of the accounts
+        
+        Returns:
+            int: Rollup rows written
+        """
+        if not account_ids:
+            return 0
+        
+        accounts = Account.__table__
+        shards = AccountBalanceShard.__table__
+        transactions = Transaction.__table__
+        daily = AccountDailyBalance.__table__
+        
+        db.session.execute(
+            select(accounts.c.id).where(accounts.c.id.in_(account_ids)).order_by(accounts.c.id).with_for_update()
+        )
+        db.session.execute(
+            select(shards.c.account_id).where(shards.c.account_id.in_(account_ids))
+            .order_by(shards.c.account_id, shards.c.shard).with_for_update()
+        )
+        
+        previous = func.lag(transactions.c.balance_after).over(
+            partition_by=transactions.c.account_id,
+            order_by=(transactions.c.created_at, transactions.c.id)
+        )
+        changes = select(
+            transactions.c.account_id,
+            func.date(transactions.c.created_at).label('day'),
+            func.coalesce(transactions.c.balance_after - previous, LedgerService.signed_amount()).label('change')
+        ).where(transactions.c.account_id.in_(account_ids)).subquery()
+        
+        db.session.execute(delete(daily).where(daily.c.account_id.in_(account_ids)))
+        return db.session.execute(insert(daily).from_select(
+            ['account_id', 'day', 'shard', 'net_change'],
+            select(changes.c.account_id, changes.c.day, literal(0), func.sum(changes.c.change))
+            .group_by(changes.c.account_id, changes.c.day)
+        )).rowcount
@@ -1,19 +1,29 @@
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from app import app
-from threading import Thread
+from email.utils import formatdate
+from flask import current_app
+from app import db
+from app.models import EmailOutbox
+from app.services.unit_of_work import UnitOfWork
+from app.services.smtp_pool import SMTPConnectionPool
+from app.services.email_templates import email_templates
+from threading import Lock
 import os
-from datetime import datetime
+import json
+from datetime import datetime, timedelta
+
+_pool_lock = Lock()
 
 class EmailService:
     @staticmethod
     def send_email(to_email, subject, html_content, text_content=None):
         """
-        Send an email using SMTP (stub implementation for demo)
+        Send an email now and log the attempt
         
-        In a real application, this would connect to an SMTP server
-        or email service like SendGrid, Mailgun, etc.
+        The message goes through deliver(): over a pooled connection to
+        SMTP_SERVER, or printed when none is configured. Failures are logged
+        and returned as False rather than raised; mail that must be retried
+        is queued in the outbox with queue_email instead.
         
         Args:
             to_email: Recipient email address
@@ -24,27 +34,133 @@ class EmailService:
         Returns:
             bool: True if email was sent successfully
         """
-        # This is a stub implementation for demo purposes
-        # In production, you would implement actual email sending
-        
         try:
-            # Simulate email sending (replace with actual SMTP code)
-            print(f"\n=== EMAIL NOTIFICATION ===")
-            print(f"To: {to_email}")
-            print(f"Subject: {subject}")
-            print(f"Content: {text_content or html_content[:100]}...")
-            print("=== EMAIL WOULD BE SENT HERE ===\n")
+            EmailService.deliver(to_email, subject, html_content, text_content)
             
             # Log the email attempt
             EmailService.log_email_attempt(to_email, subject, True)
             
             return True
-            
+        
         except Exception as e:
             print(f"Email sending failed: {str(e)}")
             EmailService.log_email_attempt(to_email, subject, False, str(e))
             return False
 
+    @staticmethod
+    def deliver(to_email, subject, html_content, text_content=None):
+        """
+        Hand one message to the SMTP server configured in SMTP_SERVER
+        
+        Without an SMTP server (local development) the message is printed
+        instead. Unlike send_email, failures are raised so the outbox worker
+        can record them and retry.
+        
+        Raises:
+            smtplib.SMTPException, OSError: If the message could not be sent
+        """
+        error = EmailService.deliver_many([(to_email, subject, html_content, text_content)])[0]
+        if error is not None:
+            raise error
+
+    @staticmethod
+    def deliver_many(messages):
+        """
+        Send several messages over a single pooled SMTP connection
+        
+        Args:
+            messages: List of (to_email, subject, html_content, text_content)
+        
+        Returns:
+            list: None for each delivered message, otherwise its exception
+        """
+        config = current_app.config
+        if not config.get('SMTP_SERVER'):
+            for to_email, subject, html_content, text_content in messages:
+                print(f"\n=== EMAIL NOTIFICATION ===")
+                print(f"To: {to_email}")
+                print(f"Subject: {subject}")
+                print(f"Content: {text_content or html_content[:100]}...")
+                print("=== EMAIL WOULD BE SENT HERE ===\n")
+            return [None] * len(messages)
+        
+        sender = config['MAIL_DEFAULT_SENDER']
+        return EmailService.smtp_pool().send_many(sender, [
+            ([to_email], EmailService.build_message(sender, to_email, subject, html_content, text_content))
+            for to_email, subject, html_content, text_content in messages
+        ])
+
+    @staticmethod
+    def smtp_pool():
+        """
+        The application's SMTP connection pool, created on first use
+        
+        Created lazily so that each forked server or worker process opens
+        its own connections.
+        """
+        app = current_app._get_current_object()
+        pool = app.extensions.get('smtp_pool')
+        if pool is None:
+            with _pool_lock:
+                pool = app.extensions.get('smtp_pool')
+                if pool is None:
+                    pool = app.extensions['smtp_pool'] = SMTPConnectionPool.from_config(app.config)
+        return pool
+
+    @staticmethod
+    def build_message(sender, to_email, subject, html_content, text_content=None):
+        """
+        Build a multipart/alternative message with text and HTML parts
+        
+        The text part comes first so that clients which understand HTML
+        prefer the last (HTML) alternative.
+        
+        Returns:
+            str: The serialized message, ready for SMTP
+        """
+        message = MIMEMultipart('alternative')
+        message['Subject'] = subject
+        message['From'] = sender
+        message['To'] = to_email
+        message['Date'] = formatdate(localtime=True)
+        if text_content:
+            message.attach(MIMEText(text_content, 'plain', 'utf-8'))
+        message.attach(MIMEText(html_content, 'html', 'utf-8'))
+        return message.as_string()
+
+    @staticmethod
+    def queue_email(to_email, subject, html_content, text_content=None, category='general', payload=None, delay=0):
+        """
+        Add an email to the outbox for the email worker to send
+        
+        Inside an open UnitOfWork the outbox row is only added to the session,
+        so the email is sent if and only if the request's writes commit;
+        otherwise it is committed immediately.
+        
+        Args:
+            category: 'alert' marks the message as mergeable into a digest
+            payload: JSON-serialisable details kept for building a digest
+            delay: Seconds to hold the message before it is due
+        
+        Returns:
+            EmailOutbox: The queued message
+        """
+        message = EmailOutbox(
+            to_email=to_email,
+            subject=subject,
+            html_content=html_content,
+            text_content=text_content,
+            category=category,
+            payload=None if payload is None else json.dumps(payload),
+            status='pending',
+            attempts=0,
+            next_attempt_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        db.session.add(message)
+        if UnitOfWork.current() is None:
+            db.session.commit()
+        return message
+
     @staticmethod
     def send_alert_notification(user_email, alert_type, message, account_info=None):
         """
@@ -59,56 +175,68 @@ class EmailService:
         Returns:
             bool: True if email was sent successfully
         """
-        subject = f"EverTrust Bank Alert: {alert_type.replace('_', ' ').title()}"
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #1e40af; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 20px; background-color: #f9fafb; }}
-                .footer {{ padding: 20px; text-align: center; color: #6b7280; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>EverTrust Bank Alert</h1>
-                </div>
-                <div class="content">
-                    <h2>{subject}</h2>
-                    <p>{message}</p>
-                    {f'<p><strong>Account:</strong> {account_info}</p>' if account_info else ''}
-                    <p>If you did not initiate this action or have any concerns, 
-                    please contact our support team immediately.</p>
-                </div>
-                <div class="footer">
-                    <p>This is an automated message. Please do not reply to this email.</p>
-                    <p>© {datetime.now().year} EverTrust Bank. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        EverTrust Bank Alert: {subject}
-        
-        {message}
-        
-        {f'Account: {account_info}' if account_info else ''}
-        
-        If you did not initiate this action or have any concerns, 
-        please contact our support team immediately.
-        
-        This is an automated message. Please do not reply to this email.
-        © {datetime.now().year} EverTrust Bank. All rights reserved.
-        """
-        
-        return EmailService.send_email(user_email, subject, html_content, text_content)
+        return EmailService.send_email(
+            user_email, *EmailService.render_alert_notification(alert_type, message, account_info)
+        )
+
+    @staticmethod
+    def queue_alert_notification(user_email, alert_type, message, account_info=None):
+        """
+        Queue an alert notification email in the outbox
+        
+        Alerts are held for ALERT_DIGEST_WINDOW seconds; the email worker
+        merges every alert a user collects in that window into one digest.
+        Types listed in ALERT_DIGEST_BYPASS_TYPES are due immediately and
+        always go out on their own.
+        
+        Returns:
+            EmailOutbox: The queued message
+        """
+        config = current_app.config
+        content = EmailService.render_alert_notification(alert_type, message, account_info)
+        window = config.get('ALERT_DIGEST_WINDOW', 0)
+        
+        if window <= 0 or alert_type in config.get('ALERT_DIGEST_BYPASS_TYPES', ()):
+            return EmailService.queue_email(user_email, *content)
+        
+        return EmailService.queue_email(
+            user_email, *content,
+            category='alert',
+            payload={'alert_type': alert_type, 'message': message, 'account_info': account_info},
+            delay=window
+        )
+
+    @staticmethod
+    def render_alert_notification(alert_type, message, account_info=None):
+        """
+        Build an alert notification email
+        
+        Returns:
+            tuple: (subject, html_content, text_content)
+        """
+        return email_templates.render('alert_notification', {
+            'alert_title': alert_type.replace('_', ' ').title(),
+            'message': message,
+            'account_info': account_info
+        })
+
+    @staticmethod
+    def render_alert_digest(alerts):
+        """
+        Build one email covering several alert notifications
+        
+        Args:
+            alerts: List of dicts with alert_type, message and account_info
+        
+        Returns:
+            tuple: (subject, html_content, text_content)
+        """
+        return email_templates.render('alert_digest', {
+            'alerts': [
+                {**alert, 'alert_title': alert['alert_type'].replace('_', ' ').title()}
+                for alert in alerts
+            ]
+        })
 
     @staticmethod
     def send_welcome_email(user_email, user_name):
@@ -122,49 +250,17 @@ class EmailService:
         Returns:
             bool: True if email was sent successfully
         """
-        subject = "Welcome to EverTrust Bank!"
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #1e40af; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 20px; background-color: #f9fafb; }}
-                .footer {{ padding: 20px; text-align: center; color: #6b7280; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Welcome to EverTrust Bank!</h1>
-                </div>
-                <div class="content">
-                    <h2>Hello {user_name}!</h2>
-                    <p>Thank you for choosing EverTrust Bank for your financial needs.</p>
-                    <p>Your account has been successfully created and is ready to use.</p>
-                    <p>With EverTrust Bank, you can:</p>
-                    <ul>
-                        <li>View account balances and transactions</li>
-                        <li>Transfer money between accounts</li>
-                        <li>Pay bills online</li>
-                        <li>Set up alerts and notifications</li>
-                        <li>And much more!</li>
-                    </ul>
-                    <p>If you have any questions, please don't hesitate to contact our support team.</p>
-                </div>
-                <div class="footer">
-                    <p>This is an automated message. Please do not reply to this email.</p>
-                    <p>© {datetime.now().year} EverTrust Bank. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return EmailService.send_email(user_email, subject, html_content)
+        return EmailService.send_email(user_email, *EmailService.render_welcome_email(user_name))
+
+    @staticmethod
+    def render_welcome_email(user_name):
+        """
+        Build a welcome email
+        
+        Returns:
+            tuple: (subject, html_content, text_content)
+        """
+        return email_templates.render('welcome', {'user_name': user_name})
 
     @staticmethod
     def send_transaction_receipt(user_email, transaction_data):
@@ -178,48 +274,54 @@ class EmailService:
         Returns:
             bool: True if email was sent successfully
         """
-        subject = f"Transaction Receipt: {transaction_data.get('type', 'Transaction')}"
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #1e40af; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 20px; background-color: #f9fafb; }}
-                .transaction-details {{ background-color: white; padding: 15px; border-radius: 5px; border: 1px solid #e5e7eb; }}
-                .footer {{ padding: 20px; text-align: center; color: #6b7280; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Transaction Receipt</h1>
-                </div>
-                <div class="content">
-                    <h2>Your transaction is complete</h2>
-                    <div class="transaction-details">
-                        <p><strong>Type:</strong> {transaction_data.get('type', 'N/A')}</p>
-                        <p><strong>Amount:</strong> ${transaction_data.get('amount', '0.00')}</p>
-                        <p><strong>Description:</strong> {transaction_data.get('description', 'N/A')}</p>
-                        <p><strong>Date:</strong> {transaction_data.get('date', 'N/A')}</p>
-                        <p><strong>Status:</strong> {transaction_data.get('status', 'Completed')}</p>
-                        {f'<p><strong>Account:</strong> {transaction_data.get("account", "N/A")}</p>' if transaction_data.get('account') else ''}
-                    </div>
-                    <p>Thank you for banking with EverTrust.</p>
-                </div>
-                <div class="footer">
-                    <p>This is an automated message. Please do not reply to this email.</p>
-                    <p>© {datetime.now().year} EverTrust Bank. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return EmailService.send_email(user_email, subject, html_content)
+        return EmailService.send_email(user_email, *EmailService.render_transaction_receipt(transaction_data))
+
+    @staticmethod
+    def queue_transaction_receipt(user_email, transaction_data, subject=None):
+        """
+        Queue a transaction receipt email in the outbox
+        
+        Args:
+            user_email: User's email address
+            transaction_data: Dictionary containing transaction details
+            subject: Overrides the default "Transaction Receipt: <type>" subject
+        
+        Returns:
+            EmailOutbox: The queued message
+        """
+        default_subject, html_content, text_content = EmailService.render_transaction_receipt(transaction_data)
+        return EmailService.queue_email(user_email, subject or default_subject, html_content, text_content)
+
+    @staticmethod
+    def render_transaction_receipt(transaction_data):
+        """
+        Build a transaction receipt email
+        
+        Args:
+            transaction_data: Dictionary with type, amount, description, date,
+                status and account (all optional)
+        
+        Returns:
+            tuple: (subject, html_content, text_content)
+        """
+        return email_templates.render('transaction_receipt', transaction_data)
+
+    @staticmethod
+    def render_many(template_name, contexts):
+        """
+        Render one email template for many recipients
+        
+        For batch jobs (e.g. monthly notices) that would otherwise call a
+        render_* method per user.
+        
+        Args:
+            template_name: 'alert_notification', 'welcome' or 'transaction_receipt'
+            contexts: Iterable of dicts of template variables
+        
+        Returns:
+            list: (subject, html_content, text_content) per context
+        """
+        return email_templates.render_many(template_name, contexts)
 
     @staticmethod
     def log_email_attempt(to_email, subject, success, error_message=None):
@@ -246,7 +348,10 @@ class EmailService:
     @staticmethod
     def send_async_email(to_email, subject, html_content, text_content=None):
         """
-        Send email asynchronously using a thread
+        Send email asynchronously through the outbox
+        
+        The message is queued with queue_email and sent by the email worker
+        (`flask email-worker`), so requests never wait on SMTP.
         
         Args:
             to_email: Recipient email address
@@ -254,8 +359,4 @@ class EmailService:
             html_content: HTML content
             text_content: Plain text content
         """
-        thread = Thread(
-            target=EmailService.send_email,
-            args=(to_email, subject, html_content, text_content)
-        )
-        thread.start()
\ No newline at end of file
+        return EmailService.queue_email(to_email, subject, html_content, text_content)
\ No newline at end of file
@@ -0,0 +1,111 @@
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+from datetime import datetime
+import os
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates', 'email')
+
+CONTENT_MARKER = '\x00content\x00'
+
+class EmailTemplates:
+    """
+    Email templates compiled once and rendered from small context dicts
+    
+    Every email is a subject line plus an HTML and a plain-text body. The
+    bodies are Jinja templates holding only the message-specific part; the
+    shared CSS, header and footer live in base.html and base.txt. The layout
+    around each body only changes with the heading and the year, so it is
+    rendered once per (template, year), split around the body and cached.
+    A render then evaluates just the compiled body and concatenates.
+    
+    All templates are compiled when this class is instantiated (at import,
+    through the module-level `email_templates`). HTML bodies are
+    autoescaped; subjects and text bodies are not.
+    """
+    
+    # name: (subject template, HTML heading)
+    TEMPLATES = {
+        'alert_notification': ('EverTrust Bank Alert: {{ alert_title }}', 'EverTrust Bank Alert'),
+        'alert_digest': ('EverTrust Bank: {{ alerts|length }} new alerts', 'EverTrust Bank Alerts'),
+        'welcome': ('Welcome to EverTrust Bank!', 'Welcome to EverTrust Bank!'),
+        'transaction_receipt': ("Transaction Receipt: {{ type or 'Transaction' }}", 'Transaction Receipt'),
+    }
+    
+    def __init__(self, directory=TEMPLATE_DIR):
+        self.environment = Environment(
+            loader=FileSystemLoader(directory),
+            autoescape=select_autoescape(['html'], default_for_string=False),
+            trim_blocks=True,
+            lstrip_blocks=True,
+            keep_trailing_newline=True,
+            auto_reload=False
+        )
+        self.layout_html = self.environment.get_template('base.html')
+        self.layout_text = self.environment.get_template('base.txt')
+        self.templates = {
+            name: (
+                self.environment.from_string(subject),
+                self.environment.get_template(f'{name}.html'),
+                self.environment.get_template(f'{name}.txt'),
+                heading
+            )
+            for name, (subject, heading) in self.TEMPLATES.items()
+        }
+        self._layouts = {}
+    
+    def render(self, name, context):
+        """
+        Render one email
+        
+        Args:
+            name: Template name, e.g. 'alert_notification'
+            context: Dict of template variables
+        
+        Returns:
+            tuple: (subject, html_content, text_content)
+        """
+        return self.render_many(name, [context])[0]
+    
+    def render_many(self, name, contexts):
+        """
+        Render the same email for many recipients
+        
+        Meant for batch jobs such as monthly notices: the template and its
+        layout are looked up once for the whole batch.
+        
+        Args:
+            name: Template name
+            contexts: Iterable of dicts of template variables
+        
+        Returns:
+            list: (subject, html_content, text_content) per context
+        """
+        try:
+            subject, html, text, heading = self.templates[name]
+        except KeyError:
+            raise ValueError(f'Unknown email template: {name}')
+        
+        year = datetime.now().year
+        (html_head, html_tail), (text_head, text_tail) = self._layout(name, heading, year)
+        
+        results = []
+        for context in contexts:
+            variables = {'year': year, **context}
+            results.append((
+                subject.render(variables),
+                html_head + html.render(variables) + html_tail,
+                text_head + text.render(variables) + text_tail
+            ))
+        return results
+    
+    def _layout(self, name, heading, year):
+        key = (name, year)
+        layout = self._layouts.get(key)
+        if layout is None:
+            marker = Markup(CONTENT_MARKER)
+            html = self.layout_html.render(heading=heading, year=year, content=marker)
+            text = self.layout_text.render(year=year, content=marker)
+            layout = self._layouts[key] = (tuple(html.split(CONTENT_MARKER)), tuple(text.split(CONTENT_MARKER)))
+        return layout
+
+email_templates = EmailTemplates()
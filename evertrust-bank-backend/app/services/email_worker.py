@@ -0,0 +1,269 @@
+from app import db
+from app.models import EmailOutbox
+from app.services.email_service import EmailService
+from flask import current_app
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import update, select, and_, func
+from types import SimpleNamespace
+import random
+import json
+import time
+
+class EmailOutboxWorker:
+    """
+    Drains the email outbox with a bounded pool of sender threads
+    
+    Each batch is claimed by moving its rows to 'sending' with a lease
+    (next_attempt_at = now + EMAIL_OUTBOX_LEASE) and committing, so several
+    worker processes can run side by side; on PostgreSQL the claim uses
+    SKIP LOCKED so they never block on each other. Rows whose lease ran out
+    (the worker died mid-batch) are picked up again. Failed sends are retried
+    with exponential backoff and marked 'failed' after
+    EMAIL_OUTBOX_MAX_ATTEMPTS.
+    
+    Alert rows (category 'alert') are coalesced: when a claimed batch holds
+    an alert, every other alert still buffered for that recipient is claimed
+    with it and they all go out as one digest. The rows folded into a digest
+    are marked 'merged'; each one is a send saved.
+    
+    Only the sender threads talk to SMTP, each sending its share of a batch
+    over one pooled connection (keep SMTP_POOL_SIZE >= workers); all database
+    access stays on the worker's own thread.
+    
+    Usage:
+        worker = EmailOutboxWorker(workers=4, batch_size=50)
+        worker.run()
+    """
+    
+    def __init__(self, workers=4, batch_size=50):
+        self.workers = workers
+        self.batch_size = batch_size
+    
+    def run(self, poll_interval=2.0, once=False):
+        """
+        Process batches until stopped
+        
+        Sleeps for `poll_interval` seconds whenever the outbox is empty.
+        With once=True, returns as soon as there is nothing left to send.
+        
+        Returns:
+            dict: Totals of sent, merged (sends saved by digests) and failed deliveries
+        """
+        totals = {'sent': 0, 'merged': 0, 'failed': 0}
+        app = current_app._get_current_object()
+        
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='email-worker') as pool:
+            while True:
+                result = self.process_batch(pool, app)
+                for key in totals:
+                    totals[key] += result[key]
+                
+                if result['claimed'] == 0:
+                    if once:
+                        return totals
+                    time.sleep(poll_interval)
+    
+    def process_batch(self, pool, app):
+        """
+        Claim one batch, send it through `pool` and record the outcomes
+        
+        Returns:
+            dict: Counts of claimed rows, sent emails, merged alerts and failed emails
+        """
+        rows = self.claim_batch()
+        if not rows:
+            return {'claimed': 0, 'sent': 0, 'merged': 0, 'failed': 0}
+        
+        messages = self.coalesce(rows)
+        
+        # One chunk per sender thread; each chunk goes out back to back over
+        # a single pooled SMTP connection
+        chunks = [messages[index::self.workers] for index in range(min(self.workers, len(messages)))]
+        futures = [(chunk, pool.submit(self._deliver, app, chunk)) for chunk in chunks]
+        
+        sent, failures = [], []
+        for chunk, future in futures:
+            for message, error in zip(chunk, future.result()):
+                if error is None:
+                    sent.append(message)
+                else:
+                    failures.append((message, error))
+        
+        self._record(sent, failures)
+        return {
+            'claimed': len(rows),
+            'sent': len(sent),
+            'merged': sum(len(message.ids) - 1 for message in sent),
+            'failed': len(failures)
+        }
+    
+    def claim_batch(self):
+        """
+        Lease up to batch_size due messages to this worker
+        
+        The claim is a single UPDATE ... RETURNING that commits straight away,
+        so no transaction stays open while the batch is being sent.
+        
+        Returns:
+            list: Outbox rows, ordered by id
+        """
+        outbox = EmailOutbox.__table__
+        now = datetime.utcnow()
+        # Pending and due, or a lease that ran out because the worker that
+        # claimed the row never reported back
+        due = and_(outbox.c.status.in_(['pending', 'sending']), outbox.c.next_attempt_at <= now)
+        
+        candidates = select(outbox.c.id)\
+            .where(due)\
+            .order_by(outbox.c.next_attempt_at, outbox.c.id)\
+            .limit(self.batch_size)\
+            .with_for_update(skip_locked=True)\
+            .scalar_subquery()
+        
+        return self._lease(and_(outbox.c.id.in_(candidates), due), now)
+    
+    def coalesce(self, rows):
+        """
+        Turn claimed rows into outgoing emails, merging alerts per recipient
+        
+        Alerts for a recipient that are still inside their digest window are
+        claimed as well, so the whole window goes out in one message.
+        
+        Returns:
+            list: Emails (ids, to_email, subject, html_content, text_content, attempts)
+        """
+        messages, alerts = [], {}
+        for row in rows:
+            if row.category == 'alert':
+                alerts.setdefault(row.to_email, []).append(row)
+            else:
+                messages.append(self._single(row))
+        
+        if not alerts:
+            return messages
+        
+        outbox = EmailOutbox.__table__
+        buffered = and_(outbox.c.category == 'alert', outbox.c.status == 'pending',
+                        outbox.c.to_email.in_(list(alerts)))
+        for row in self._lease(buffered, datetime.utcnow()):
+            alerts[row.to_email].append(row)
+        
+        for to_email, group in alerts.items():
+            if len(group) == 1:
+                messages.append(self._single(group[0]))
+                continue
+            
+            group.sort(key=lambda row: row.id)
+            subject, html_content, text_content = EmailService.render_alert_digest(
+                [json.loads(row.payload) for row in group]
+            )
+            messages.append(SimpleNamespace(
+                ids=[row.id for row in group],
+                to_email=to_email,
+                subject=subject,
+                html_content=html_content,
+                text_content=text_content,
+                attempts=max(row.attempts for row in group)
+            ))
+        
+        return messages
+    
+    @staticmethod
+    def stats():
+        """
+        Count outbox rows by status
+        
+        'merged' rows are alerts delivered inside a digest, i.e. sends saved.
+        
+        Returns:
+            dict: status -> count
+        """
+        outbox = EmailOutbox.__table__
+        rows = db.session.execute(
+            select(outbox.c.status, func.count()).group_by(outbox.c.status)
+        ).all()
+        return {status: count for status, count in rows}
+    
+    @staticmethod
+    def _lease(condition, now):
+        outbox = EmailOutbox.__table__
+        lease_until = now + timedelta(seconds=current_app.config['EMAIL_OUTBOX_LEASE'])
+        rows = db.session.execute(
+            update(outbox)
+            .where(condition)
+            .values(status='sending', next_attempt_at=lease_until)
+            .returning(outbox.c.id, outbox.c.to_email, outbox.c.subject, outbox.c.html_content,
+                       outbox.c.text_content, outbox.c.attempts, outbox.c.category, outbox.c.payload)
+        ).all()
+        db.session.commit()
+        
+        return sorted(rows, key=lambda row: row.id)
+    
+    @staticmethod
+    def _single(row):
+        return SimpleNamespace(
+            ids=[row.id],
+            to_email=row.to_email,
+            subject=row.subject,
+            html_content=row.html_content,
+            text_content=row.text_content,
+            attempts=row.attempts
+        )
+    
+    @staticmethod
+    def _deliver(app, chunk):
+        with app.app_context():
+            try:
+                errors = EmailService.deliver_many([
+                    (message.to_email, message.subject, message.html_content, message.text_content)
+                    for message in chunk
+                ])
+            except Exception as e:
+                errors = [e] * len(chunk)
+            
+            results = []
+            for message, error in zip(chunk, errors):
+                EmailService.log_email_attempt(message.to_email, message.subject, error is None,
+                                               None if error is None else str(error))
+                results.append(None if error is None else str(error) or error.__class__.__name__)
+            return results
+    
+    @staticmethod
+    def _record(sent, failures):
+        outbox = EmailOutbox.__table__
+        config = current_app.config
+        now = datetime.utcnow()
+        
+        if sent:
+            db.session.execute(
+                update(outbox)
+                .where(outbox.c.id.in_([message.ids[0] for message in sent]))
+                .values(status='sent', attempts=outbox.c.attempts + 1, sent_at=now, last_error=None)
+            )
+            merged = [id for message in sent for id in message.ids[1:]]
+            if merged:
+                db.session.execute(
+                    update(outbox)
+                    .where(outbox.c.id.in_(merged))
+                    .values(status='merged', attempts=outbox.c.attempts + 1, sent_at=now, last_error=None)
+                )
+        
+        for message, error in failures:
+            attempts = message.attempts + 1
+            if attempts >= config['EMAIL_OUTBOX_MAX_ATTEMPTS']:
+                values = {'status': 'failed'}
+            else:
+                # Exponential backoff with jitter so a recovering SMTP server
+                # is not hit by every queued message at once
+                delay = min(config['EMAIL_OUTBOX_RETRY_BASE'] * 2 ** (attempts - 1),
+                            config['EMAIL_OUTBOX_RETRY_MAX'])
+                values = {'status': 'pending',
+                          'next_attempt_at': now + timedelta(seconds=delay * random.uniform(0.8, 1.2))}
+            db.session.execute(
+                update(outbox)
+                .where(outbox.c.id.in_(message.ids))
+                .values(attempts=attempts, last_error=error, **values)
+            )
+        
+        db.session.commit()
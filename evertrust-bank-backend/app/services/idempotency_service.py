@@ -0,0 +1,249 @@
+from app import db
+from app.models import IdempotencyKey
+from app.services.unit_of_work import UnitOfWork
+from flask import request, jsonify, make_response, current_app, g
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from functools import wraps
+import hashlib
+import time
+
+class IdempotencyService:
+    """
+    Stores the response of a request under its client-supplied Idempotency-Key
+    
+    The first request with a key claims it by inserting an in_progress row
+    (unique on user_id, key) and committing straight away, so concurrent
+    duplicates see the claim, wait for it to complete and then replay the
+    stored response instead of executing again. Keys expire after
+    IDEMPOTENCY_KEY_TTL and are removed by purge_expired.
+    
+    Handlers that move money store their response with complete_in() in
+    the same transaction as the postings, so a key is never left claimable
+    after its request took effect. A claim is only ever taken over once it
+    has expired: a request that is slow and one whose process died look the
+    same from outside, and taking over the first would post twice.
+    """
+    
+    @staticmethod
+    def fingerprint():
+        """
+        Hash the parts of the current request that define "the same request"
+        """
+        digest = hashlib.sha256()
+        digest.update(request.method.encode('utf-8'))
+        digest.update(request.path.encode('utf-8'))
+        digest.update(request.get_data(cache=True))
+        return digest.hexdigest()
+    
+    @staticmethod
+    def claim(user_id, key, request_hash):
+        """
+        Claim a key for execution, or return the existing record for it
+        
+        Returns:
+            tuple: (IdempotencyKey, claimed) where claimed is True if the
+                caller must execute the request and complete/release the key
+        """
+        now = datetime.utcnow()
+        record = IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            request_hash=request_hash,
+            status='in_progress',
+            created_at=now,
+            expires_at=now + current_app.config['IDEMPOTENCY_KEY_TTL']
+        )
+        db.session.add(record)
+        try:
+            db.session.commit()
+            return record, True
+        except IntegrityError:
+            db.session.rollback()
+        
+        existing = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+        if existing is None:
+            # Released or purged between our insert and the lookup
+            return IdempotencyService.claim(user_id, key, request_hash)
+        
+        if existing.expires_at <= now:
+            # Take the key over; matching on created_at makes the takeover
+            # succeed for exactly one of several racing requests
+            taken = IdempotencyKey.query.filter_by(id=existing.id, created_at=existing.created_at).update({
+                'request_hash': request_hash,
+                'status': 'in_progress',
+                'response_status': None,
+                'response_body': None,
+                'response_mimetype': None,
+                'created_at': now,
+                'expires_at': now + current_app.config['IDEMPOTENCY_KEY_TTL']
+            })
+            db.session.commit()
+            if taken:
+                return db.session.get(IdempotencyKey, existing.id), True
+            existing = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+        
+        return existing, False
+    
+    @staticmethod
+    def wait_for(record, timeout):
+        """
+        Poll an in_progress key until the original request completes
+        
+        Returns:
+            IdempotencyKey or None: The completed record, or None if the
+                original released the key (it failed) or the wait timed out
+        """
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        record_id = record.id
+        while record is not None and record.status == 'in_progress':
+            if time.monotonic() >= deadline:
+                return record
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            # End the read transaction so the next lookup sees fresh commits
+            db.session.rollback()
+            record = db.session.get(IdempotencyKey, record_id, populate_existing=True)
+        return record
+    
+    @staticmethod
+    def complete_in(uow, response):
+        """
+        Store the response of the current request's key within `uow`
+        
+        Called by the handler just before it commits, so the key is marked
+        completed in the same transaction as the writes the response
+        describes. Does nothing when the request has no claimed key.
+        
+        Returns:
+            Response: `response`
+        """
+        record = g.get('idempotency_record')
+        if record is not None:
+            IdempotencyKey.query.filter_by(id=record.id).update(
+                IdempotencyService._stored(response), synchronize_session=False
+            )
+            uow.on_commit(setattr, g, 'idempotency_completed', True)
+        return response
+    
+    @staticmethod
+    def complete(record, response):
+        """
+        Store the response for replay, in a transaction of its own
+        
+        For responses of requests that made no writes; see complete_in.
+        """
+        db.session.rollback()
+        IdempotencyKey.query.filter_by(id=record.id).update(IdempotencyService._stored(response))
+        db.session.commit()
+    
+    @staticmethod
+    def _stored(response):
+        return {
+            'status': 'completed',
+            'response_status': response.status_code,
+            'response_body': response.get_data(as_text=True),
+            'response_mimetype': response.mimetype
+        }
+    
+    @staticmethod
+    def release(record):
+        """
+        Drop a claim whose request failed, so a retry executes again
+        """
+        db.session.rollback()
+        IdempotencyKey.query.filter_by(id=record.id).delete()
+        db.session.commit()
+    
+    @staticmethod
+    def replay(record):
+        response = current_app.response_class(
+            record.response_body,
+            status=record.response_status,
+            mimetype=record.response_mimetype
+        )
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+    
+    @staticmethod
+    def purge_expired(batch_size=10000):
+        """
+        Delete expired keys in batches
+        
+        Returns:
+            int: Number of keys deleted
+        """
+        deleted = 0
+        while True:
+            ids = [row.id for row in IdempotencyKey.query.with_entities(IdempotencyKey.id)
+                   .filter(IdempotencyKey.expires_at <= datetime.utcnow())
+                   .limit(batch_size)]
+            if not ids:
+                return deleted
+            deleted += IdempotencyKey.query.filter(IdempotencyKey.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+def idempotent(view):
+    """
+    Make a POST handler safe to retry with an Idempotency-Key header
+    
+    Requests without the header run as before. Must be applied below
+    @jwt_required() so the caller's identity is available.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({'message': 'Idempotency-Key must be at most 255 characters'}), 400
+        
+        user_id = get_jwt_identity()
+        request_hash = IdempotencyService.fingerprint()
+        record, claimed = IdempotencyService.claim(user_id, key, request_hash)
+        
+        if not claimed:
+            if record.request_hash != request_hash:
+                return jsonify({'message': 'Idempotency-Key was already used for a different request'}), 422
+            record = IdempotencyService.wait_for(record, current_app.config['IDEMPOTENCY_WAIT_TIMEOUT'])
+            if record is None:
+                # The original failed and gave the key back; run this one instead
+                return wrapper(*args, **kwargs)
+            if record.status != 'completed':
+                return jsonify({'message': 'A request with this Idempotency-Key is still in progress'}), 409
+            return IdempotencyService.replay(record)
+        
+        g.idempotency_record = record
+        g.idempotency_completed = False
+        committed_before = UnitOfWork.committed_count()
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            if g.idempotency_completed:
+                pass  # Stored with the postings; the failure came after
+            elif UnitOfWork.committed_count() == committed_before:
+                IdempotencyService.release(record)
+            else:
+                IdempotencyService.complete(record, make_response(
+                    jsonify({'message': 'Request failed after it was applied'}), 500
+                ))
+            raise
+        finally:
+            g.idempotency_record = None
+        
+        if g.idempotency_completed:
+            return response
+        
+        # The handler answered without storing its response alongside any
+        # writes. A server error left nothing behind, so the key is given
+        # back for the retry; other answers (not found, insufficient funds)
+        # are stored so the retry gets the same one
+        if response.status_code >= 500 and UnitOfWork.committed_count() == committed_before:
+            IdempotencyService.release(record)
+        else:
+            IdempotencyService.complete(record, response)
+        return response
+    
+    return wrapper
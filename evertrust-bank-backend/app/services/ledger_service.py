@@ -0,0 +1,490 @@
+from app import db
+from app.models import Account, AccountBalanceShard, AccountDailyBalance, Transaction
+from app.services.process_pool import app_process_pool, worker_app
+from sqlalchemy import update, select, insert, func, case, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.pool import StaticPool
+from datetime import datetime
+from decimal import Decimal
+import random
+
+class InsufficientFundsError(Exception):
+    """Raised when a debit would take an account below zero"""
+
+def _backfill_accounts(account_ids, recompute):
+    with worker_app().app_context():
+        try:
+            return LedgerService._backfill_chunk(account_ids, recompute)
+        finally:
+            db.session.remove()
+
+class LedgerService:
+    """
+    Balance updates that are safe under concurrent workers
+    
+    Every change is a single conditional UPDATE evaluated by the database, so
+    two workers posting to the same account can never overwrite each other's
+    result the way a Python read-modify-write of account.balance can. The
+    UPDATE holds the row lock until the surrounding transaction ends; callers
+    touching several accounts go through apply(), which always locks them in
+    ascending id order so concurrent transfers cannot deadlock.
+    
+    The new balance is written back onto the Account instance without marking
+    it dirty, so route code can keep reading account.balance for alerts and
+    receipts.
+    
+    Accounts with balance_shards > 0 keep their balance in N
+    AccountBalanceShard rows instead: credits land on a random shard and
+    debits try a random shard first, falling back to draining shards in
+    order when no single shard can cover the amount.
+    
+    Every Transaction row stores the balance its posting produced
+    (balance_after), taken from the RETURNING of that UPDATE, so the balance
+    at any past moment is one indexed lookup (balance_at) rather than a walk
+    back from the current balance. Sharded accounts are the exception: a
+    posting only locks the shard it lands on, so the sum over shards it
+    could read may miss another posting's uncommitted update, and locking
+    every shard would serialize postings again. Their postings leave
+    balance_after NULL (credit, debit and apply return None for them);
+    readers fall back to the signed amounts until `flask
+    backfill-balance-after`, which does lock every shard, fills them in.
+    
+    Each change is also added to the account's AccountDailyBalance row for
+    today, which is what balance-history charts are drawn from.
+    """
+    
+    @staticmethod
+    def credit(account, amount):
+        """
+        Add `amount` to the account balance
+        
+        Returns:
+            Decimal: The balance after the credit, or None for a sharded account
+        """
+        return LedgerService._update(account, Decimal(str(amount)))
+    
+    @staticmethod
+    def debit(account, amount):
+        """
+        Subtract `amount` from the account balance if funds allow
+        
+        Returns:
+            Decimal: The balance after the debit, or None for a sharded account
+        
+        Raises:
+            InsufficientFundsError: If the balance is lower than `amount`
+        """
+        return LedgerService._update(account, -Decimal(str(amount)))
+    
+    @staticmethod
+    def transfer(from_account, to_account, amount):
+        """
+        Move `amount` between two accounts
+        
+        Returns:
+            tuple: (from_balance, to_balance) after the transfer; None for a sharded account
+        
+        Raises:
+            InsufficientFundsError: If from_account cannot cover `amount`
+        """
+        amount = Decimal(str(amount))
+        balances = LedgerService.apply([(from_account, -amount), (to_account, amount)])
+        return balances[from_account.id], balances[to_account.id]
+    
+    @staticmethod
+    def apply(deltas):
+        """
+        Apply several balance deltas in lock order
+        
+        Args:
+            deltas: Iterable of (Account, Decimal) pairs; negative deltas are
+                debits and fail if they would overdraw the account
+        
+        Returns:
+            dict: Account id -> balance after the update (None for sharded accounts)
+        
+        Raises:
+            InsufficientFundsError: On the first debit that cannot be covered.
+                Earlier updates are left for the caller's rollback to undo.
+        """
+        balances = {}
+        for account, delta in sorted(deltas, key=lambda item: item[0].id):
+            balances[account.id] = LedgerService._update(account, Decimal(str(delta)))
+        return balances
+    
+    @staticmethod
+    def apply_batch(accounts, deltas, counts):
+        """
+        Apply net balance deltas for many accounts in one statement
+        
+        Used for bulk postings: callers net their postings per account, lock
+        the accounts (SELECT ... FOR UPDATE in id order) and hand over the
+        result. Unsharded accounts are updated by a single UPDATE with CASE
+        expressions, which also bumps transaction_count since bulk inserts
+        bypass the per-row counter hook. Sharded accounts are posted one by one.
+        
+        Args:
+            accounts: dict of account id -> Account
+            deltas: dict of account id -> net Decimal delta
+            counts: dict of account id -> number of transactions posted
+        
+        Returns:
+            dict: Account id -> balance after the update (None for sharded accounts)
+        
+        Raises:
+            InsufficientFundsError: If any account would go below zero
+        """
+        table = Account.__table__
+        balances = {}
+        
+        plain = sorted(account_id for account_id in deltas if not accounts[account_id].balance_shards)
+        if plain:
+            delta_case = case({account_id: deltas[account_id] for account_id in plain}, value=table.c.id)
+            count_case = case({account_id: counts[account_id] for account_id in plain}, value=table.c.id)
+            rows = db.session.execute(
+                update(table)
+                .where(table.c.id.in_(plain), table.c.balance + delta_case >= 0)
+                .values(balance=table.c.balance + delta_case,
+                        transaction_count=table.c.transaction_count + count_case)
+                .returning(table.c.id, table.c.balance)
+            ).all()
+            if len(rows) != len(plain):
+                raise InsufficientFundsError('Insufficient funds for batch')
+            
+            for account_id, balance in rows:
+                balances[account_id] = Decimal(str(balance))
+                set_committed_value(accounts[account_id], 'balance', balances[account_id])
+            LedgerService._record_daily((account_id, 0, deltas[account_id]) for account_id in plain)
+        
+        for account_id in sorted(set(deltas) - set(plain)):
+            balances[account_id] = LedgerService._update_sharded(
+                accounts[account_id], Decimal(str(deltas[account_id])), counts[account_id]
+            )
+        
+        return balances
+    
+    @staticmethod
+    def balance_at(account, moment):
+        """
+        Balance of `account` just before `moment`
+        
+        One query on the (account_id, created_at, id) index: the
+        balance_after of the last transaction before `moment`. Before the
+        account's first transaction this is its opening balance, taken back
+        out of the first transaction.
+        
+        Rows from before balance_after existed, and postings to sharded
+        accounts, are NULL until `flask backfill-balance-after` has run; for
+        those the balance is worked back from the current one.
+        
+        Returns:
+            Decimal: The balance
+        """
+        transactions = Transaction.__table__
+        previous = db.session.execute(
+            select(transactions.c.balance_after)
+            .where(transactions.c.account_id == account.id, transactions.c.created_at < moment)
+            .order_by(transactions.c.created_at.desc(), transactions.c.id.desc())
+            .limit(1)
+        ).first()
+        if previous is not None and previous.balance_after is not None:
+            return Decimal(str(previous.balance_after))
+        
+        if previous is None:
+            first = db.session.execute(
+                LedgerService._history(account)
+                .order_by(transactions.c.created_at, transactions.c.id)
+                .limit(1)
+            ).first()
+            if first is None:
+                return account.total_balance
+            if first.balance_after is not None:
+                return Decimal(str(first.balance_after)) - LedgerService._delta(first)
+        
+        # Not backfilled yet
+        since = sum((LedgerService._delta(row) for row in db.session.execute(
+            LedgerService._history(account).where(transactions.c.created_at >= moment)
+            .execution_options(yield_per=5000)
+        )), Decimal('0'))
+        return account.total_balance - since
+    
+    @staticmethod
+    def backfill_balance_after(account_id, recompute=False):
+        """
+        Fill in balance_after for an account's transactions
+        
+        Walks the history newest first from the current balance, taking
+        each transaction's effect back out. The account (and its shards) is
+        locked for the walk so no posting can move the balance underneath
+        it. Rows that already have a balance_after keep it and the walk
+        continues from that value, unless `recompute` is set.
+        
+        Args:
+            account_id: ID of the account
+            recompute: Recompute rows that already have a balance_after
+        
+        Returns:
+            int: Number of rows updated; the caller commits
+        """
+        account = db.session.get(Account, account_id, with_for_update=True, populate_existing=True)
+        if account.balance_shards:
+            shards = AccountBalanceShard.__table__
+            balance = sum((Decimal(str(shard_balance)) for shard_balance in db.session.execute(
+                select(shards.c.balance)
+                .where(shards.c.account_id == account_id)
+                .order_by(shards.c.shard)
+                .with_for_update()
+            ).scalars()), Decimal('0'))
+        else:
+            balance = Decimal(str(account.balance))
+        
+        transactions = Transaction.__table__
+        fill = update(transactions)\
+            .where(transactions.c.id == bindparam('transaction_id'))\
+            .values(balance_after=bindparam('balance'))
+        
+        updated = 0
+        pending = []
+        history = db.session.execute(
+            LedgerService._history(account)
+            .order_by(transactions.c.created_at.desc(), transactions.c.id.desc())
+            .execution_options(yield_per=5000)
+        )
+        for row in history:
+            if row.balance_after is not None and not recompute:
+                balance = Decimal(str(row.balance_after))
+            elif row.balance_after is None or Decimal(str(row.balance_after)) != balance:
+                pending.append({'transaction_id': row.id, 'balance': balance})
+            balance -= LedgerService._delta(row)
+            
+            if len(pending) >= 5000:
+                db.session.execute(fill, pending)
+                updated += len(pending)
+                pending = []
+        
+        if pending:
+            db.session.execute(fill, pending)
+            updated += len(pending)
+        return updated
+    
+    @staticmethod
+    def backfill_all(workers=4, recompute=False, chunk_size=100):
+        """
+        Run backfill_balance_after over every account that needs it
+        
+        Accounts are split into chunks of `chunk_size` spread over a pool of
+        `workers` processes; each account is committed on its own, so locks
+        are held for one account's history at a time and an interrupted run
+        can simply be started again.
+        
+        Args:
+            workers: Processes; 0 runs in this process
+            recompute: Also recompute rows that already have a balance_after
+            chunk_size: Accounts per task
+        
+        Returns:
+            tuple: (accounts processed, rows updated)
+        """
+        transactions = Transaction.__table__
+        query = select(transactions.c.account_id).distinct()
+        if not recompute:
+            query = query.where(transactions.c.balance_after.is_(None))
+        account_ids = sorted(db.session.execute(query).scalars())
+        db.session.commit()
+        
+        chunks = [account_ids[start:start + chunk_size] for start in range(0, len(account_ids), chunk_size)]
+        if workers <= 0 or isinstance(db.engine.pool, StaticPool):
+            return len(account_ids), sum(LedgerService._backfill_chunk(chunk, recompute) for chunk in chunks)
+        
+        with app_process_pool(workers) as pool:
+            futures = [pool.submit(_backfill_accounts, chunk, recompute) for chunk in chunks]
+            return len(account_ids), sum(future.result() for future in futures)
+    
+    @staticmethod
+    def _backfill_chunk(account_ids, recompute):
+        updated = 0
+        for account_id in account_ids:
+            try:
+                updated += LedgerService.backfill_balance_after(account_id, recompute)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        return updated
+    
+    @staticmethod
+    def _history(account):
+        # Rows with what it takes to know each one's effect on the balance
+        transactions = Transaction.__table__
+        return select(transactions.c.id, transactions.c.direction, transactions.c.amount,
+                      transactions.c.balance_after)\
+            .where(transactions.c.account_id == account.id)
+    
+    @staticmethod
+    def signed_amount():
+        """
+        SQL expression for a transaction's effect on its account's balance
+        
+        Negative for debits, from the direction recorded when it was posted.
+        """
+        transactions = Transaction.__table__
+        return case(
+            (transactions.c.direction == 'debit', -transactions.c.amount),
+            else_=transactions.c.amount
+        )
+    
+    @staticmethod
+    def _delta(row):
+        amount = Decimal(str(row.amount))
+        return -amount if row.direction == 'debit' else amount
+    
+    @staticmethod
+    def enable_sharding(account, shard_count):
+        """
+        Move an account's balance onto `shard_count` sub-balance shards
+        
+        The current balance and transaction count are carried over to shard 0;
+        the accounts row keeps zeros from then on. The caller commits.
+        """
+        if shard_count < 1:
+            raise ValueError('shard_count must be at least 1')
+        if account.balance_shards:
+            raise ValueError(f'Account {account.id} is already sharded')
+        
+        accounts = Account.__table__
+        current = db.session.execute(
+            select(accounts.c.balance, accounts.c.transaction_count)
+            .where(accounts.c.id == account.id)
+            .with_for_update()
+        ).one()
+        
+        db.session.execute(insert(AccountBalanceShard.__table__), [
+            {
+                'account_id': account.id,
+                'shard': shard,
+                'balance': current.balance if shard == 0 else 0,
+                'transaction_count': current.transaction_count if shard == 0 else 0
+            }
+            for shard in range(shard_count)
+        ])
+        db.session.execute(
+            update(accounts)
+            .where(accounts.c.id == account.id)
+            .values(balance=0, transaction_count=0, balance_shards=shard_count)
+        )
+        db.session.refresh(account)
+    
+    @staticmethod
+    def _update(account, delta):
+        if account.balance_shards:
+            return LedgerService._update_sharded(account, delta)
+        
+        stmt = update(Account.__table__)\
+            .where(Account.__table__.c.id == account.id)\
+            .values(balance=Account.__table__.c.balance + delta)\
+            .returning(Account.__table__.c.balance)
+        
+        if delta < 0:
+            stmt = stmt.where(Account.__table__.c.balance >= -delta)
+        
+        new_balance = db.session.execute(stmt).scalar()
+        if new_balance is None:
+            raise InsufficientFundsError(f'Insufficient funds in account {account.id}')
+        
+        new_balance = Decimal(str(new_balance))
+        set_committed_value(account, 'balance', new_balance)
+        LedgerService._record_daily([(account.id, 0, delta)])
+        return new_balance
+    
+    @staticmethod
+    def _update_sharded(account, delta, count=1):
+        shards = AccountBalanceShard.__table__
+        shard = random.randrange(account.balance_shards)
+        
+        # Each posting is one transaction row, so it is counted on the shard it lands on
+        stmt = update(shards)\
+            .where(shards.c.account_id == account.id, shards.c.shard == shard)\
+            .values(balance=shards.c.balance + delta,
+                    transaction_count=shards.c.transaction_count + count)
+        
+        if delta < 0:
+            stmt = stmt.where(shards.c.balance >= -delta)
+        
+        if db.session.execute(stmt).rowcount == 0:
+            if delta >= 0:
+                raise ValueError(f'Account {account.id} is missing balance shards')
+            LedgerService._drain_shards(account, -delta, count)
+        
+        # Unlocked, so it can miss concurrent postings to other shards: good
+        # enough for a low-balance alert, not for the row's balance_after
+        current_balance = Decimal(str(db.session.execute(
+            select(func.coalesce(func.sum(shards.c.balance), 0))
+            .where(shards.c.account_id == account.id)
+        ).scalar()))
+        
+        db.session.expire(account, ['shards'])
+        set_committed_value(account, 'balance', current_balance)
+        # Recorded against the shard picked above even when the debit drained
+        # several: only the sum over shards is ever read
+        LedgerService._record_daily([(account.id, shard, delta)])
+        return None
+    
+    @staticmethod
+    def _record_daily(changes):
+        """
+        Add balance changes to today's AccountDailyBalance rows
+        
+        One upsert for all of them; concurrent postings add to the same row
+        rather than overwrite it, so the order they commit in does not matter.
+        
+        Args:
+            changes: Iterable of (account id, shard, delta)
+        """
+        today = datetime.utcnow().date()
+        rows = [
+            {'account_id': account_id, 'day': today, 'shard': shard, 'net_change': delta}
+            for account_id, shard, delta in changes if delta
+        ]
+        if not rows:
+            return
+        
+        table = AccountDailyBalance.__table__
+        dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+        stmt = dialect.insert(table).values(rows)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.account_id, table.c.day, table.c.shard],
+            set_={'net_change': table.c.net_change + stmt.excluded.net_change}
+        ))
+    
+    @staticmethod
+    def _drain_shards(account, amount, count=1):
+        """
+        Debit `amount` spread across shards when no single shard covers it
+        
+        Locks every shard of the account in shard order, so concurrent
+        fallbacks queue up instead of deadlocking.
+        """
+        shards = AccountBalanceShard.__table__
+        rows = db.session.execute(
+            select(shards.c.shard, shards.c.balance)
+            .where(shards.c.account_id == account.id)
+            .order_by(shards.c.shard)
+            .with_for_update()
+        ).all()
+        
+        if sum((Decimal(str(row.balance)) for row in rows), Decimal('0')) < amount:
+            raise InsufficientFundsError(f'Insufficient funds in account {account.id}')
+        
+        remaining = amount
+        for index, row in enumerate(r for r in rows if r.balance > 0):
+            take = min(Decimal(str(row.balance)), remaining)
+            db.session.execute(
+                update(shards)
+                .where(shards.c.account_id == account.id, shards.c.shard == row.shard)
+                .values(balance=shards.c.balance - take,
+                        transaction_count=shards.c.transaction_count + (count if index == 0 else 0))
+            )
+            remaining -= take
+            if remaining <= 0:
+                break
@@ -1,100 +1,208 @@
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from array import array
 from datetime import datetime
-import io
+import zlib
 
-def generate_statement_pdf(account, transactions, start_date, end_date):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'Title',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=30,
-        alignment=1  # Center
-    )
-    
-    # Title
-    elements.append(Paragraph("EverTrust Bank - Account Statement", title_style))
-    
-    # Account information
+PAGE_WIDTH, PAGE_HEIGHT = letter
+MARGIN = inch
+ROW_HEIGHT = 12
+COLUMN_WIDTHS = [0.8*inch, 2*inch, 1*inch, 1*inch, 1*inch]
+TABLE_LEFT = (PAGE_WIDTH - sum(COLUMN_WIDTHS)) / 2
+
+# Standard Type 1 fonts, referenced by every page; none are embedded
+FONTS = {'F1': 'Helvetica', 'F2': 'Helvetica-Bold', 'F3': 'Helvetica-Oblique'}
+
+class StatementPDFWriter:
+    """
+    Minimal PDF writer that writes each page to `output` as soon as it is finished
+    
+    ReportLab's canvas and platypus keep every page in memory until the
+    document is saved. This writer keeps only the page being drawn and the
+    byte offset of each object (for the cross-reference table), so memory
+    does not grow with the number of pages. It draws text in the standard
+    fonts and filled rectangles, which is all a statement needs.
+    """
+    
+    def __init__(self, output):
+        self.output = output
+        self.position = 0
+        # Byte offset of each object; 1 (catalog) and 2 (page tree) are written last
+        self.offsets = array('Q', [0, 0])
+        self.page_ids = array('Q')
+        self.operations = []
+        
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self.font_ids = {}
+        for name, base_font in FONTS.items():
+            self.font_ids[name] = self._object(
+                f'<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} /Encoding /WinAnsiEncoding >>'.encode()
+            )
+    
+    @property
+    def pages(self):
+        return len(self.page_ids)
+    
+    def text(self, x, y, value, font='F1', size=8, align='left', color=(0, 0, 0)):
+        value = ' '.join(str(value).split())  # No line breaks in a table cell
+        if align != 'left':
+            width = stringWidth(value, FONTS[font], size)
+            x -= width if align == 'right' else width / 2
+        escaped = value.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        self.operations.append(f'BT {color[0]:g} {color[1]:g} {color[2]:g} rg /{font} {size:g} Tf '
+                               f'{x:.2f} {y:.2f} Td ({escaped}) Tj ET')
+    
+    def rect(self, x, y, width, height, color):
+        self.operations.append(f'{color[0]:g} {color[1]:g} {color[2]:g} rg {x:.2f} {y:.2f} {width:.2f} {height:.2f} re f')
+    
+    def end_page(self):
+        content = zlib.compress('\n'.join(self.operations).encode('cp1252', errors='replace'))
+        self.operations = []
+        
+        contents_id = self._object(
+            f'<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n'.encode() + content + b'\nendstream'
+        )
+        fonts = ' '.join(f'/{name} {object_id} 0 R' for name, object_id in self.font_ids.items())
+        self.page_ids.append(self._object(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH:g} {PAGE_HEIGHT:g}] '
+            f'/Resources << /Font << {fonts} >> >> /Contents {contents_id} 0 R >>'.encode()
+        ))
+    
+    def close(self):
+        """
+        Finish the last page and write the page tree, catalog and cross-reference table
+        """
+        if self.operations or not self.page_ids:
+            self.end_page()
+        
+        self.offsets[1] = self.position
+        self._write(b'2 0 obj\n<< /Type /Pages /Kids [')
+        for start in range(0, len(self.page_ids), 1000):
+            self._write(''.join(f'{page_id} 0 R ' for page_id in self.page_ids[start:start + 1000]).encode())
+        self._write(f'] /Count {len(self.page_ids)} >>\nendobj\n'.encode())
+        
+        self.offsets[0] = self.position
+        self._write(b'1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n')
+        
+        xref = self.position
+        self._write(f'xref\n0 {len(self.offsets) + 1}\n0000000000 65535 f \n'.encode())
+        for start in range(0, len(self.offsets), 1000):
+            self._write(''.join(f'{offset:010d} 00000 n \n' for offset in self.offsets[start:start + 1000]).encode())
+        self._write(f'trailer\n<< /Size {len(self.offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+    
+    def _object(self, body):
+        self.offsets.append(self.position)
+        object_id = len(self.offsets)
+        self._write(f'{object_id} 0 obj\n'.encode() + body + b'\nendobj\n')
+        return object_id
+    
+    def _write(self, data):
+        self.output.write(data)
+        self.position += len(data)
+
+def stream_statement_pdf(account, transactions, start_date, end_date, opening_balance, output):
+    """
+    Draw a statement into `output` one page at a time
+    
+    Nothing is kept for the whole document: rows are drawn as `transactions` yields them and each page is written
+    out when full, so memory stays flat however long the period is.
+    
+    Args:
+        account: The Account (number, type and current balance are shown)
+        transactions: Iterable of rows with created_at, description, type,
+            direction, amount and balance_after, oldest first; consumed
+            once, e.g. a server-side cursor
+        start_date: First day of the period
+        end_date: Last day of the period (inclusive)
+        opening_balance: Balance at the start of start_date
+        output: Binary file object the PDF is written to
+    
+    Returns:
+        int: Number of pages written
+    """
+    writer = StatementPDFWriter(output)
+    dark_blue = (0, 0, 0.545)
+    light_grey = (0.827, 0.827, 0.827)
+    bottom = MARGIN + ROW_HEIGHT  # Room for the page number
+    
+    def draw_row(y, cells, background=None, font='F1', color=(0, 0, 0)):
+        if background:
+            writer.rect(TABLE_LEFT, y - ROW_HEIGHT, sum(COLUMN_WIDTHS), ROW_HEIGHT, background)
+        x = TABLE_LEFT
+        for index, (cell, width) in enumerate(zip(cells, COLUMN_WIDTHS)):
+            if index >= 3:  # Amount and balance are right-aligned
+                writer.text(x + width - 6, y - 9, cell, font=font, align='right', color=color)
+            else:
+                writer.text(x + 6, y - 9, cell, font=font, color=color)
+            x += width
+        return y - ROW_HEIGHT
+    
+    def new_page():
+        writer.text(PAGE_WIDTH / 2, MARGIN / 2, f'Page {writer.pages + 1}', size=8, align='center')
+        writer.end_page()
+        return draw_row(PAGE_HEIGHT - MARGIN, ["Date", "Description", "Type", "Amount", "Balance"],
+                        background=dark_blue, color=(0.961, 0.961, 0.961))
+    
+    # Title and account information
+    y = PAGE_HEIGHT - MARGIN
+    writer.text(PAGE_WIDTH / 2, y - 16, "EverTrust Bank - Account Statement", font='F2', size=16, align='center')
+    y -= 16 + 30
+    
     account_info = [
         ["Account Number:", account.number],
         ["Account Type:", account.type],
         ["Statement Period:", f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}"],
-        ["Current Balance:", f"${account.balance:.2f}"],
+        ["Current Balance:", f"${account.total_balance:.2f}"],
         ["Statement Date:", datetime.now().strftime('%Y-%m-%d')]
     ]
+    info_left = (PAGE_WIDTH - 5*inch) / 2
+    for label, value in account_info:
+        writer.rect(info_left, y - 18, 2*inch, 18, light_grey)
+        writer.text(info_left + 6, y - 13, label, size=10)
+        writer.text(info_left + 2*inch + 6, y - 13, value, size=10)
+        y -= 18
+    y -= 0.3*inch
     
-    account_table = Table(account_info, colWidths=[2*inch, 3*inch])
-    account_table.setStyle(TableStyle([
-        ('FONT', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-    ]))
-    
-    elements.append(account_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Transactions header
-    elements.append(Paragraph("Transactions", styles['Heading2']))
+    writer.text(TABLE_LEFT, y - 14, "Transactions", font='F2', size=14)
+    y -= 14 + 12
     
-    # Transactions table
-    transaction_data = [["Date", "Description", "Type", "Amount", "Balance"]]
+    y = draw_row(y, ["Date", "Description", "Type", "Amount", "Balance"],
+                 background=dark_blue, color=(0.961, 0.961, 0.961))
+    y = draw_row(y, ["", "Opening Balance", "", "", f"${opening_balance:.2f}"], background=light_grey, font='F2')
     
-    running_balance = account.balance
-    for tx in reversed(transactions):  # Show in chronological order
-        if tx.type == 'Withdrawal' or tx.type == 'Transfer':
-            amount = f"-${tx.amount:.2f}"
-            running_balance += tx.amount  # Add back to get previous balance
+    running_balance = opening_balance
+    for tx in transactions:
+        if y - ROW_HEIGHT < bottom:
+            y = new_page()
+        
+        description = tx.description or ''
+        debit = tx.direction == 'debit'
+        if tx.balance_after is not None:
+            running_balance = tx.balance_after  # Recorded when the transaction was posted
         else:
-            amount = f"${tx.amount:.2f}"
-            running_balance -= tx.amount  # Subtract to get previous balance
+            running_balance += -tx.amount if debit else tx.amount
+        amount = f"-${tx.amount:.2f}" if debit else f"${tx.amount:.2f}"
         
-        transaction_data.append([
+        y = draw_row(y, [
             tx.created_at.strftime('%Y-%m-%d'),
-            tx.description[:30] + '...' if len(tx.description) > 30 else tx.description,
+            description[:30] + '...' if len(description) > 30 else description,
             tx.type,
             amount,
             f"${running_balance:.2f}"
         ])
     
-    # Add final balance (current balance)
-    transaction_data.append([
-        "",
-        "Current Balance",
-        "",
-        "",
-        f"${account.balance:.2f}"
-    ])
-    
-    transaction_table = Table(transaction_data, colWidths=[0.8*inch, 2*inch, 1*inch, 1*inch, 1*inch])
-    transaction_table.setStyle(TableStyle([
-        ('FONT', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-        ('FONT', (0, -1), (-1, -1), 'Helvetica-Bold'),
-    ]))
-    
-    elements.append(transaction_table)
-    
-    # Footer
-    elements.append(Spacer(1, 0.5*inch))
-    elements.append(Paragraph("Thank you for banking with EverTrust Bank", styles['Italic']))
-    elements.append(Paragraph("Customer Service: 1-800-EVERTRUST", styles['Normal']))
-    
-    # Build PDF
-    doc.build(elements)
-    return buffer
\ No newline at end of file
+    # Closing balance and footer
+    if y - ROW_HEIGHT < bottom:
+        y = new_page()
+    y = draw_row(y, ["", "Closing Balance", "", "", f"${running_balance:.2f}"], background=light_grey, font='F2')
+    
+    if y - 0.5*inch - 24 < bottom:
+        y = new_page()
+    y -= 0.5*inch
+    writer.text(TABLE_LEFT, y - 10, "Thank you for banking with EverTrust Bank", font='F3', size=10)
+    writer.text(TABLE_LEFT, y - 24, "Customer Service: 1-800-EVERTRUST", size=10)
+    
+    writer.text(PAGE_WIDTH / 2, MARGIN / 2, f'Page {writer.pages + 1}', size=8, align='center')
+    writer.close()
+    return writer.pages
@@ -0,0 +1,43 @@
+from app import db
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+
+# The application of a pool process, created once by _init_worker
+_worker_app = None
+
+def _init_worker(database_uri, config):
+    global _worker_app
+    os.environ['DATABASE_URL'] = database_uri
+    
+    from app import create_app
+    _worker_app = create_app()
+    _worker_app.config.update(config)
+
+def worker_app():
+    """
+    The app of the current pool process; tasks run inside its app_context()
+    """
+    return _worker_app
+
+def app_process_pool(workers, config=None):
+    """
+    Start a process pool whose processes each build their own app
+    
+    Processes are spawned rather than forked: a forked child would inherit
+    the parent's open database connections. Each one connects to the
+    current app's database and applies `config` on top of its own.
+    
+    Args:
+        workers: Number of processes
+        config: App config values to carry over (optional)
+    
+    Returns:
+        ProcessPoolExecutor: The pool; the caller shuts it down
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(db.engine.url.render_as_string(hide_password=False), config or {})
+    )
@@ -0,0 +1,201 @@
+import smtplib
+import threading
+import time
+from queue import LifoQueue, Empty
+
+# The server refused this message; the session itself is still usable.
+# (smtplib already sends RSET before raising these.)
+REFUSED = (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)
+
+class PooledConnection:
+    """
+    An authenticated SMTP session plus the bookkeeping the pool needs
+    """
+    
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+    
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            self.smtp.close()
+
+class SMTPConnectionPool:
+    """
+    Bounded pool of persistent, authenticated SMTP connections
+    
+    Opening an SMTP session costs a TCP (and usually TLS) handshake, EHLO and
+    AUTH before the first message; reusing sessions takes all of that out of
+    the per-message cost. At most `size` connections exist at once and
+    callers beyond that wait for one to be returned. A connection is retired
+    after `max_messages` messages (many providers cap messages per session)
+    and checked with NOOP when it has been idle longer than `idle_timeout`.
+    
+    Usage:
+        pool = SMTPConnectionPool('smtp.example.com', 587, size=4)
+        errors = pool.send_many(sender, [(recipients, message_string), ...])
+    """
+    
+    def __init__(self, host, port, size=4, username=None, password=None, use_tls=True,
+                 timeout=10, max_messages=100, idle_timeout=60):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        
+        self._idle = LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+    
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a pool from the SMTP_* settings of a Flask config
+        """
+        return cls(
+            config['SMTP_SERVER'],
+            config['SMTP_PORT'],
+            size=config['SMTP_POOL_SIZE'],
+            username=config.get('SMTP_USERNAME'),
+            password=config.get('SMTP_PASSWORD'),
+            use_tls=config['SMTP_USE_TLS'],
+            timeout=config['SMTP_TIMEOUT'],
+            max_messages=config['SMTP_MAX_MESSAGES_PER_CONNECTION'],
+            idle_timeout=config['SMTP_POOL_IDLE_TIMEOUT']
+        )
+    
+    def send(self, sender, recipients, message):
+        """
+        Send one message over a pooled connection
+        
+        Raises:
+            smtplib.SMTPException, OSError: If the message could not be sent
+        """
+        error = self.send_many(sender, [(recipients, message)])[0]
+        if error is not None:
+            raise error
+    
+    def send_many(self, sender, messages):
+        """
+        Send several messages back to back over one borrowed connection
+        
+        A message the server refuses does not stop the batch. A dropped
+        connection is replaced and the message retried once; if the server
+        cannot be reached at all, the rest of the batch fails with that error.
+        
+        Args:
+            sender: Envelope sender address
+            messages: List of (recipients, message_string) pairs
+        
+        Returns:
+            list: None for each delivered message, otherwise its exception
+        """
+        if self._closed:
+            raise RuntimeError('SMTP connection pool is closed')
+        
+        results = []
+        unreachable = None
+        self._slots.acquire()
+        connection = self._checkout()
+        try:
+            for recipients, message in messages:
+                if unreachable is not None:
+                    results.append(unreachable)
+                    continue
+                try:
+                    connection = self._send_on(connection, sender, recipients, message)
+                    results.append(None)
+                except REFUSED as e:
+                    results.append(e)
+                except OSError as e:
+                    connection = None
+                    unreachable = e
+                    results.append(e)
+        finally:
+            self._checkin(connection)
+            self._slots.release()
+        return results
+    
+    def close(self):
+        """
+        Close every idle connection and refuse further use
+        """
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                return
+    
+    def _send_on(self, connection, sender, recipients, message):
+        if connection is not None and connection.sent >= self.max_messages:
+            connection.close()
+            connection = None
+        
+        while True:
+            fresh = connection is None
+            if fresh:
+                connection = self._connect()
+            try:
+                connection.smtp.sendmail(sender, recipients, message)
+            except REFUSED:
+                raise
+            except OSError:
+                # SMTPServerDisconnected or a socket error: the session is
+                # gone. A reused connection may simply have been dropped by
+                # the server, so retry once on a fresh one.
+                connection.smtp.close()
+                connection = None
+                if fresh:
+                    raise
+                continue
+            connection.sent += 1
+            connection.last_used = time.monotonic()
+            return connection
+    
+    def _checkout(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except Empty:
+                return None
+            
+            if time.monotonic() - connection.last_used <= self.idle_timeout:
+                return connection
+            try:
+                connection.smtp.noop()
+                return connection
+            except Exception:
+                connection.smtp.close()
+    
+    def _checkin(self, connection):
+        if connection is None:
+            return
+        if self._closed or connection.sent >= self.max_messages:
+            connection.close()
+        else:
+            self._idle.put(connection)
+    
+    def _connect(self):
+        smtp = None
+        try:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception as e:
+            if smtp is not None:
+                smtp.close()
+            # Reported as a connection failure even for AUTH errors, so the
+            # rest of a batch is not retried against a server we cannot use
+            raise ConnectionError(f'Cannot open SMTP session to {self.host}:{self.port}: {e}') from e
+        return PooledConnection(smtp)
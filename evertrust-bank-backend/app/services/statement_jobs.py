@@ -0,0 +1,318 @@
+from app import db
+from app.models import Account, Transaction, StatementJob
+from app.services.pdf_service import stream_statement_pdf
+from app.services.ledger_service import LedgerService
+from app.services.process_pool import app_process_pool, worker_app
+from flask import current_app
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.pool import StaticPool
+from threading import Lock
+from datetime import datetime, timedelta
+from functools import partial
+import atexit
+import os
+import uuid
+
+_pool_lock = Lock()
+
+def _run_job(job_id):
+    with worker_app().app_context():
+        try:
+            StatementJobService.render(job_id)
+        finally:
+            db.session.remove()
+
+class StatementJobService:
+    """
+    Statement PDFs rendered outside the request
+    
+    enqueue() records a StatementJob and hands it to a pool of render
+    processes (STATEMENT_WORKERS), so a large statement no longer holds a
+    web worker while it is drawn. write_statement() streams the rows from a
+    server-side cursor into stream_statement_pdf, which writes each page to
+    a .partial file as soon as it is full, so a render's memory stays flat
+    however long the period is. The job row is the only shared
+    state: any web process can report on or serve a job, whichever process
+    rendered it. A job still queued or running after
+    STATEMENT_JOB_TIMEOUT, because the process rendering it or holding the
+    pool died, is failed by reap_stale() rather than polled forever.
+    
+    Rendered files are cached on disk under a key made of the account,
+    the period and the account's latest transaction id, so a statement is
+    rendered once until the account changes and repeat downloads are only
+    a file read. Files older than STATEMENT_CACHE_TTL are no longer served
+    and are deleted by prune_cache().
+    """
+    
+    @staticmethod
+    def enqueue(user_id, account, start_date, end_date):
+        """
+        Get a job for the statement of `account` from start_date to end_date (inclusive dates)
+        
+        A statement that is already cached gets a job that is done at once,
+        and a matching job that is still queued or running (and not stale)
+        is returned instead of rendering the same statement twice.
+        
+        Returns:
+            StatementJob: The job; its id is what the client polls
+        """
+        cache_key = StatementJobService.cache_key(account.id, start_date, end_date)
+        cached = StatementJobService.cached_path(cache_key) is not None
+        
+        cutoff = datetime.utcnow() - current_app.config['STATEMENT_JOB_TIMEOUT']
+        pending = StatementJob.query.filter(
+            StatementJob.user_id == user_id,
+            StatementJob.cache_key == cache_key,
+            or_(and_(StatementJob.status == 'queued', StatementJob.created_at >= cutoff),
+                and_(StatementJob.status == 'running', StatementJob.started_at >= cutoff))
+        ).first()
+        if pending is not None:
+            return pending
+        
+        job = StatementJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            account_id=account.id,
+            start_date=start_date,
+            end_date=end_date,
+            cache_key=cache_key,
+            status='done' if cached else 'queued',
+            finished_at=datetime.utcnow() if cached else None
+        )
+        db.session.add(job)
+        db.session.commit()
+        
+        if not cached:
+            StatementJobService._submit(job.id)
+            db.session.refresh(job)
+        return job
+    
+    @staticmethod
+    def cache_key(account_id, start_date, end_date):
+        """
+        Cache key of a statement; any new transaction on the account changes it
+        
+        The account's latest transaction id is used rather than the period's
+        because the statement also shows the current balance.
+        """
+        latest_id = db.session.query(func.max(Transaction.id))\
+            .filter(Transaction.account_id == account_id).scalar()
+        return f'{account_id}_{start_date:%Y%m%d}_{end_date:%Y%m%d}_{latest_id or 0}'
+    
+    @staticmethod
+    def cache_path(cache_key, cache_dir=None):
+        cache_dir = cache_dir or current_app.config['STATEMENT_CACHE_DIR']
+        return os.path.join(os.path.abspath(cache_dir), f'statement_{cache_key}.pdf')
+    
+    @staticmethod
+    def cached_path(cache_key):
+        """
+        Path of the cached statement, or None if it was never rendered or is older than STATEMENT_CACHE_TTL
+        """
+        path = StatementJobService.cache_path(cache_key)
+        try:
+            rendered_at = datetime.utcfromtimestamp(os.path.getmtime(path))
+        except FileNotFoundError:
+            return None
+        if rendered_at < datetime.utcnow() - current_app.config['STATEMENT_CACHE_TTL']:
+            return None
+        return path
+    
+    @staticmethod
+    def reap_stale(job_id=None):
+        """
+        Fail jobs queued or running for longer than STATEMENT_JOB_TIMEOUT
+        
+        Queued jobs are timed from created_at and running ones from
+        started_at. A render that was only slow and finishes afterwards
+        still marks its job done.
+        
+        Args:
+            job_id: Only this job (optional)
+        
+        Returns:
+            int: Number of jobs failed
+        """
+        now = datetime.utcnow()
+        cutoff = now - current_app.config['STATEMENT_JOB_TIMEOUT']
+        query = StatementJob.query.filter(
+            or_(and_(StatementJob.status == 'queued', StatementJob.created_at < cutoff),
+                and_(StatementJob.status == 'running', StatementJob.started_at < cutoff))
+        )
+        if job_id is not None:
+            query = query.filter(StatementJob.id == job_id)
+        failed = query.update({'status': 'failed', 'error': 'timed out', 'finished_at': now},
+                              synchronize_session=False)
+        db.session.commit()
+        return failed
+    
+    @staticmethod
+    def prune_cache():
+        """
+        Delete cached statements older than STATEMENT_CACHE_TTL
+        
+        Partial files left by a render process that died are deleted once
+        they are older than STATEMENT_JOB_TIMEOUT.
+        
+        Returns:
+            int: Number of files deleted
+        """
+        cache_dir = os.path.abspath(current_app.config['STATEMENT_CACHE_DIR'])
+        if not os.path.isdir(cache_dir):
+            return 0
+        
+        now = datetime.utcnow()
+        deleted = 0
+        for entry in os.scandir(cache_dir):
+            if entry.name.endswith('.pdf'):
+                max_age = current_app.config['STATEMENT_CACHE_TTL']
+            elif entry.name.endswith('.partial'):
+                max_age = current_app.config['STATEMENT_JOB_TIMEOUT']
+            else:
+                continue
+            try:
+                if datetime.utcfromtimestamp(entry.stat().st_mtime) < now - max_age:
+                    os.remove(entry.path)
+                    deleted += 1
+            except FileNotFoundError:  # Removed meanwhile by another process
+                pass
+        return deleted
+    
+    @staticmethod
+    def write_statement(account, start_date, end_date, output):
+        """
+        Write the statement PDF of `account` from start_date to end_date (inclusive dates)
+        
+        Transactions are read oldest first in chunks through a server-side
+        cursor (yield_per) and drawn as they arrive by stream_statement_pdf,
+        so neither the rows nor the pages are ever all in memory.
+        
+        Args:
+            account: The Account
+            start_date: First day of the period
+            end_date: Last day of the period (inclusive)
+            output: Binary file object the PDF is written to
+        
+        Returns:
+            int: Number of pages written
+        """
+        period_start = datetime.combine(start_date, datetime.min.time())
+        period_end = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1)  # Include end date
+        opening_balance = LedgerService.balance_at(account, period_start)
+        
+        transactions = db.session.execute(
+            select(Transaction.created_at, Transaction.description, Transaction.type, Transaction.direction,
+                   Transaction.amount, Transaction.balance_after)
+            .where(Transaction.account_id == account.id,
+                   Transaction.created_at >= period_start,
+                   Transaction.created_at < period_end)
+            .order_by(Transaction.created_at, Transaction.id)
+            .execution_options(yield_per=1000)
+        )
+        return stream_statement_pdf(account, transactions, start_date, end_date, opening_balance, output)
+    
+    @staticmethod
+    def render(job_id):
+        """
+        Render a job's statement into the cache and mark the job done or failed
+        
+        Runs in a render process (or in the request when there is no pool).
+        The file is written under a temporary name and renamed into place,
+        so readers never see a partial PDF.
+        """
+        job = db.session.get(StatementJob, job_id)
+        if job.status != 'queued':  # Reaped while it waited for a render process
+            return
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+        
+        path = StatementJobService.cache_path(job.cache_key)
+        try:
+            if StatementJobService.cached_path(job.cache_key) is None:
+                account = db.session.get(Account, job.account_id)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                partial_path = f'{path}.{os.getpid()}.partial'
+                with open(partial_path, 'wb') as statement_file:
+                    StatementJobService.write_statement(account, job.start_date, job.end_date, statement_file)
+                os.replace(partial_path, path)
+            
+            job.status = 'done'
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error rendering statement {job_id}: {str(e)}")
+            job = db.session.get(StatementJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    
+    @staticmethod
+    def pool():
+        """
+        Render processes of the current app, started on first use
+        
+        Returns None when statements are rendered in the request:
+        STATEMENT_WORKERS is 0, or the database is in-memory SQLite, which
+        other processes cannot open.
+        """
+        app = current_app._get_current_object()
+        if app.config['STATEMENT_WORKERS'] <= 0 or isinstance(db.engine.pool, StaticPool):
+            return None
+        
+        pool = app.extensions.get('statement_pool')
+        if pool is None:
+            with _pool_lock:
+                pool = app.extensions.get('statement_pool')
+                if pool is None:
+                    pool = app.extensions['statement_pool'] = app_process_pool(
+                        app.config['STATEMENT_WORKERS'],
+                        {'STATEMENT_CACHE_DIR': os.path.abspath(app.config['STATEMENT_CACHE_DIR']),
+                         'STATEMENT_CACHE_TTL': app.config['STATEMENT_CACHE_TTL']}
+                    )
+                    atexit.register(pool.shutdown)
+        return pool
+    
+    @staticmethod
+    def shutdown():
+        """
+        Stop the render processes of the current app once queued jobs finish
+        """
+        pool = current_app.extensions.pop('statement_pool', None)
+        if pool is not None:
+            pool.shutdown(wait=True)
+    
+    @staticmethod
+    def _submit(job_id):
+        pool = StatementJobService.pool()
+        if pool is None:
+            StatementJobService.render(job_id)
+            return
+        
+        app = current_app._get_current_object()
+        future = pool.submit(_run_job, job_id)
+        future.add_done_callback(partial(StatementJobService._finished, app, job_id))
+    
+    @staticmethod
+    def _finished(app, job_id, future):
+        # render() records its own failures; this catches a render process
+        # that died or a job that could not be sent to one
+        if future.cancelled():
+            error = 'render pool shut down before the job started'
+        else:
+            error = future.exception()
+            if error is None:
+                return
+        
+        print(f"Statement job {job_id} did not complete: {str(error)}")
+        with app.app_context():
+            try:
+                StatementJob.query.filter(
+                    StatementJob.id == job_id,
+                    StatementJob.status.in_(['queued', 'running'])
+                ).update({'status': 'failed', 'error': str(error), 'finished_at': datetime.utcnow()},
+                         synchronize_session=False)
+                db.session.commit()
+            finally:
+                db.session.remove()
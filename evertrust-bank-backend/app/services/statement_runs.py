@@ -0,0 +1,154 @@
+from app import db
+from app.models import Account
+from app.services.statement_jobs import StatementJobService
+from app.services.process_pool import app_process_pool, worker_app
+from sqlalchemy import select
+from sqlalchemy.pool import StaticPool
+from concurrent.futures import as_completed
+from datetime import datetime, timedelta
+import json
+import os
+import time
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+def _render_accounts(account_ids, start_date, end_date, output_dir):
+    with worker_app().app_context():
+        try:
+            return StatementRunService.render_accounts(account_ids, start_date, end_date, output_dir)
+        finally:
+            db.session.remove()
+
+class StatementRunService:
+    """
+    Statements for every account over one period, e.g. at month end
+    
+    Accounts are split into chunks and rendered by a process pool, each
+    statement streamed straight to a file in the run's output directory by
+    StatementJobService.write_statement. Every finished account gets a line
+    in manifest.jsonl there, written only by the coordinating process, so
+    a run that is interrupted (or has failures) is resumed by running it
+    again: accounts the manifest lists as done are skipped.
+    """
+    
+    @staticmethod
+    def run(start_date, end_date, output_dir, workers=4, chunk_size=25, progress=None):
+        """
+        Render the statement of every account open before end_date
+        
+        Args:
+            start_date: First day of the period
+            end_date: Last day of the period (inclusive)
+            output_dir: Directory for the PDFs and the manifest
+            workers: Render processes; 0 renders in this process
+            chunk_size: Accounts per task
+            progress: Called with each manifest entry as it is written (optional)
+        
+        Returns:
+            dict: Counts of rendered, failed and skipped accounts, and seconds taken
+        """
+        started = time.perf_counter()
+        output_dir = os.path.abspath(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+        
+        done = StatementRunService.completed(output_dir)
+        opened_before = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1)
+        account_ids = [account_id for account_id in db.session.execute(
+            select(Account.id).where(Account.created_at < opened_before).order_by(Account.id)
+        ).scalars() if account_id not in done]
+        db.session.commit()
+        
+        summary = {'rendered': 0, 'failed': 0, 'skipped': len(done)}
+        chunks = [account_ids[start:start + chunk_size] for start in range(0, len(account_ids), chunk_size)]
+        
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'a+') as manifest:
+            if manifest.tell():
+                manifest.seek(manifest.tell() - 1)
+                if manifest.read(1) != '\n':
+                    manifest.write('\n')  # Close off a line torn by an interrupted run
+            
+            def record(entries):
+                for entry in entries:
+                    manifest.write(json.dumps(entry) + '\n')
+                    summary['rendered' if entry['status'] == 'done' else 'failed'] += 1
+                    if progress:
+                        progress(entry)
+                manifest.flush()
+                os.fsync(manifest.fileno())
+            
+            if workers <= 0 or isinstance(db.engine.pool, StaticPool):
+                for chunk in chunks:
+                    record(StatementRunService.render_accounts(chunk, start_date, end_date, output_dir))
+            else:
+                with app_process_pool(workers) as pool:
+                    futures = [pool.submit(_render_accounts, chunk, start_date, end_date, output_dir)
+                               for chunk in chunks]
+                    for future in as_completed(futures):
+                        record(future.result())
+        
+        summary['seconds'] = time.perf_counter() - started
+        return summary
+    
+    @staticmethod
+    def completed(output_dir):
+        """
+        Account ids the run in `output_dir` has already rendered
+        
+        Returns:
+            set: IDs with a 'done' manifest entry whose file is still there
+        """
+        path = os.path.join(output_dir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return set()
+        
+        done = set()
+        with open(path) as manifest:
+            for line in manifest:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Last line of a run killed mid-write
+                if entry['status'] == 'done' and os.path.exists(os.path.join(output_dir, entry['file'])):
+                    done.add(entry['account_id'])
+                else:
+                    done.discard(entry['account_id'])
+        return done
+    
+    @staticmethod
+    def render_accounts(account_ids, start_date, end_date, output_dir):
+        """
+        Render the statements of a chunk of accounts into `output_dir`
+        
+        Each file is written under a temporary name and renamed into place
+        when complete. A failing account is reported and the chunk goes on.
+        
+        Returns:
+            list: Manifest entries, one per account
+        """
+        entries = []
+        for account_id in account_ids:
+            account = db.session.get(Account, account_id)
+            filename = f'statement_{account.number}_{start_date:%Y-%m-%d}_{end_date:%Y-%m-%d}.pdf'
+            path = os.path.join(output_dir, filename)
+            entry = {'account_id': account_id, 'account_number': account.number, 'file': filename}
+            
+            partial_path = f'{path}.{os.getpid()}.partial'
+            try:
+                with open(partial_path, 'wb') as statement_file:
+                    entry['pages'] = StatementJobService.write_statement(account, start_date, end_date,
+                                                                         statement_file)
+                    entry['bytes'] = statement_file.tell()
+                os.replace(partial_path, path)
+                entry['status'] = 'done'
+            except Exception as e:
+                db.session.rollback()
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                print(f"Error rendering statement for account {account_id}: {str(e)}")
+                entry['status'] = 'failed'
+                entry['error'] = str(e)
+            
+            entry['rendered_at'] = datetime.utcnow().isoformat()
+            entries.append(entry)
+            db.session.commit()  # End the read transaction between accounts
+        return entries
@@ -0,0 +1,94 @@
+from app import db
+
+class UnitOfWork:
+    """
+    Groups every write made while handling a request into a single commit
+    
+    While a unit of work is open, services such as AuditService add their rows
+    to the session instead of committing on their own, so the ledger, balance,
+    audit, alert and email outbox rows become durable together. Side effects
+    that must only happen once the data is durable are registered with
+    on_commit and run after the commit succeeds.
+    
+    Usage:
+        with UnitOfWork() as uow:
+            ...
+            uow.on_commit(UserContextService.invalidate, user_id)
+            uow.commit()
+    
+    Leaving the block without commit(), through an early return or an
+    exception, rolls the pending writes back, so a unit of work never
+    outlives the handler that opened it.
+    """
+    
+    SESSION_KEY = 'unit_of_work'
+    COMMITTED_KEY = 'units_committed'
+    
+    def __init__(self, session=None):
+        self.session = session or db.session
+        self._callbacks = []
+        self.session.info[self.SESSION_KEY] = self
+    
+    @classmethod
+    def current(cls, session=None):
+        """
+        Return the unit of work open on the session, if any
+        """
+        return (session or db.session).info.get(cls.SESSION_KEY)
+    
+    @classmethod
+    def committed_count(cls, session=None):
+        """
+        Number of units of work committed so far on the session
+        
+        Lets callers tell whether a request made its writes durable even if
+        it failed afterwards.
+        """
+        return (session or db.session).info.get(cls.COMMITTED_KEY, 0)
+    
+    def on_commit(self, callback, *args, **kwargs):
+        """
+        Defer a side effect until the unit of work has been committed
+        """
+        self._callbacks.append((callback, args, kwargs))
+    
+    def commit(self):
+        """
+        Commit all pending writes in one transaction, then run deferred callbacks
+        """
+        try:
+            self.session.commit()
+        finally:
+            self._close()
+        self.session.info[self.COMMITTED_KEY] = self.committed_count(self.session) + 1
+        
+        callbacks, self._callbacks = self._callbacks, []
+        for callback, args, kwargs in callbacks:
+            try:
+                callback(*args, **kwargs)
+            except Exception as e:
+                # The data is already durable; a failed side effect must not
+                # turn a successful request into an error
+                print(f"Post-commit callback failed: {str(e)}")
+    
+    def rollback(self):
+        """
+        Discard pending writes and deferred callbacks
+        """
+        self._callbacks = []
+        try:
+            self.session.rollback()
+        finally:
+            self._close()
+    
+    def _close(self):
+        if self.session.info.get(self.SESSION_KEY) is self:
+            del self.session.info[self.SESSION_KEY]
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if self.current(self.session) is self:
+            self.rollback()
+        return False
@@ -0,0 +1,138 @@
+from app import db
+from app.models import User, AlertPrefs
+from flask import g, current_app, has_app_context
+from types import SimpleNamespace
+import threading
+import time
+
+PREF_FIELDS = ('low_balance', 'low_balance_threshold', 'large_tx', 'large_tx_threshold',
+               'card_change', 'email_enabled')
+
+class UnknownUserError(LookupError):
+    """Raised when a user context is requested for a user that does not exist"""
+
+class UserContext:
+    """
+    Read-only snapshot of the caller: profile and alert preferences
+    
+    The snapshot holds plain values rather than ORM instances, so it stays
+    readable after the request's session commits (no lazy refresh queries)
+    and can be shared between requests by the process cache.
+    """
+    
+    def __init__(self, user, alert_prefs):
+        self.user = user
+        self.alert_prefs = alert_prefs
+
+class UserContextService:
+    """
+    Load the current user's context once per request
+    
+    Handlers used to query User and AlertPrefs separately for the same JWT
+    identity. get() loads both in one statement and keeps the result on
+    flask.g for the rest of the request. When USER_CONTEXT_CACHE_TTL
+    is set, contexts are also shared across requests in this process for that
+    many seconds; every worker keeps its own copy, so keep the TTL short.
+    """
+    
+    _cache = {}
+    _lock = threading.Lock()
+    MAX_CACHED_USERS = 10000
+    
+    @staticmethod
+    def get(user_id):
+        """
+        Get the context for `user_id`, loading it if needed
+        
+        Args:
+            user_id: ID of the user (normally get_jwt_identity())
+        
+        Returns:
+            UserContext: Snapshot
+        
+        Raises:
+            UnknownUserError: If the user does not exist, e.g. a token that
+                outlived its user
+        """
+        user_id = int(user_id)
+        context = g.get('user_context')
+        if context is not None and context.user.id == user_id:
+            return context
+        
+        ttl = current_app.config.get('USER_CONTEXT_CACHE_TTL', 0)
+        context = UserContextService._cached(user_id) if ttl else None
+        if context is None:
+            context = UserContextService.load(user_id)
+            if context is None:
+                raise UnknownUserError(f'User {user_id} does not exist')
+            if ttl:
+                UserContextService._store(user_id, context, ttl)
+        
+        g.user_context = context
+        return context
+    
+    @staticmethod
+    def load(user_id):
+        """
+        Build a context straight from the database
+        
+        Returns:
+            UserContext: Snapshot, or None if the user does not exist
+        """
+        row = db.session.query(User.id, User.name, User.email, AlertPrefs)\
+            .outerjoin(AlertPrefs, AlertPrefs.user_id == User.id)\
+            .filter(User.id == user_id)\
+            .first()
+        if row is None:
+            return None
+        
+        prefs = None
+        if row.AlertPrefs is not None:
+            prefs = SimpleNamespace(**{field: getattr(row.AlertPrefs, field) for field in PREF_FIELDS})
+        
+        return UserContext(
+            user=SimpleNamespace(id=row.id, name=row.name, email=row.email),
+            alert_prefs=prefs
+        )
+    
+    @staticmethod
+    def invalidate(user_id):
+        """
+        Drop any cached context for `user_id`
+        
+        Call after changing the user's profile or alert preferences.
+        Only this process is affected; other workers see the change once their
+        TTL expires.
+        """
+        user_id = int(user_id)
+        if has_app_context():
+            context = g.get('user_context')
+            if context is not None and context.user.id == user_id:
+                g.pop('user_context')
+        with UserContextService._lock:
+            UserContextService._cache.pop(user_id, None)
+    
+    @staticmethod
+    def clear():
+        """Empty the process cache"""
+        with UserContextService._lock:
+            UserContextService._cache.clear()
+    
+    @staticmethod
+    def _cached(user_id):
+        entry = UserContextService._cache.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+    
+    @staticmethod
+    def _store(user_id, context, ttl):
+        now = time.monotonic()
+        with UserContextService._lock:
+            cache = UserContextService._cache
+            if len(cache) >= UserContextService.MAX_CACHED_USERS:
+                for key in [key for key, (expires, _) in cache.items() if expires < now]:
+                    del cache[key]
+                if len(cache) >= UserContextService.MAX_CACHED_USERS:
+                    cache.clear()
+            cache[user_id] = (now + ttl, context)
@@ -0,0 +1,6 @@
+import os
+
+# create_app() builds the engine from DATABASE_URL, so the fixtures setting
+# SQLALCHEMY_DATABASE_URI afterwards would still share app.db (or whatever
+# database the environment points at); use an in-memory database instead
+os.environ['DATABASE_URL'] = 'sqlite://'
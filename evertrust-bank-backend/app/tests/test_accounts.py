@@ -53,4 +53,155 @@ def test_create_account(client):
     
     assert response.status_code == 201
     data = json.loads(response.data)
-    assert data['type'] == 'Savings'
\ No newline at end of file
+    assert data['type'] == 'Savings'
+
+def test_sharded_account_balance(client):
+    """Test that a sharded account reports the sum of its shards"""
+    from app.services import LedgerService, InsufficientFundsError
+    
+    with client.application.app_context():
+        user = User.query.filter_by(email='test@example.com').first()
+        account = Account(user_id=user.id, type='Checking', number='555000111222', balance=100.00)
+        db.session.add(account)
+        db.session.commit()
+        
+        LedgerService.enable_sharding(account, 4)
+        for _ in range(8):
+            LedgerService.credit(account, 10)
+        db.session.commit()
+        
+        # Larger than any single shard can hold, so it drains several
+        LedgerService.debit(account, 150)
+        db.session.commit()
+        
+        with pytest.raises(InsufficientFundsError):
+            LedgerService.debit(account, 31)
+        db.session.rollback()
+        account_id = account.id
+    
+    token = get_auth_token(client)
+    response = client.get(f'/api/v1/accounts/{account_id}', headers={
+        'Authorization': f'Bearer {token}'
+    })
+    
+    assert response.status_code == 200
+    assert json.loads(response.data)['balance'] == '30.00'
+
+def create_checking_account(client, number='777000111222', balance=100.00):
+    with client.application.app_context():
+        user = User.query.filter_by(email='test@example.com').first()
+        account = Account(user_id=user.id, type='Checking', number=number, balance=balance)
+        db.session.add(account)
+        db.session.commit()
+        return account.id
+
+def test_balance_history_follows_postings(client):
+    """Test postings update today's rollup and the chart ends on the current balance"""
+    from datetime import datetime, timedelta
+    from app.models import AccountDailyBalance
+    
+    account_id = create_checking_account(client)
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    
+    client.post('/api/v1/transactions/deposit', json={'account_id': account_id, 'type': 'Deposit', 'amount': 50.00},
+                headers=headers)
+    client.post('/api/v1/transactions/withdraw', json={'account_id': account_id, 'type': 'Withdrawal', 'amount': 20.00},
+                headers=headers)
+    client.post('/api/v1/transactions/batch', json={'postings': [
+        {'account_id': account_id, 'type': 'Deposit', 'amount': 5.00}
+    ]}, headers=headers)
+    
+    with client.application.app_context():
+        rows = AccountDailyBalance.query.filter_by(account_id=account_id).all()
+        assert [(row.day, row.shard, str(row.net_change)) for row in rows] == [
+            (datetime.utcnow().date(), 0, '35.00')
+        ]
+    
+    response = client.get(f'/api/v1/accounts/{account_id}/balance-history', headers=headers)
+    assert response.status_code == 200
+    points = json.loads(response.data)['points']
+    assert len(points) == 365
+    assert points[0]['balance'] == '100.00'
+    assert points[-1] == {'date': datetime.utcnow().date().isoformat(), 'balance': '135.00'}
+    
+    today = datetime.utcnow().date()
+    response = client.get(f'/api/v1/accounts/{account_id}/balance-history?interval=month'
+                          f'&start_date={today - timedelta(days=40):%Y-%m-%d}', headers=headers)
+    points = json.loads(response.data)['points']
+    assert points[-1]['date'] == today.replace(day=1).isoformat()
+    assert [point['balance'] for point in points][-1] == '135.00'
+    
+    response = client.get(f'/api/v1/accounts/{account_id}/balance-history?interval=hour', headers=headers)
+    assert response.status_code == 400
+    # The range is capped, however few points its interval gives
+    response = client.get(f'/api/v1/accounts/{account_id}/balance-history?interval=month&start_date=0001-01-01',
+                          headers=headers)
+    assert response.status_code == 400
+    response = client.get(f'/api/v1/accounts/{account_id}/balance-history?start_date=2020-01-01'
+                          f'&end_date=2024-12-31', headers=headers)
+    assert response.status_code == 200
+    response = client.get('/api/v1/accounts/999/balance-history', headers=headers)
+    assert response.status_code == 404
+
+def test_balance_history_backfill(client):
+    """Test the rollup rebuilt from past transactions gives weekly and monthly closing balances"""
+    from datetime import date, datetime
+    from app.models import Transaction
+    from app.services import BalanceHistoryService
+    
+    account_id = create_checking_account(client, balance=175.00)
+    with client.application.app_context():
+        db.session.execute(Transaction.__table__.insert(), [
+            # 100.00 before any of these
+            {'account_id': account_id, 'type': 'Deposit', 'direction': 'credit', 'amount': '50.00',
+             'created_at': datetime(2025, 1, 6, 9), 'balance_after': '150.00'},
+            {'account_id': account_id, 'type': 'Withdrawal', 'direction': 'debit', 'amount': '30.00',
+             'created_at': datetime(2025, 1, 8, 9), 'balance_after': None},  # Not backfilled
+            {'account_id': account_id, 'type': 'Deposit', 'direction': 'credit', 'amount': '25.00',
+             'created_at': datetime(2025, 1, 8, 17), 'balance_after': '145.00'},
+            {'account_id': account_id, 'type': 'Deposit', 'direction': 'credit', 'amount': '30.00',
+             'created_at': datetime(2025, 2, 3, 12), 'balance_after': '175.00'}
+        ])
+        db.session.commit()
+        
+        assert BalanceHistoryService.backfill([account_id]) == 3
+        db.session.commit()
+        assert BalanceHistoryService.backfill([account_id]) == 3  # Replaces, does not add
+        db.session.commit()
+        
+        account = db.session.get(Account, account_id)
+        weekly = BalanceHistoryService.series(account, date(2025, 1, 1), date(2025, 2, 9), 'week')
+        assert [(str(day), str(balance)) for day, balance in weekly] == [
+            ('2024-12-30', '100.00'),
+            ('2025-01-06', '145.00'),
+            ('2025-01-13', '145.00'),
+            ('2025-01-20', '145.00'),
+            ('2025-01-27', '145.00'),
+            ('2025-02-03', '175.00')
+        ]
+        monthly = BalanceHistoryService.series(account, date(2025, 1, 7), date(2025, 3, 31), 'month')
+        assert [(str(day), str(balance)) for day, balance in monthly] == [
+            ('2025-01-01', '145.00'),
+            ('2025-02-01', '175.00'),
+            ('2025-03-01', '175.00')
+        ]
+
+def test_balance_history_of_sharded_account(client):
+    """Test postings to a sharded account land on per-shard rows that sum to the balance"""
+    from datetime import datetime
+    from app.models import AccountDailyBalance
+    from app.services import LedgerService
+    
+    account_id = create_checking_account(client)
+    with client.application.app_context():
+        account = db.session.get(Account, account_id)
+        LedgerService.enable_sharding(account, 4)
+        for _ in range(8):
+            LedgerService.credit(account, 10)
+        LedgerService.debit(account, 150)  # Drains several shards
+        db.session.commit()
+        
+        rows = AccountDailyBalance.query.filter_by(account_id=account_id).all()
+        assert {row.day for row in rows} == {datetime.utcnow().date()}
+        assert sum(row.net_change for row in rows) == 80 - 150
@@ -0,0 +1,305 @@
+import pytest
+import json
+import tracemalloc
+import gzip
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Account, AuditLog
+from app.services import AuditService, AuditPartitionService
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # A file database: the audit writer needs its own connection, which an
+    # in-memory database shared through a single connection cannot give it
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "audit.db"}')
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+    app.config['AUDIT_DURABILITY'] = 'async'
+    app.config['AUDIT_FLUSH_INTERVAL'] = 60
+    
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            user = User(name='Test User', email='test@example.com')
+            user.set_password('password123')
+            db.session.add(user)
+            db.session.flush()
+            
+            account = Account(user_id=user.id, type='Checking', number='1234567890', balance=1000.00)
+            db.session.add(account)
+            db.session.commit()
+        yield client
+        
+        with app.app_context():
+            writer = app.extensions.get('audit_writer')
+            if writer is not None:
+                writer.close()
+
+def get_auth_token(client):
+    """Helper to get authentication token"""
+    response = client.post('/api/v1/auth/login', json={
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+    data = json.loads(response.data)
+    return data['access_token']
+
+def count_events(action):
+    return AuditLog.query.filter_by(action=action).count()
+
+def test_login_audit_is_batched_and_deposit_audit_is_not(client):
+    """Test that informational events are queued while money movement is written in its transaction"""
+    token = get_auth_token(client)
+    response = client.post('/api/v1/transactions/deposit', json={
+        'account_id': 1,
+        'amount': 25.00,
+        'type': 'Deposit'
+    }, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 201
+    
+    with client.application.app_context():
+        assert count_events('deposit_created') == 1
+        assert count_events('user_login') == 0
+        
+        AuditService.flush()
+        
+        assert count_events('user_login') == 1
+
+def test_audit_writer_inserts_in_batches(client):
+    """Test that queued events are written with one multi-row insert per batch"""
+    with client.application.app_context():
+        client.application.config['AUDIT_BATCH_SIZE'] = 500
+        inserts = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO audit_log'):
+                inserts.append(len(parameters) if executemany else 1)
+        
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            for index in range(1200):
+                AuditService.log_event(1, 'transaction_query_failed', 'transaction', metadata={'index': index})
+            AuditService.flush()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        
+        assert inserts == [500, 500, 200]
+        assert count_events('transaction_query_failed') == 1200
+
+def test_audit_writer_close_flushes_queue(client):
+    """Test that shutting the writer down writes everything still queued"""
+    with client.application.app_context():
+        for _ in range(10):
+            AuditService.log_event(1, 'user_logout', 'user', entity_id=1)
+        assert count_events('user_logout') == 0
+        
+        client.application.extensions['audit_writer'].close()
+        
+        assert count_events('user_logout') == 10
+        
+        # Events arriving after shutdown are written synchronously
+        AuditService.log_event(1, 'user_logout', 'user', entity_id=1)
+        assert count_events('user_logout') == 11
+
+def add_events(user_id, count, start=datetime(2026, 1, 1)):
+    rows = [{
+        'user_id': user_id,
+        'action': 'user_login',
+        'entity': 'user',
+        'entity_id': user_id,
+        'metadata': {'ip': '203.0.113.7', 'user_agent': 'Mozilla/5.0 (X11; Linux x86_64)', 'sequence': index},
+        'created_at': start + timedelta(seconds=index)
+    } for index in range(count)]
+    for offset in range(0, count, 10000):
+        db.session.execute(AuditLog.__table__.insert(), rows[offset:offset + 10000])
+    db.session.commit()
+
+def test_export_streams_ndjson_and_json(client):
+    """Test both export formats, newest first, with an inclusive date range"""
+    with client.application.app_context():
+        add_events(1, 5, start=datetime(2026, 3, 30, 23, 59, 58))
+        token = get_auth_token(client)
+        headers = {'Authorization': f'Bearer {token}'}
+        
+        response = client.get('/api/v1/audit/export', headers=headers)
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [event['metadata']['sequence'] for event in events] == [4, 3, 2, 1, 0]
+        
+        response = client.get('/api/v1/audit/export?format=json&start_date=2026-03-30&end_date=2026-03-30',
+                              headers=headers)
+        events = json.loads(response.get_data(as_text=True))
+        assert [event['metadata']['sequence'] for event in events] == [1, 0]
+        
+        response = client.get('/api/v1/audit/export?format=json&start_date=2027-01-01', headers=headers)
+        assert json.loads(response.get_data(as_text=True)) == []
+        
+        assert client.get('/api/v1/audit/export?format=xml', headers=headers).status_code == 400
+
+def test_export_memory_stays_bounded(client):
+    """Test that peak memory while streaming does not grow with the size of the log"""
+    with client.application.app_context():
+        token = get_auth_token(client)
+        headers = {'Authorization': f'Bearer {token}'}
+        
+        def measure():
+            response = client.get('/api/v1/audit/export', headers=headers, buffered=False)
+            tracemalloc.start()
+            size = sum(len(chunk) for chunk in response.response)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            response.close()
+            return size, peak
+        
+        add_events(1, 10000)
+        small_size, small_peak = measure()
+        add_events(1, 90000)
+        large_size, large_peak = measure()
+    
+    assert large_size > 20 * 1024 * 1024
+    assert large_size > 9 * small_size
+    assert large_peak < 1.5 * small_peak
+    assert large_peak < large_size / 3
+
+def test_archive_moves_old_events_to_gzip(client, tmp_path):
+    """Test retention on a non-partitioned table: old rows are archived and deleted"""
+    with client.application.app_context():
+        add_events(1, 30, start=datetime(2024, 1, 31))
+        add_events(1, 4, start=datetime(2026, 9, 1))
+        
+        assert AuditPartitionService.is_partitioned() is False
+        assert AuditPartitionService.create_partitions() == []
+        assert AuditPartitionService.detached() == []
+        
+        cutoff = AuditPartitionService.retention_cutoff(24, now=datetime(2026, 10, 18))
+        assert cutoff == datetime(2024, 10, 1)
+        
+        archived = AuditPartitionService.archive(cutoff, str(tmp_path / 'archive'))
+        
+        assert len(archived) == 1
+        path, rows = archived[0]
+        assert rows == 30
+        with gzip.open(path, 'rt') as archive:
+            events = [json.loads(line) for line in archive]
+        assert [event['metadata']['sequence'] for event in events] == list(range(30))
+        assert events[0]['created_at'] == '2024-01-31T00:00:00'
+        
+        assert AuditLog.query.count() == 4
+        assert AuditPartitionService.archive(cutoff, str(tmp_path / 'archive')) == []
+
+def test_user_events_can_be_bounded_by_time(client):
+    """Test the created_at bounds used for partition pruning"""
+    with client.application.app_context():
+        add_events(1, 10, start=datetime(2026, 3, 31, 23, 59, 55))
+        
+        events = AuditService.get_user_events(1, since=datetime(2026, 4, 1))
+        assert [event.created_at.second for event in events] == [4, 3, 2, 1, 0]
+        
+        events = AuditService.get_user_events(1, until=datetime(2026, 4, 1), limit=2)
+        assert [event.created_at.second for event in events] == [59, 58]
+
+def test_audit_listing_pages_with_cursor(client):
+    """Test keyset pagination over the caller's events, including timestamp ties"""
+    with client.application.app_context():
+        add_events(1, 7, start=datetime(2026, 5, 1))
+        # Two events sharing a timestamp must still land on exactly one page each
+        add_events(1, 2, start=datetime(2026, 5, 1, 0, 0, 3))
+        add_events(2, 3, start=datetime(2026, 5, 1))
+        token = get_auth_token(client)
+        headers = {'Authorization': f'Bearer {token}'}
+        
+        seen, cursor = [], None
+        while True:
+            url = '/api/v1/audit?limit=4' + (f'&cursor={cursor}' if cursor else '')
+            response = client.get(url, headers=headers)
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            seen.extend(data['events'])
+            cursor = data['next_cursor']
+            if not data['has_more']:
+                break
+        
+        # The login above is queued asynchronously and not written yet
+        assert len(seen) == 9
+        assert len({event['id'] for event in seen}) == 9
+        assert all(event['user_id'] == 1 for event in seen)
+        assert [event['created_at'] for event in seen] == sorted((event['created_at'] for event in seen), reverse=True)
+        
+        response = client.get('/api/v1/audit?from=2026-05-02', headers=headers)
+        assert json.loads(response.data)['events'] == []
+        assert client.get('/api/v1/audit?cursor=garbage', headers=headers).status_code == 400
+
+def test_entity_audit_events_are_scoped_to_caller(client):
+    """Test the entity listing only returns the caller's events for that entity"""
+    with client.application.app_context():
+        token = get_auth_token(client)
+        headers = {'Authorization': f'Bearer {token}'}
+        response = client.post('/api/v1/transactions/deposit', json={
+            'account_id': 1,
+            'amount': 25.00,
+            'type': 'Deposit'
+        }, headers=headers)
+        transaction_id = json.loads(response.data)['id']
+        AuditService.log_event(2, 'transaction_viewed', 'transaction', entity_id=transaction_id, durability='sync')
+        
+        response = client.get(f'/api/v1/audit/transaction/{transaction_id}', headers=headers)
+        
+        assert response.status_code == 200
+        events = json.loads(response.data)['events']
+        assert [event['action'] for event in events] == ['deposit_created']
+        assert events[0]['metadata']['amount'] == '25.00'
+        assert json.loads(response.data)['next_cursor'] is None
+
+def test_search_matches_metadata_keys(client, tmp_path):
+    """Test metadata search by key/value, number-as-text matching and side table upkeep"""
+    with client.application.app_context():
+        add_events(1, 20)
+        AuditService.log_event(1, 'deposit_created', 'transaction', entity_id=7,
+                               metadata={'amount': '25.00', 'reference': 'INV-1', 'flagged': True}, durability='sync')
+        AuditService.log_event(2, 'deposit_created', 'transaction', entity_id=8,
+                               metadata={'amount': '25.00', 'reference': 'INV-2'}, durability='sync')
+        
+        assert [event.entity_id for event in AuditService.search_events({'amount': '25.00'})] == [8, 7]
+        assert [event.entity_id for event in AuditService.search_events({'amount': '25.00', 'reference': 'INV-1'})] == [7]
+        assert [event.entity_id for event in AuditService.search_events({'flagged': 'true'})] == [7]
+        assert [event.entity_id for event in AuditService.search_events({'amount': '25.00'}, user_id=2)] == [8]
+        
+        # Numbers match their text form
+        events = AuditService.search_events({'sequence': '3'})
+        assert [event.created_at for event in events] == [datetime(2026, 1, 1, 0, 0, 3)]
+        assert AuditService.search_events({'sequence': '3'}, action='user_logout') == []
+        
+        # Deleted events leave nothing behind to match
+        AuditPartitionService.archive(datetime(2026, 6, 1), str(tmp_path / 'archive'))
+        assert AuditService.search_events({'sequence': '3'}) == []
+        assert db.session.execute(db.text('SELECT count(*) FROM audit_log_metadata_keys')).scalar() == 5
+
+def test_search_route_is_scoped_to_caller(client):
+    """Test GET /audit/search filters on metadata.<key> parameters for the caller only"""
+    with client.application.app_context():
+        token = get_auth_token(client)
+        headers = {'Authorization': f'Bearer {token}'}
+        for reference in ('INV-1', 'INV-1', 'INV-2'):
+            AuditService.log_event(1, 'bill_paid', 'bill', entity_id=1, metadata={'reference': reference},
+                                   durability='sync')
+        AuditService.log_event(2, 'bill_paid', 'bill', entity_id=2, metadata={'reference': 'INV-1'},
+                               durability='sync')
+        
+        response = client.get('/api/v1/audit/search?metadata.reference=INV-1&limit=1', headers=headers)
+        assert response.status_code == 200
+        page = json.loads(response.data)
+        assert [event['metadata'] for event in page['events']] == [{'reference': 'INV-1'}]
+        assert page['has_more'] is True
+        
+        response = client.get(f"/api/v1/audit/search?metadata.reference=INV-1&cursor={page['next_cursor']}",
+                              headers=headers)
+        page = json.loads(response.data)
+        assert len(page['events']) == 1
+        assert page['has_more'] is False
+        
+        response = client.get('/api/v1/audit/search?metadata.reference=INV-1&action=bill_cancelled', headers=headers)
+        assert json.loads(response.data)['events'] == []
+        assert client.get('/api/v1/audit/search', headers=headers).status_code == 400
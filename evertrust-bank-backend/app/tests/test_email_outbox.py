@@ -0,0 +1,258 @@
+import pytest
+import json
+import email
+import socketserver
+import threading
+from datetime import datetime
+from app import create_app, db
+from app.models import User, Account, EmailOutbox
+from app.services import EmailOutboxWorker
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Minimal local SMTP server that records delivered messages"""
+    
+    allow_reuse_address = True
+    daemon_threads = True
+    
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.reject_next = 0
+        self.lock = threading.Lock()
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+    
+    def handle(self):
+        self.reply('220 localhost SMTP stand-in')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().rstrip('\r\n')
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipients.append(line.split(':', 1)[1].strip('<> '))
+                self.reply('250 OK')
+            elif command == 'DATA':
+                with self.server.lock:
+                    rejected = self.server.reject_next > 0
+                    if rejected:
+                        self.server.reject_next -= 1
+                if rejected:
+                    self.reply('451 Try again later')
+                    continue
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                body = []
+                while True:
+                    data = self.rfile.readline().decode().rstrip('\r\n')
+                    if data == '.':
+                        break
+                    body.append(data)
+                with self.server.lock:
+                    self.server.messages.append((recipients, '\n'.join(body)))
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def client(smtp_server):
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+    app.config['SMTP_SERVER'] = '127.0.0.1'
+    app.config['SMTP_PORT'] = smtp_server.server_address[1]
+    app.config['SMTP_USE_TLS'] = False
+    app.config['ALERT_DIGEST_WINDOW'] = 60
+    app.config['ALERT_DIGEST_BYPASS_TYPES'] = {'large_withdrawal'}
+    
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            user = User(name='Test User', email='test@example.com')
+            user.set_password('password123')
+            db.session.add(user)
+            db.session.flush()
+            
+            account = Account(user_id=user.id, type='Checking', number='1234567890', balance=1000.00)
+            db.session.add(account)
+            db.session.commit()
+        yield client
+
+def get_auth_token(client):
+    """Helper to get authentication token"""
+    response = client.post('/api/v1/auth/login', json={
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+    data = json.loads(response.data)
+    return data['access_token']
+
+def test_deposit_queues_receipt(client, smtp_server):
+    """Test that a deposit writes its receipt to the outbox instead of sending it"""
+    token = get_auth_token(client)
+    
+    response = client.post('/api/v1/transactions/deposit', json={
+        'account_id': 1,
+        'amount': 25.00,
+        'type': 'Deposit'
+    }, headers={'Authorization': f'Bearer {token}'})
+    
+    assert response.status_code == 201
+    assert smtp_server.messages == []
+    
+    with client.application.app_context():
+        messages = EmailOutbox.query.all()
+        assert len(messages) == 1
+        assert messages[0].status == 'pending'
+        assert messages[0].to_email == 'test@example.com'
+        assert messages[0].subject == 'Deposit Receipt - $25.00'
+        assert '•••• 7890' in messages[0].html_content
+
+def test_failed_withdrawal_queues_nothing(client):
+    """Test that outbox rows roll back with the rest of the request"""
+    token = get_auth_token(client)
+    
+    response = client.post('/api/v1/transactions/withdraw', json={
+        'account_id': 1,
+        'amount': 5000.00,
+        'type': 'Withdrawal'
+    }, headers={'Authorization': f'Bearer {token}'})
+    
+    assert response.status_code == 400
+    with client.application.app_context():
+        assert EmailOutbox.query.count() == 0
+
+def test_email_worker_delivers_outbox(client, smtp_server):
+    """Test that the worker drains the outbox through SMTP"""
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    for amount in (10, 20, 30):
+        client.post('/api/v1/transactions/deposit', json={
+            'account_id': 1,
+            'amount': amount,
+            'type': 'Deposit'
+        }, headers=headers)
+    
+    with client.application.app_context():
+        totals = EmailOutboxWorker(workers=2, batch_size=2).run(once=True)
+        
+        assert totals == {'sent': 3, 'merged': 0, 'failed': 0}
+        assert len(smtp_server.messages) == 3
+        assert all(recipients == ['test@example.com'] for recipients, _ in smtp_server.messages)
+        assert {message.status for message in EmailOutbox.query.all()} == {'sent'}
+
+def test_email_worker_retries_with_backoff(client, smtp_server):
+    """Test that a rejected message is retried later rather than lost"""
+    smtp_server.reject_next = 1
+    
+    with client.application.app_context():
+        from app.services import EmailService
+        EmailService.queue_email('test@example.com', 'Hello', '<p>Hello</p>')
+        worker = EmailOutboxWorker(workers=1, batch_size=10)
+        
+        assert worker.run(once=True) == {'sent': 0, 'merged': 0, 'failed': 1}
+        message = EmailOutbox.query.one()
+        assert message.status == 'pending'
+        assert message.attempts == 1
+        assert '451' in message.last_error
+        assert message.next_attempt_at > datetime.utcnow()
+        
+        # Not due yet, so nothing is picked up
+        assert worker.run(once=True) == {'sent': 0, 'merged': 0, 'failed': 0}
+        
+        message.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        
+        assert worker.run(once=True) == {'sent': 1, 'merged': 0, 'failed': 0}
+        message = EmailOutbox.query.one()
+        assert message.status == 'sent'
+        assert message.attempts == 2
+        assert len(smtp_server.messages) == 1
+
+def test_email_worker_merges_alerts_into_digest(client, smtp_server):
+    """Test that alerts buffered for one user go out as a single digest"""
+    with client.application.app_context():
+        from app.services import EmailService
+        first = EmailService.queue_alert_notification('test@example.com', 'large_deposit', 'Deposit of $5,000.00')
+        EmailService.queue_alert_notification('test@example.com', 'low_balance', 'Balance below $100.00')
+        EmailService.queue_alert_notification('test@example.com', 'large_deposit', 'Deposit of $7,500.00')
+        EmailService.queue_alert_notification('other@example.com', 'low_balance', 'Balance below $100.00')
+        EmailService.queue_email('test@example.com', 'Hello', '<p>Hello</p>')
+        worker = EmailOutboxWorker(workers=2, batch_size=10)
+        
+        # Alerts wait out the digest window; only the plain email is due
+        assert worker.run(once=True) == {'sent': 1, 'merged': 0, 'failed': 0}
+        
+        # The first alert's window closes, taking the later ones with it
+        first.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        
+        assert worker.run(once=True) == {'sent': 1, 'merged': 2, 'failed': 0}
+        assert len(smtp_server.messages) == 2
+        recipients, body = smtp_server.messages[1]
+        assert recipients == ['test@example.com']
+        digest = email.message_from_string(body)
+        text = digest.get_payload()[0].get_payload(decode=True).decode()
+        assert digest['Subject'] == 'EverTrust Bank: 3 new alerts'
+        assert text.startswith('You have 3 new alerts')
+        assert '$5,000.00' in text and '$7,500.00' in text and 'Low Balance' in text
+        
+        assert EmailOutboxWorker.stats() == {'sent': 2, 'merged': 2, 'pending': 1}
+
+def test_critical_alert_bypasses_digest_window(client, smtp_server):
+    """Test that bypass alert types are sent straight away on their own"""
+    with client.application.app_context():
+        from app.services import EmailService
+        EmailService.queue_alert_notification('test@example.com', 'low_balance', 'Balance below $100.00')
+        EmailService.queue_alert_notification('test@example.com', 'large_withdrawal', 'Withdrawal of $9,000.00')
+        
+        totals = EmailOutboxWorker(workers=1, batch_size=10).run(once=True)
+        
+        assert totals == {'sent': 1, 'merged': 0, 'failed': 0}
+        assert 'Subject: EverTrust Bank Alert: Large Withdrawal' in smtp_server.messages[0][1]
+        assert EmailOutbox.query.filter_by(status='pending').one().category == 'alert'
+
+def test_email_templates_render_multipart():
+    """Test that templates render a subject, escaped HTML and plain text"""
+    from app.services import EmailService
+    
+    subject, html, text = EmailService.render_alert_notification('low_balance', 'Balance <b>low</b>', '•••• 7890')
+    
+    assert subject == 'EverTrust Bank Alert: Low Balance'
+    assert 'Balance &lt;b&gt;low&lt;/b&gt;' in html
+    assert '•••• 7890' in html
+    assert 'Balance <b>low</b>' in text
+    assert f'© {datetime.now().year} EverTrust Bank' in text
+    
+    message = EmailService.build_message('bank@example.com', 'test@example.com', subject, html, text)
+    assert 'multipart/alternative' in message
+    assert message.index('text/plain') < message.index('text/html')
+
+def test_email_templates_render_many():
+    """Test batch rendering of one template for many recipients"""
+    from app.services import EmailService
+    
+    rendered = EmailService.render_many('welcome', [{'user_name': 'Ada'}, {'user_name': 'Grace'}])
+    
+    assert [subject for subject, _, _ in rendered] == ['Welcome to EverTrust Bank!'] * 2
+    assert 'Hello Ada!' in rendered[0][1] and 'Hello Grace!' in rendered[1][1]
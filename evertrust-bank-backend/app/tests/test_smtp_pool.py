@@ -0,0 +1,128 @@
+import pytest
+import socket
+import threading
+from app.services.smtp_pool import SMTPConnectionPool
+
+pytest.importorskip('aiosmtpd')
+from aiosmtpd.controller import Controller
+
+class RecordingHandler:
+    """aiosmtpd handler that records deliveries and counts SMTP sessions"""
+    
+    def __init__(self):
+        self.messages = []
+        self.sessions = 0
+        self.lock = threading.Lock()
+    
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        with self.lock:
+            self.sessions += 1
+        return responses
+    
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('reject'):
+            return '550 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+    
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            self.messages.append(envelope.rcpt_tos)
+        return '250 OK'
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    yield controller
+    controller.stop()
+
+def make_pool(controller, **kwargs):
+    return SMTPConnectionPool(controller.hostname, controller.port, use_tls=False, timeout=5, **kwargs)
+
+def message(to):
+    return f'From: bank@example.com\r\nTo: {to}\r\nSubject: Test\r\n\r\nHello\r\n'
+
+def test_pool_reuses_connection(smtp_server):
+    """Test that consecutive batches share one authenticated session"""
+    pool = make_pool(smtp_server, size=2)
+    
+    errors = pool.send_many('bank@example.com', [(['a@example.com'], message('a@example.com'))] * 5)
+    errors += pool.send_many('bank@example.com', [(['b@example.com'], message('b@example.com'))] * 5)
+    pool.close()
+    
+    assert errors == [None] * 10
+    assert len(smtp_server.handler.messages) == 10
+    assert smtp_server.handler.sessions == 1
+
+def test_pool_retires_connection_after_max_messages(smtp_server):
+    """Test that a session is replaced once it reaches its message budget"""
+    pool = make_pool(smtp_server, size=1, max_messages=3)
+    
+    errors = pool.send_many('bank@example.com', [(['a@example.com'], message('a@example.com'))] * 7)
+    pool.close()
+    
+    assert errors == [None] * 7
+    assert smtp_server.handler.sessions == 3
+
+def test_pool_reconnects_after_dropped_connection(smtp_server):
+    """Test that a dead pooled connection is replaced transparently"""
+    pool = make_pool(smtp_server, size=1)
+    pool.send('bank@example.com', ['a@example.com'], message('a@example.com'))
+    
+    # Simulate the server timing out the idle session
+    pool._idle.queue[0].smtp.sock.shutdown(socket.SHUT_RDWR)
+    
+    pool.send('bank@example.com', ['a@example.com'], message('a@example.com'))
+    pool.close()
+    
+    assert len(smtp_server.handler.messages) == 2
+    assert smtp_server.handler.sessions == 2
+
+def test_pool_refused_message_does_not_stop_batch(smtp_server):
+    """Test that a refused recipient fails only its own message"""
+    pool = make_pool(smtp_server, size=1)
+    
+    errors = pool.send_many('bank@example.com', [
+        (['a@example.com'], message('a@example.com')),
+        (['reject@example.com'], message('reject@example.com')),
+        (['b@example.com'], message('b@example.com')),
+    ])
+    pool.close()
+    
+    assert errors[0] is None and errors[2] is None
+    assert errors[1] is not None
+    assert smtp_server.handler.messages == [['a@example.com'], ['b@example.com']]
+    assert smtp_server.handler.sessions == 1
+
+def test_pool_is_bounded(smtp_server):
+    """Test that concurrent senders never open more than `size` sessions"""
+    pool = make_pool(smtp_server, size=2)
+    
+    def send():
+        pool.send_many('bank@example.com', [(['a@example.com'], message('a@example.com'))] * 5)
+    
+    threads = [threading.Thread(target=send) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.close()
+    
+    assert len(smtp_server.handler.messages) == 40
+    assert smtp_server.handler.sessions <= 2
+
+def test_pool_unreachable_server_fails_batch():
+    """Test that an unreachable server fails every message without hanging"""
+    pool = SMTPConnectionPool('127.0.0.1', free_port(), size=1, use_tls=False, timeout=1)
+    
+    errors = pool.send_many('bank@example.com', [(['a@example.com'], message('a@example.com'))] * 3)
+    
+    assert all(isinstance(error, ConnectionError) for error in errors)
@@ -0,0 +1,266 @@
+import pytest
+import json
+import os
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from app import create_app, db
+from app.models import User, Account, Transaction, StatementJob
+from app.services import LedgerService, StatementJobService, StatementRunService
+
+@pytest.fixture(params=[1, 0], ids=['process-pool', 'in-request'])
+def client(request, tmp_path, monkeypatch):
+    # A file database: render processes open their own connections
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "statements.db"}')
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+    app.config['AUDIT_DURABILITY'] = 'sync'
+    app.config['STATEMENT_WORKERS'] = request.param
+    app.config['STATEMENT_CACHE_DIR'] = str(tmp_path / 'statements')
+    
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            for email in ('test@example.com', 'other@example.com'):
+                user = User(name='Test User', email=email)
+                user.set_password('password123')
+                db.session.add(user)
+            db.session.flush()
+            
+            account = Account(user_id=1, type='Checking', number='1234567890', balance=1000.00)
+            db.session.add(account)
+            db.session.commit()
+        yield client
+        
+        with app.app_context():
+            StatementJobService.shutdown()
+
+def get_auth_token(client, email='test@example.com'):
+    """Helper to get authentication token"""
+    response = client.post('/api/v1/auth/login', json={
+        'email': email,
+        'password': 'password123'
+    })
+    data = json.loads(response.data)
+    return data['access_token']
+
+def request_statement(client, headers):
+    return client.post('/api/v1/statements/generate', json={
+        'account_id': 1,
+        'start_date': '2020-01-01',
+        'end_date': '2099-12-31'
+    }, headers=headers)
+
+def wait_for_statement(client, job_id, headers, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get(f'/api/v1/statements/{job_id}', headers=headers)
+        if response.status_code != 202 or time.monotonic() > deadline:
+            return response
+        time.sleep(0.1)
+
+def test_statement_is_rendered_in_background_and_cached(client):
+    """Test a queued statement is downloadable once rendered and repeat requests reuse the file"""
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/v1/transactions/deposit', json={
+        'account_id': 1,
+        'type': 'Deposit',
+        'amount': 25.00,
+        'description': 'Paycheck'
+    }, headers=headers)
+    
+    response = request_statement(client, headers)
+    assert response.status_code == (202 if client.application.config['STATEMENT_WORKERS'] else 200)
+    job_id = json.loads(response.data)['job_id']
+    
+    response = wait_for_statement(client, job_id, headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert response.data.startswith(b'%PDF')
+    assert 'statement_1234567890_2020-01-01_2099-12-31.pdf' in response.headers['Content-Disposition']
+    
+    # Same account, period and transactions: served from the cache without rendering
+    response = request_statement(client, headers)
+    assert response.status_code == 200
+    assert json.loads(response.data)['status'] == 'done'
+    with client.application.app_context():
+        cache_keys = {job.cache_key for job in StatementJob.query.all()}
+        assert len(cache_keys) == 1
+    
+    # A new transaction changes the key, so the statement is rendered again
+    client.post('/api/v1/transactions/deposit', json={
+        'account_id': 1,
+        'type': 'Deposit',
+        'amount': 10.00,
+        'description': 'Refund'
+    }, headers=headers)
+    job_id = json.loads(request_statement(client, headers).data)['job_id']
+    assert wait_for_statement(client, job_id, headers).status_code == 200
+    assert len(os.listdir(client.application.config['STATEMENT_CACHE_DIR'])) == 2
+
+def test_statement_job_belongs_to_requester(client):
+    """Test another user cannot see or download a statement job"""
+    headers = {'Authorization': f'Bearer {get_auth_token(client)}'}
+    job_id = json.loads(request_statement(client, headers).data)['job_id']
+    wait_for_statement(client, job_id, headers)
+    
+    other_headers = {'Authorization': f"Bearer {get_auth_token(client, 'other@example.com')}"}
+    assert client.get(f'/api/v1/statements/{job_id}', headers=other_headers).status_code == 404
+    assert request_statement(client, other_headers).status_code == 404
+
+def test_expired_statement_must_be_generated_again(client):
+    """Test a statement cached longer than STATEMENT_CACHE_TTL answers 410 and is pruned"""
+    headers = {'Authorization': f'Bearer {get_auth_token(client)}'}
+    job_id = json.loads(request_statement(client, headers).data)['job_id']
+    assert wait_for_statement(client, job_id, headers).status_code == 200
+    
+    cache_dir = client.application.config['STATEMENT_CACHE_DIR']
+    [path] = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+    rendered_at = time.time() - client.application.config['STATEMENT_CACHE_TTL'].total_seconds() - 60
+    os.utime(path, (rendered_at, rendered_at))
+    
+    assert client.get(f'/api/v1/statements/{job_id}', headers=headers).status_code == 410
+    with client.application.app_context():
+        assert StatementJobService.prune_cache() == 1
+    assert os.listdir(cache_dir) == []
+    
+    job_id = json.loads(request_statement(client, headers).data)['job_id']
+    assert wait_for_statement(client, job_id, headers).status_code == 200
+
+def test_stuck_jobs_are_failed_after_the_timeout(client):
+    """Test jobs left queued or running by a render process that died are failed, not polled forever"""
+    headers = {'Authorization': f'Bearer {get_auth_token(client)}'}
+    start_date, end_date = date(2020, 1, 1), date(2099, 12, 31)
+    with client.application.app_context():
+        long_ago = datetime.utcnow() - client.application.config['STATEMENT_JOB_TIMEOUT'] - timedelta(minutes=1)
+        cache_key = StatementJobService.cache_key(1, start_date, end_date)
+        db.session.add_all([
+            StatementJob(id='stuckqueued', user_id=1, account_id=1, start_date=start_date, end_date=end_date,
+                         cache_key=cache_key, status='queued', created_at=long_ago),
+            StatementJob(id='stuckrunning', user_id=1, account_id=1, start_date=start_date, end_date=end_date,
+                         cache_key=cache_key, status='running', created_at=long_ago, started_at=long_ago)
+        ])
+        db.session.commit()
+    
+    # A new request gets a job of its own rather than waiting on the stuck ones
+    job_id = json.loads(request_statement(client, headers).data)['job_id']
+    assert job_id not in ('stuckqueued', 'stuckrunning')
+    assert wait_for_statement(client, job_id, headers).status_code == 200
+    
+    response = client.get('/api/v1/statements/stuckqueued', headers=headers)
+    assert response.status_code == 500
+    assert json.loads(response.data)['status'] == 'failed'
+    
+    with client.application.app_context():
+        assert StatementJobService.reap_stale() == 1
+        assert db.session.get(StatementJob, 'stuckrunning').error == 'timed out'
+        # A reaped job that reaches a render process late is not rendered
+        StatementJobService.render('stuckqueued')
+        assert db.session.get(StatementJob, 'stuckqueued').status == 'failed'
+
+def add_transactions(count, start=datetime(2025, 1, 1)):
+    db.session.execute(Transaction.__table__.insert(), [{
+        'account_id': 1,
+        'type': ('Deposit', 'Withdrawal', 'Transfer')[index % 3],
+        'direction': 'credit' if index % 3 == 0 else 'debit',
+        'amount': '10.00',
+        'description': f'Card payment {index}',
+        'created_at': start + timedelta(minutes=index)
+    } for index in range(count)])
+    db.session.commit()
+
+def test_statement_rows_and_balances(client, tmp_path):
+    """Test the streamed statement runs balances forward from the period's opening balance"""
+    with client.application.app_context():
+        add_transactions(3)
+        add_transactions(1, start=datetime(2025, 3, 1))  # After the period
+        account = db.session.get(Account, 1)
+        
+        # 1000.00 now; the four transactions net +10 - 10 - 10 + 10 = 0
+        assert LedgerService.balance_at(account, datetime(2025, 1, 1)) == Decimal('1000.00')
+        assert LedgerService.balance_at(account, datetime(2025, 2, 1)) == Decimal('990.00')
+        
+        path = tmp_path / 'statement.pdf'
+        with open(path, 'wb') as output:
+            pages = StatementJobService.write_statement(account, date(2025, 1, 1), date(2025, 1, 31), output)
+    
+    assert pages == 1
+    content = path.read_bytes()
+    assert content.startswith(b'%PDF-1.4') and content.rstrip().endswith(b'%%EOF')
+    
+    # Every cross-reference entry points at its object
+    xref = int(content[content.rindex(b'startxref') + len(b'startxref'):].split()[0])
+    entries = content[xref:].split(b'\n')[3:]
+    for object_id, entry in enumerate(entries, start=1):
+        if not entry.endswith(b' n '):
+            break
+        offset = int(entry.split()[0])
+        assert content[offset:].startswith(f'{object_id} 0 obj'.encode())
+
+def test_statement_memory_stays_bounded(client):
+    """Test peak memory while rendering does not grow with the number of transactions"""
+    class Discard:
+        def write(self, data):
+            pass
+    
+    with client.application.app_context():
+        account = db.session.get(Account, 1)
+        
+        def measure():
+            tracemalloc.start()
+            pages = StatementJobService.write_statement(account, date(2025, 1, 1), date(2025, 12, 31), Discard())
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return pages, peak
+        
+        add_transactions(2000)
+        small_pages, small_peak = measure()
+        add_transactions(18000, start=datetime(2025, 2, 1))
+        large_pages, large_peak = measure()
+    
+    assert large_pages > 9 * small_pages
+    assert large_peak < 1.5 * small_peak
+
+def test_month_end_run_writes_manifest_and_resumes(client, tmp_path):
+    """Test a bulk run renders every account once and a rerun only picks up what is missing"""
+    app = client.application
+    run_dir = tmp_path / 'run'
+    
+    with app.app_context():
+        for number in range(4):
+            db.session.add(Account(user_id=2, type='Savings', number=f'20000000{number:02d}', balance=50))
+        Account.query.update({'created_at': datetime(2024, 12, 1)})
+        db.session.add(Account(user_id=2, type='Savings', number='3000000000', balance=0,
+                               created_at=datetime(2025, 2, 1)))  # Opened after the period
+        db.session.commit()
+        add_transactions(3)
+        
+        summary = StatementRunService.run(date(2025, 1, 1), date(2025, 1, 31), run_dir,
+                                          workers=app.config['STATEMENT_WORKERS'], chunk_size=2)
+    
+    assert (summary['rendered'], summary['failed'], summary['skipped']) == (5, 0, 0)
+    entries = [json.loads(line) for line in (run_dir / 'manifest.jsonl').read_text().splitlines()]
+    assert sorted(entry['account_id'] for entry in entries) == [1, 2, 3, 4, 5]
+    for entry in entries:
+        assert entry['status'] == 'done' and entry['pages'] == 1
+        assert (run_dir / entry['file']).stat().st_size == entry['bytes']
+    assert not [name for name in os.listdir(run_dir) if name.endswith('.partial')]
+    
+    # Interrupted run: one statement never made it to disk, the manifest's last line is torn
+    os.remove(run_dir / entries[0]['file'])
+    with open(run_dir / 'manifest.jsonl', 'a') as manifest:
+        manifest.write('{"account_id": 3, "sta')
+    
+    with app.app_context():
+        summary = StatementRunService.run(date(2025, 1, 1), date(2025, 1, 31), run_dir,
+                                          workers=app.config['STATEMENT_WORKERS'], chunk_size=2)
+    assert (summary['rendered'], summary['skipped']) == (1, 4)
+    assert (run_dir / entries[0]['file']).exists()
+    
+    # The torn line was closed off before new entries were appended
+    lines = (run_dir / 'manifest.jsonl').read_text().splitlines()
+    assert lines[-2] == '{"account_id": 3, "sta'
+    assert json.loads(lines[-1])['account_id'] == 1
@@ -1,7 +1,10 @@
 import pytest
 import json
+from decimal import Decimal
+from datetime import datetime
 from app import create_app, db
 from app.models import User, Account
+from sqlalchemy import event
 
 @pytest.fixture
 def client():
@@ -39,6 +42,7 @@ def test_deposit_transaction(client):
     
     response = client.post('/api/v1/transactions/deposit', json={
         'account_id': 1,
+        'type': 'Deposit',
         'amount': 500.00,
         'description': 'Test deposit'
     }, headers={
@@ -56,6 +60,7 @@ def test_insufficient_funds(client):
     
     response = client.post('/api/v1/transactions/withdraw', json={
         'account_id': 1,
+        'type': 'Withdrawal',
         'amount': 2000.00,
         'description': 'Large withdrawal'
     }, headers={
@@ -64,4 +69,610 @@ def test_insufficient_funds(client):
     
     assert response.status_code == 400
     data = json.loads(response.data)
-    assert 'Insufficient funds' in data['message']
\ No newline at end of file
+    assert 'Insufficient funds' in data['message']
+
+def test_cursor_pagination(client):
+    """Test walking transaction history with next_cursor"""
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    
+    for amount in range(1, 6):
+        client.post('/api/v1/transactions/deposit', json={
+            'account_id': 1,
+            'amount': amount,
+            'type': 'Deposit'
+        }, headers=headers)
+    
+    seen = []
+    url = '/api/v1/transactions?limit=2'
+    while url:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        seen.extend(tx['id'] for tx in data['transactions'])
+        url = f"/api/v1/transactions?limit=2&cursor={data['next_cursor']}" if data['has_more'] else None
+    
+    assert seen == sorted(seen, reverse=True)
+    assert len(seen) == len(set(seen)) == 5
+
+def test_invalid_cursor(client):
+    """Test that a malformed cursor is rejected"""
+    token = get_auth_token(client)
+    
+    response = client.get('/api/v1/transactions?cursor=not-a-cursor', headers={
+        'Authorization': f'Bearer {token}'
+    })
+    
+    assert response.status_code == 400
+
+def test_total_count_from_counter(client):
+    """Test that unfiltered listings report the per-account counter"""
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    
+    for amount in (10, 20, 30):
+        client.post('/api/v1/transactions/deposit', json={
+            'account_id': 1,
+            'amount': amount,
+            'type': 'Deposit'
+        }, headers=headers)
+    
+    response = client.get('/api/v1/transactions?limit=2', headers=headers)
+    data = json.loads(response.data)
+    assert data['total_count'] == 3
+    assert data['has_more'] is True
+    
+    response = client.get('/api/v1/transactions?type=Deposit', headers=headers)
+    assert json.loads(response.data)['total_count'] is None
+    
+    response = client.get('/api/v1/transactions?type=Deposit&count=exact', headers=headers)
+    assert json.loads(response.data)['total_count'] == 3
+
+def test_transaction_listing_is_single_query(client):
+    """Test that listing transactions issues one SQL statement"""
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    
+    client.post('/api/v1/transactions/deposit', json={
+        'account_id': 1,
+        'amount': 25.00,
+        'type': 'Deposit'
+    }, headers=headers)
+    
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    with client.application.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get('/api/v1/transactions?accountId=1', headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    
+    assert response.status_code == 200
+    assert len(json.loads(response.data)['transactions']) == 1
+    assert len(statements) == 1, statements
+
+def test_deposit_commits_once(client):
+    """Test that a deposit makes its ledger, audit and alert rows durable in one commit"""
+    token = get_auth_token(client)
+    
+    commits = []
+    
+    def record(conn):
+        commits.append(1)
+    
+    with client.application.app_context():
+        engine = db.engine
+    event.listen(engine, 'commit', record)
+    try:
+        response = client.post('/api/v1/transactions/deposit', json={
+            'account_id': 1,
+            'amount': 5000.00,
+            'type': 'Deposit'
+        }, headers={
+            'Authorization': f'Bearer {token}'
+        })
+    finally:
+        event.remove(engine, 'commit', record)
+    
+    assert response.status_code == 201
+    assert len(commits) == 1
+
+def test_batch_postings(client):
+    """Test bulk postings with per-item results"""
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    
+    response = client.post('/api/v1/transactions/batch', json={'postings': [
+        {'account_id': 1, 'type': 'Deposit', 'amount': 250.00},
+        {'account_id': 1, 'type': 'Withdrawal', 'amount': 1200.00},
+        {'account_id': 1, 'type': 'Withdrawal', 'amount': 100.00},
+        {'account_id': 99, 'type': 'Deposit', 'amount': 10.00},
+        {'account_id': 1, 'type': 'Deposit', 'amount': -5}
+    ]}, headers=headers)
+    
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    assert data['posted'] == 2
+    assert [r['status'] for r in data['results']] == ['posted', 'posted', 'rejected', 'rejected', 'rejected']
+    
+    response = client.get('/api/v1/accounts/1', headers=headers)
+    assert json.loads(response.data)['balance'] == '50.00'
+    
+    response = client.get('/api/v1/transactions', headers=headers)
+    assert json.loads(response.data)['total_count'] == 2
+
+def test_batch_balance_after_of_sharded_account(client):
+    """Test batch rows record balance_after for a locked account and leave it unset for a sharded one"""
+    from app.services import LedgerService
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    with client.application.app_context():
+        savings = Account(user_id=1, type='Savings', number='5555555555', balance=50.00)
+        db.session.add(savings)
+        db.session.flush()
+        LedgerService.enable_sharding(savings, 4)
+        db.session.commit()
+    
+    response = client.post('/api/v1/transactions/batch', json={'postings': [
+        {'account_id': 1, 'type': 'Deposit', 'amount': 250.00},
+        {'account_id': 2, 'type': 'Deposit', 'amount': 25.00},
+        {'account_id': 1, 'type': 'Withdrawal', 'amount': 100.00},
+        {'account_id': 2, 'type': 'Withdrawal', 'amount': 60.00}
+    ]}, headers=headers)
+    assert response.status_code == 201
+    assert json.loads(response.data)['posted'] == 4
+    
+    with client.application.app_context():
+        assert balances_after() == [
+            (1, 'Deposit', '1250.00'),
+            (2, 'Deposit', 'None'),
+            (1, 'Withdrawal', '1150.00'),
+            (2, 'Withdrawal', 'None')
+        ]
+        assert db.session.get(Account, 2).total_balance == Decimal('15.00')
+
+def test_idempotent_deposit_replay(client):
+    """Test that retrying a deposit with the same Idempotency-Key posts once"""
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}', 'Idempotency-Key': 'retry-123'}
+    payload = {'account_id': 1, 'amount': 40.00, 'type': 'Deposit'}
+    
+    first = client.post('/api/v1/transactions/deposit', json=payload, headers=headers)
+    second = client.post('/api/v1/transactions/deposit', json=payload, headers=headers)
+    
+    assert first.status_code == second.status_code == 201
+    assert second.headers.get('Idempotent-Replayed') == 'true'
+    assert json.loads(second.data) == json.loads(first.data)
+    
+    response = client.get('/api/v1/accounts/1', headers={'Authorization': f'Bearer {token}'})
+    assert json.loads(response.data)['balance'] == '1040.00'
+    
+    payload['amount'] = 41.00
+    conflict = client.post('/api/v1/transactions/deposit', json=payload, headers=headers)
+    assert conflict.status_code == 422
+
+def test_idempotency_key_is_stored_with_the_postings(client, monkeypatch):
+    """Test the key is completed in the deposit's own commit, so a failure afterwards still replays it"""
+    from app.services import UnitOfWork
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}', 'Idempotency-Key': 'crash-after-commit'}
+    payload = {'account_id': 1, 'amount': 40.00, 'type': 'Deposit'}
+    
+    commit = UnitOfWork.commit
+    def commit_then_fail(self):
+        commit(self)
+        raise RuntimeError('worker lost after commit')
+    monkeypatch.setattr(UnitOfWork, 'commit', commit_then_fail)
+    assert client.post('/api/v1/transactions/deposit', json=payload, headers=headers).status_code == 500
+    monkeypatch.undo()
+    
+    retry = client.post('/api/v1/transactions/deposit', json=payload, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers.get('Idempotent-Replayed') == 'true'
+    response = client.get('/api/v1/accounts/1', headers={'Authorization': f'Bearer {token}'})
+    assert json.loads(response.data)['balance'] == '1040.00'
+
+def test_in_progress_idempotency_key_is_not_taken_over(client):
+    """Test a claim still in progress is waited on, however old, rather than executed a second time"""
+    import hashlib
+    from datetime import timedelta
+    from app.models import IdempotencyKey
+    client.application.config['IDEMPOTENCY_WAIT_TIMEOUT'] = 0.2
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}', 'Idempotency-Key': 'slow-request',
+               'Content-Type': 'application/json'}
+    body = json.dumps({'account_id': 1, 'amount': 40.00, 'type': 'Deposit'})
+    
+    with client.application.app_context():
+        claimed_at = datetime.utcnow() - timedelta(minutes=10)
+        request_hash = hashlib.sha256(b'POST/api/v1/transactions/deposit' + body.encode('utf-8')).hexdigest()
+        db.session.add(IdempotencyKey(user_id=1, key='slow-request', request_hash=request_hash,
+                                      status='in_progress', created_at=claimed_at,
+                                      expires_at=claimed_at + timedelta(hours=24)))
+        db.session.commit()
+    
+    response = client.post('/api/v1/transactions/deposit', data=body, headers=headers)
+    assert response.status_code == 409
+    response = client.get('/api/v1/accounts/1', headers={'Authorization': f'Bearer {token}'})
+    assert json.loads(response.data)['balance'] == '1000.00'
+
+def test_unit_of_work_closed_on_not_found(client, monkeypatch):
+    """Test a posting to an unknown account leaves no unit of work open on the session"""
+    from app.services import UnitOfWork
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    
+    sessions = []
+    init = UnitOfWork.__init__
+    def record_session(self, session=None):
+        init(self, session)
+        sessions.append(db.session())
+    monkeypatch.setattr(UnitOfWork, '__init__', record_session)
+    
+    assert client.post('/api/v1/transactions/deposit', json={
+        'account_id': 999, 'amount': 40.00, 'type': 'Deposit'
+    }, headers=headers).status_code == 404
+    assert client.post('/api/v1/transactions/withdraw', json={
+        'account_id': 999, 'amount': 40.00, 'type': 'Withdrawal'
+    }, headers=headers).status_code == 404
+    assert client.post('/api/v1/transactions/transfer/internal', json={
+        'from_account_id': 1, 'to_account_id': 999, 'amount': 40.00
+    }, headers=headers).status_code == 404
+    
+    assert len(sessions) == 3
+    assert all(UnitOfWork.SESSION_KEY not in session.info for session in sessions)
+
+def test_user_context_loaded_once_per_request(client):
+    """Test that a deposit looks up the user and alert preferences once"""
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/api/v1/alerts/preferences', headers=headers)
+    
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    with client.application.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.post('/api/v1/transactions/deposit', json={
+            'account_id': 1,
+            'amount': 1500.00,
+            'type': 'Deposit'
+        }, headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    
+    assert response.status_code == 201
+    selects = [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+    assert len([s for s in selects if 'FROM users' in s]) == 1, selects
+    assert not [s for s in selects if 'FROM alert_prefs' in s], selects
+
+def test_user_context_of_missing_user_raises(client):
+    """Test a context for a user that no longer exists fails clearly instead of returning None"""
+    from app.services import UserContextService, UnknownUserError
+    with client.application.test_request_context():
+        assert UserContextService.get(1).user.email == 'test@example.com'
+        with pytest.raises(UnknownUserError):
+            UserContextService.get(99)
+
+def test_user_context_cache_invalidated_on_prefs_update(client):
+    """Test that updating alert preferences takes effect with the process cache on"""
+    from app.services import UserContextService
+    client.application.config['USER_CONTEXT_CACHE_TTL'] = 60
+    UserContextService.clear()
+    
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    payload = {'account_id': 1, 'amount': 1500.00, 'type': 'Deposit'}
+    
+    try:
+        client.get('/api/v1/alerts/preferences', headers=headers)
+        client.post('/api/v1/transactions/deposit', json=payload, headers=headers)
+        assert len(json.loads(client.get('/api/v1/alerts', headers=headers).data)) == 1
+        
+        response = client.patch('/api/v1/alerts/preferences', json={'large_tx': False}, headers=headers)
+        assert response.status_code == 200
+        
+        client.post('/api/v1/transactions/deposit', json=payload, headers=headers)
+        assert len(json.loads(client.get('/api/v1/alerts', headers=headers).data)) == 1
+    finally:
+        UserContextService.clear()
+
+def post_history(client, headers):
+    """Deposit, withdraw, batch and transfer into a second account"""
+    with client.application.app_context():
+        savings = Account(user_id=1, type='Savings', number='5555555555', balance=50.00)
+        db.session.add(savings)
+        db.session.commit()
+    
+    for path, payload in (
+        ('deposit', {'account_id': 1, 'type': 'Deposit', 'amount': 500.00}),
+        ('withdraw', {'account_id': 1, 'type': 'Withdrawal', 'amount': 200.00}),
+        ('batch', {'postings': [
+            {'account_id': 1, 'type': 'Deposit', 'amount': 25.00},
+            {'account_id': 1, 'type': 'Withdrawal', 'amount': 5.00}
+        ]})
+    ):
+        response = client.post(f'/api/v1/transactions/{path}', json=payload, headers=headers)
+        assert response.status_code in (200, 201), response.get_data(as_text=True)
+    response = client.post('/api/v1/transactions/transfer/internal', json={
+        'from_account_id': 1,
+        'to_account_id': 2,
+        'amount': 100.00
+    }, headers=headers)
+    assert response.status_code == 201
+
+def balances_after():
+    from app.models import Transaction
+    return [(tx.account_id, tx.type, str(tx.balance_after))
+            for tx in Transaction.query.order_by(Transaction.id)]
+
+def test_postings_store_balance_after(client):
+    """Test every posting records the balance it produced"""
+    from app.models import Transaction
+    
+    token = get_auth_token(client)
+    post_history(client, {'Authorization': f'Bearer {token}'})
+    
+    with client.application.app_context():
+        assert balances_after() == [
+            (1, 'Deposit', '1500.00'),
+            (1, 'Withdrawal', '1300.00'),
+            (1, 'Deposit', '1325.00'),
+            (1, 'Withdrawal', '1320.00'),
+            (1, 'Transfer', '1220.00'),
+            (2, 'Transfer', '150.00')
+        ]
+        legs = Transaction.query.filter_by(type='Transfer').order_by(Transaction.id)
+        assert [(tx.account_id, tx.direction) for tx in legs] == [(1, 'debit'), (2, 'credit')]
+
+def test_backfill_and_balance_at(client):
+    """Test the backfill rebuilds balance_after and balance_at reads it back"""
+    from datetime import timedelta
+    from app.models import Transaction
+    from app.services import LedgerService
+    
+    token = get_auth_token(client)
+    post_history(client, {'Authorization': f'Bearer {token}'})
+    
+    with client.application.app_context():
+        expected = balances_after()
+        transactions = Transaction.query.order_by(Transaction.id).all()
+        account = db.session.get(Account, 1)
+        
+        Transaction.query.update({'balance_after': None})
+        db.session.commit()
+        # Not backfilled yet: worked back from the current balance
+        assert LedgerService.balance_at(account, transactions[2].created_at) == Decimal('1300.00')
+        
+        assert LedgerService.backfill_all(workers=0) == (2, 6)
+        assert balances_after() == expected
+        assert LedgerService.backfill_all(workers=0) == (0, 0)
+        
+        assert LedgerService.balance_at(account, transactions[0].created_at) == Decimal('1000.00')
+        assert LedgerService.balance_at(account, transactions[2].created_at) == Decimal('1300.00')
+        assert LedgerService.balance_at(account, datetime.utcnow() + timedelta(days=1)) == Decimal('1220.00')
+        
+        # A wrong stored value is only replaced when recomputing
+        transactions[1].balance_after = Decimal('1.00')
+        db.session.commit()
+        assert LedgerService.backfill_all(workers=0, recompute=True) == (2, 1)
+        assert balances_after() == expected
+
+def test_backfill_signs_interleaved_transfer_legs(client):
+    """Test transfer legs are signed by their recorded direction, however their ids interleave"""
+    from datetime import timedelta
+    from app.models import Transaction
+    from app.services import LedgerService
+    
+    with client.application.app_context():
+        savings = Account(user_id=1, type='Savings', number='5555555555', balance=50.00)
+        db.session.add(savings)
+        db.session.commit()
+        
+        # Two opposing transfers of 30.00 whose legs were flushed interleaved:
+        # 1 -> 2 sends, 2 -> 1 sends, then both receiving legs
+        start = datetime(2025, 1, 1)
+        db.session.execute(Transaction.__table__.insert(), [
+            {'account_id': account_id, 'type': 'Transfer', 'direction': direction, 'amount': '30.00',
+             'counterparty': f'Account {counterparty}', 'created_at': start + timedelta(seconds=index)}
+            for index, (account_id, direction, counterparty) in enumerate([
+                (1, 'debit', '5555555555'),
+                (2, 'debit', '1234567890'),
+                (2, 'credit', '1234567890'),
+                (1, 'credit', '5555555555')
+            ])
+        ])
+        db.session.commit()
+        
+        assert LedgerService.backfill_all(workers=0) == (2, 4)
+        assert balances_after() == [
+            (1, 'Transfer', '970.00'),
+            (2, 'Transfer', '20.00'),
+            (2, 'Transfer', '50.00'),
+            (1, 'Transfer', '1000.00')
+        ]
+        assert LedgerService.balance_at(db.session.get(Account, 2), start) == Decimal('50.00')
+
+def test_sharded_postings_leave_balance_after_unset(client):
+    """Test postings to a sharded account store no balance_after until the backfill locks every shard"""
+    from app.models import Transaction
+    from app.services import LedgerService
+    
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    with client.application.app_context():
+        db.session.add(Account(user_id=1, type='Savings', number='5555555555', balance=50.00))
+        LedgerService.enable_sharding(db.session.get(Account, 1), 4)
+        db.session.commit()
+    
+    for path, payload in (
+        ('deposit', {'account_id': 1, 'type': 'Deposit', 'amount': 500.00}),
+        ('withdraw', {'account_id': 1, 'type': 'Withdrawal', 'amount': 200.00}),
+        ('transfer/internal', {'from_account_id': 1, 'to_account_id': 2, 'amount': 100.00})
+    ):
+        response = client.post(f'/api/v1/transactions/{path}', json=payload, headers=headers)
+        assert response.status_code == 201, response.get_data(as_text=True)
+    
+    with client.application.app_context():
+        assert balances_after() == [
+            (1, 'Deposit', 'None'),
+            (1, 'Withdrawal', 'None'),
+            (1, 'Transfer', 'None'),
+            (2, 'Transfer', '150.00')
+        ]
+        # Worked back from the sum of the shards instead
+        withdrawal = Transaction.query.filter_by(type='Withdrawal').one()
+        assert LedgerService.balance_at(db.session.get(Account, 1), withdrawal.created_at) == Decimal('1500.00')
+        
+        assert LedgerService.backfill_all(workers=0) == (1, 3)
+        assert balances_after() == [
+            (1, 'Deposit', '1500.00'),
+            (1, 'Withdrawal', '1300.00'),
+            (1, 'Transfer', '1200.00'),
+            (2, 'Transfer', '150.00')
+        ]
+
+def test_backfill_in_worker_processes(tmp_path, monkeypatch):
+    """Test the backfill fans accounts out over a process pool"""
+    from app.models import Transaction
+    from app.services import LedgerService
+    
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "backfill.db"}')
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(name='Test User', email='test@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+        for number in range(6):
+            account = Account(user_id=user.id, type='Checking', number=f'10000{number}', balance=100 + number)
+            db.session.add(account)
+            db.session.flush()
+            for amount in (10, 20, 30):
+                db.session.add(Transaction(account_id=account.id, type='Deposit', direction='credit', amount=amount,
+                                           status='Completed'))
+        db.session.commit()
+        
+        assert LedgerService.backfill_all(workers=2, chunk_size=2) == (6, 18)
+        for account in Account.query:
+            assert [str(tx.balance_after) for tx in Transaction.query.filter_by(account_id=account.id)
+                    .order_by(Transaction.id)] == [f'{account.balance - 50:.2f}', f'{account.balance - 30:.2f}',
+                                                   f'{account.balance:.2f}']
+
+def test_export_csv_and_ofx(client):
+    """Test the export streams every row with the right sign"""
+    import csv
+    import io
+    import re
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    post_history(client, headers)
+    
+    response = client.get('/api/v1/transactions/export?format=csv', headers=headers)
+    assert response.status_code == 200 and response.is_streamed
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    # The transfer legs differ only in their direction
+    assert [(row['account_number'], row['type'], row['direction'], row['amount'], row['balance_after'])
+            for row in rows] == [
+        ('1234567890', 'Deposit', 'credit', '500.00', '1500.00'),
+        ('1234567890', 'Withdrawal', 'debit', '200.00', '1300.00'),
+        ('1234567890', 'Deposit', 'credit', '25.00', '1325.00'),
+        ('1234567890', 'Withdrawal', 'debit', '5.00', '1320.00'),
+        ('1234567890', 'Transfer', 'debit', '100.00', '1220.00'),
+        ('5555555555', 'Transfer', 'credit', '100.00', '150.00')
+    ]
+    
+    response = client.get('/api/v1/transactions/export?format=ofx&accountId=2', headers=headers)
+    body = response.get_data(as_text=True)
+    assert body.count('<STMTTRN>') == 1
+    assert '<ACCTID>5555555555</ACCTID><ACCTTYPE>SAVINGS</ACCTTYPE>' in body
+    assert '<TRNTYPE>XFER</TRNTYPE>' in body and '<TRNAMT>100.00</TRNAMT>' in body
+    assert '<BALAMT>150.00</BALAMT>' in body
+    
+    response = client.get('/api/v1/transactions/export?format=ofx', headers=headers)
+    body = response.get_data(as_text=True)
+    assert body.count('<STMTRS>') == 2
+    # Signed by the direction each row was posted with; the transfer legs differ only in that
+    assert re.findall(r'<TRNTYPE>(\w+)</TRNTYPE>.*?<TRNAMT>([-\d.]+)</TRNAMT>', body) == [
+        ('CREDIT', '500.00'), ('DEBIT', '-200.00'), ('CREDIT', '25.00'), ('DEBIT', '-5.00'),
+        ('XFER', '-100.00'), ('XFER', '100.00')
+    ]
+    
+    response = client.get('/api/v1/transactions/export?format=xlsx', headers=headers)
+    assert response.status_code == 400
+    response = client.get('/api/v1/transactions/export?end_date=2025-13-01', headers=headers)
+    assert response.status_code == 400
+
+def test_export_ofx_balance_of_sharded_account(client):
+    """Test the OFX closing balance of a sharded account without balance_after is the sum of its shards"""
+    import re
+    from app.services import LedgerService
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    with client.application.app_context():
+        LedgerService.enable_sharding(db.session.get(Account, 1), 4)
+        db.session.commit()
+    
+    response = client.post('/api/v1/transactions/deposit', json={
+        'account_id': 1, 'type': 'Deposit', 'amount': 40.00
+    }, headers=headers)
+    assert response.status_code == 201
+    
+    body = client.get('/api/v1/transactions/export?format=ofx', headers=headers).get_data(as_text=True)
+    assert re.search(r'<BALAMT>([-\d.]+)</BALAMT>', body).group(1) == '1040.00'
+
+def test_export_parquet(client):
+    """Test the Parquet export reads back with its decimal columns"""
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+    token = get_auth_token(client)
+    headers = {'Authorization': f'Bearer {token}'}
+    post_history(client, headers)
+    
+    response = client.get('/api/v1/transactions/export?format=parquet&type=Transfer', headers=headers)
+    assert response.status_code == 200
+    table = pyarrow.parquet.read_table(pyarrow.BufferReader(response.get_data()))
+    assert table.column('account_number').to_pylist() == ['1234567890', '5555555555']
+    assert table.column('direction').to_pylist() == ['debit', 'credit']
+    assert [str(value) for value in table.column('balance_after').to_pylist()] == ['1220.00', '150.00']
+
+def test_export_memory_stays_bounded(client):
+    """Test peak memory while exporting does not grow with the number of rows"""
+    import tracemalloc
+    from app.models import Transaction
+    from app.services import TransactionExportService
+    
+    def add_rows(count):
+        db.session.execute(Transaction.__table__.insert(), [
+            {'account_id': 1, 'type': 'Deposit', 'direction': 'credit', 'amount': '10.00',
+             'description': f'Payment {i}', 'created_at': datetime(2025, 1, 1), 'balance_after': '10.00'}
+            for i in range(count)
+        ])
+        db.session.commit()
+    
+    def measure():
+        tracemalloc.start()
+        size = sum(len(piece) for piece in TransactionExportService.stream_export(1, chunk_size=1000))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return size, peak
+    
+    with client.application.app_context():
+        add_rows(2000)
+        small_size, small_peak = measure()
+        add_rows(18000)
+        large_size, large_peak = measure()
+    
+    assert large_size > 9 * small_size
+    assert large_peak < 1.5 * small_peak
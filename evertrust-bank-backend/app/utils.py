@@ -1,7 +1,31 @@
 from marshmallow import ValidationError
+from datetime import datetime
+import base64
+import json
 
 def validate_request(schema, data):
     try:
         return schema().load(data)
     except ValidationError as err:
-        raise ValueError(err.messages)
\ No newline at end of file
+        raise ValueError(err.messages)
+
+def encode_cursor(created_at, row_id):
+    """
+    Encode a (created_at, id) keyset position as an opaque URL-safe cursor
+    """
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor back into (created_at, id)
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (TypeError, ValueError, UnicodeError, json.JSONDecodeError):
+        raise ValueError('Invalid cursor')